@@ -0,0 +1,373 @@
+import json
+import queue
+import random
+import shutil
+import threading
+import time
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import ALERT_POST_SECONDS, ALERTS, QUEUE_DEPTH
+
+BACKEND_URL = "http://localhost:5000/api/incidents" # Node.js Backend
+
+
+class AlertSpool:
+    """
+    Bounded JSON-lines file holding alerts that couldn't be delivered.
+    When full, the oldest alerts are discarded to make room.
+
+    Alerts are only ever appended; delivered (or discarded) ones are skipped
+    by advancing a read offset, saved next to the spool (<path>.offset) so a
+    restart doesn't send them again. Draining a backlog therefore reads each
+    alert once. The file is deleted once drained, and compacted when the
+    skipped part grows past COMPACT_BYTES and half the file.
+    """
+
+    COMPACT_BYTES = 1024 * 1024
+
+    def __init__(self, path, max_alerts: int = 10000):
+        self.path = Path(path)
+        self.offset_path = Path(str(self.path) + ".offset")
+        self.max_alerts = max_alerts
+        self.lock = threading.Lock()
+        self.discarded = 0
+        self.offset = self._read_offset()
+        self.count = len(self._read(self.offset)[0])
+
+    def _read_offset(self) -> int:
+        try:
+            offset = int(self.offset_path.read_text())
+        except (OSError, ValueError):
+            return 0
+        size = self.path.stat().st_size if self.path.exists() else 0
+        return offset if 0 <= offset <= size else 0
+
+    def _read(self, offset: int, n: int = None):
+        """Up to n alerts (all if None) from byte offset on, and the offset after the last one."""
+        if not self.path.exists():
+            return [], offset
+        alerts = []
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            while n is None or len(alerts) < n:
+                line = f.readline()
+                if not line.endswith(b"\n"):
+                    break   # end of file, or a line still being written
+                offset += len(line)
+                if line.strip():
+                    try:
+                        alerts.append(json.loads(line))
+                    except ValueError:
+                        pass # skip a line torn by a crash
+        return alerts, offset
+
+    def _advance(self, offset: int):
+        """Skip everything before offset; delete or compact the file when that pays."""
+        self.offset = offset
+        size = self.path.stat().st_size if self.path.exists() else 0
+        if self.count == 0 or offset >= size:
+            self.path.unlink(missing_ok=True)
+            self.offset_path.unlink(missing_ok=True)
+            self.offset = 0
+            return
+        if offset > self.COMPACT_BYTES and offset > size // 2:
+            tmp = self.path.with_suffix(".tmp")
+            with open(self.path, "rb") as src, open(tmp, "wb") as dst:
+                src.seek(offset)
+                shutil.copyfileobj(src, dst)
+            tmp.replace(self.path)
+            self.offset = 0
+        tmp = self.offset_path.with_suffix(".tmp")
+        tmp.write_text(str(self.offset))
+        tmp.replace(self.offset_path)
+
+    def append(self, alerts: list):
+        with self.lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            with open(self.path, "a") as f:
+                for alert in alerts:
+                    f.write(json.dumps(alert) + "\n")
+            self.count += len(alerts)
+            overflow = self.count - self.max_alerts
+            if overflow > 0:
+                _, offset = self._read(self.offset, overflow)
+                self.count -= overflow
+                self.discarded += overflow
+                self._advance(offset)
+
+    def peek(self, n: int) -> list:
+        with self.lock:
+            return self._read(self.offset, n)[0] if self.count else []
+
+    def remove(self, n: int):
+        with self.lock:
+            alerts, offset = self._read(self.offset, n)
+            self.count -= len(alerts)
+            self._advance(offset)
+
+
+class AlertDeduplicator:
+    """
+    Folds repeated alerts for the same (camera, type, region) into one incident.
+
+    The first alert for a key is sent at once, tagged with a dedup_key.
+    Repeats within the key's window are suppressed and folded into a running
+    occurrence count and peak confidence. At most one update per window is
+    sent while repeats continue, plus a final one when the key goes quiet.
+    Updates carry the same dedup_key so the backend updates the existing
+    incident instead of inserting a new row. A key quiet for a whole window
+    is closed, and its next alert starts a new incident.
+    """
+
+    # Seconds a key stays open after its last occurrence, per incident type
+    DEFAULT_WINDOWS = {
+        "Crowd Density": 60.0,
+        "Violence": 30.0,
+        "Suspicious Activity": 120.0,
+        "Dangerous Sound": 30.0,
+    }
+
+    def __init__(self, windows: dict = None, default_window: float = 30.0, grid: int = 3):
+        self.windows = {**self.DEFAULT_WINDOWS, **(windows or {})}
+        self.default_window = default_window
+        self.grid = grid    # regions are cells of a grid x grid split of the frame
+        self.open = {}      # key -> fold state
+        self.lock = threading.Lock()
+        self.suppressed = 0
+        self.suppressed_by_type = {}
+        self.updates = 0
+
+    def region_of(self, box, frame_shape) -> str:
+        """Grid cell ("r0c2") containing the centre of an (x1, y1, x2, y2) box."""
+        height, width = frame_shape[:2]
+        cx = (box[0] + box[2]) / 2 / max(1, width)
+        cy = (box[1] + box[3]) / 2 / max(1, height)
+        col = min(self.grid - 1, max(0, int(cx * self.grid)))
+        row = min(self.grid - 1, max(0, int(cy * self.grid)))
+        return f"r{row}c{col}"
+
+    def window_for(self, alert_type: str) -> float:
+        return self.windows.get(alert_type, self.default_window)
+
+    def process(self, payload: dict, region: str = None):
+        """Return the payload to send now (new incident or periodic update), or None if folded."""
+        alert_type = payload.get("type", "")
+        key = (payload.get("camera_id"), alert_type, region)
+        window = self.window_for(alert_type)
+        confidence = float(payload.get("confidence") or 0.0)
+        now = time.monotonic()
+
+        with self.lock:
+            state = self.open.get(key)
+            if state is None or now - state["last_seen"] > window:
+                dedup_key = "|".join(str(part) for part in key) + f"|{int(time.time())}"
+                self.open[key] = {"dedup_key": dedup_key, "payload": payload, "count": 1,
+                                  "sent_count": 1, "peak": confidence,
+                                  "last_seen": now, "last_sent": now}
+                return {**payload, "dedup_key": dedup_key, "occurrences": 1}
+
+            state["count"] += 1
+            state["peak"] = max(state["peak"], confidence)
+            state["last_seen"] = now
+            state["payload"] = payload
+            if now - state["last_sent"] >= window:
+                return self._update(state, now)
+            self.suppressed += 1
+            self.suppressed_by_type[alert_type] = self.suppressed_by_type.get(alert_type, 0) + 1
+            return None
+
+    def due_updates(self, force: bool = False) -> list:
+        """Final updates for keys that have gone quiet (or all keys if force); closes those keys."""
+        now = time.monotonic()
+        updates = []
+        with self.lock:
+            for key, state in list(self.open.items()):
+                if not force and now - state["last_seen"] <= self.window_for(key[1]):
+                    continue
+                if state["count"] > state["sent_count"]:
+                    updates.append(self._update(state, now))
+                del self.open[key]
+        return updates
+
+    def _update(self, state: dict, now: float) -> dict:
+        state["last_sent"] = now
+        state["sent_count"] = state["count"]
+        self.updates += 1
+        return {**state["payload"], "dedup_key": state["dedup_key"],
+                "occurrences": state["count"], "confidence": state["peak"]}
+
+    def status(self) -> dict:
+        with self.lock:
+            return {"open_incidents": len(self.open), "suppressed": self.suppressed,
+                    "suppressed_by_type": dict(self.suppressed_by_type), "updates_sent": self.updates}
+
+
+class AlertDispatcher:
+    """
+    Delivers detector alerts to the backend off the frame loop.
+
+    send() only enqueues. A background thread groups queued alerts into
+    micro-batches and POSTs them to the bulk endpoint over a pooled
+    keep-alive session, with timeouts. A failed batch is spooled to disk and
+    retried with exponential backoff; spooled alerts go out, oldest first,
+    once the backend answers again. Repeats are folded by an
+    AlertDeduplicator before they are queued.
+    """
+
+    def __init__(self, backend_url: str = BACKEND_URL, batch_size: int = 20,
+                 flush_interval: float = 0.5, timeout=(2.0, 5.0),
+                 backoff_base: float = 0.5, backoff_max: float = 60.0,
+                 spool_path: str = "spool/alerts.jsonl", spool_max: int = 10000,
+                 queue_size: int = 1000, dedup: AlertDeduplicator = None):
+        self.bulk_url = backend_url.rstrip("/") + "/bulk"
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.timeout = timeout
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.spool = AlertSpool(spool_path, spool_max)
+        self.dedup = dedup or AlertDeduplicator()
+
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.session = requests.Session()
+        self.session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+        self.session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=2))
+
+        self.failures = 0           # consecutive failed POSTs
+        self.retry_at = 0.0         # no POSTs before this time (backoff)
+        self.stats = {"queued": 0, "sent": 0, "failed": 0, "spooled": 0, "batches": 0}
+
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def send(self, payload: dict, region: str = None):
+        """
+        Queue an alert for delivery. Never blocks the caller on the network.
+        region: where in the frame it happened (see AlertDeduplicator.region_of);
+        repeats for the same camera, type and region are folded together.
+        """
+        self._ensure_started()
+        folded = self.dedup.process(payload, region)
+        if folded is None:
+            self._count([payload], "suppressed")
+        else:
+            self._enqueue(folded)
+
+    def _enqueue(self, payload: dict):
+        self.stats["queued"] += 1
+        self._count([payload], "queued")
+        try:
+            self.queue.put_nowait(payload)
+        except queue.Full:
+            # Queue backed up (backend very slow): keep the alert on disk instead
+            self._spool([payload])
+
+    def _spool(self, batch: list):
+        self.spool.append(batch)
+        self.stats["spooled"] += len(batch)
+        self._count(batch, "spooled")
+
+    @staticmethod
+    def _count(batch: list, outcome: str):
+        for payload in batch:
+            ALERTS.labels(payload.get("camera_id") or "", payload.get("type", ""), outcome).inc()
+
+    def close(self, timeout: float = 5.0):
+        """Flush what's queued (spooling anything undeliverable) and stop."""
+        for update in self.dedup.due_updates(force=True):
+            self._enqueue(update)
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self.session.close()
+
+    def collect_metrics(self):
+        """Alerts waiting to be sent and spooled on disk, for /metrics."""
+        QUEUE_DEPTH.labels("", "", "alerts").set(self.queue.qsize())
+        QUEUE_DEPTH.labels("", "", "alert_spool").set(self.spool.count)
+
+    def status(self) -> dict:
+        return {**self.stats, "pending": self.queue.qsize(), "spool": self.spool.count,
+                "spool_discarded": self.spool.discarded, "backing_off": time.monotonic() < self.retry_at,
+                "dedup": self.dedup.status()}
+
+    def _ensure_started(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self._run, name="alert-dispatcher", daemon=True)
+                    self.thread.start()
+
+    def _next_batch(self) -> list:
+        """Wait for one alert, then collect more for up to flush_interval."""
+        try:
+            batch = [self.queue.get(timeout=0.2)]
+        except queue.Empty:
+            return []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self.queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        last_sweep = time.monotonic()
+        while not (self.stop_event.is_set() and self.queue.empty()):
+            if time.monotonic() - last_sweep >= 1.0:
+                # Final counts for folded incidents that have gone quiet
+                for update in self.dedup.due_updates():
+                    self._enqueue(update)
+                last_sweep = time.monotonic()
+            batch = self._next_batch()
+
+            if time.monotonic() < self.retry_at and not self.stop_event.is_set():
+                # Backing off: park new alerts on disk, they'll be retried in order
+                if batch:
+                    self._spool(batch)
+                continue
+
+            if self.spool.count and not self.stop_event.is_set():
+                # Deliver older spooled alerts first
+                if batch:
+                    self._spool(batch)
+                spooled = self.spool.peek(self.batch_size)
+                if self._post(spooled):
+                    self.spool.remove(len(spooled))
+                continue
+
+            if batch and not self._post(batch):
+                self._spool(batch)
+
+    def _post(self, batch: list) -> bool:
+        began = time.perf_counter()
+        try:
+            response = self.session.post(self.bulk_url, json={"incidents": batch}, timeout=self.timeout)
+            response.raise_for_status()
+        except Exception as e:
+            ALERT_POST_SECONDS.labels().observe(time.perf_counter() - began)
+            self.failures += 1
+            self.stats["failed"] += len(batch)
+            self._count(batch, "failed")
+            delay = min(self.backoff_max, self.backoff_base * 2 ** (self.failures - 1))
+            self.retry_at = time.monotonic() + delay * random.uniform(0.8, 1.2)
+            print(f"Failed to send {len(batch)} alert(s), retrying in {delay:.1f}s: {e}")
+            return False
+        ALERT_POST_SECONDS.labels().observe(time.perf_counter() - began)
+        self.failures = 0
+        self.retry_at = 0.0
+        self.stats["sent"] += len(batch)
+        self._count(batch, "sent")
+        self.stats["batches"] += 1
+        return True
+
+
+alert_dispatcher = AlertDispatcher()
@@ -0,0 +1,308 @@
+import subprocess
+import threading
+import time
+import wave
+
+import numpy as np
+
+from scheduler import is_live_source
+from video_output import find_ffmpeg
+
+# YAMNet (and the rest of the audio path) works on 16 kHz mono
+SAMPLE_RATE = 16000
+
+
+class AudioRingBuffer:
+    """
+    Fixed-capacity ring of the newest float32 samples, addressed by absolute
+    sample index (samples written since the start), so a reader can take any
+    window that hasn't been overwritten yet.
+
+    blocking: writers wait instead of overwriting samples the reader hasn't
+    released yet (files: decode as fast as analysis goes, never lose audio).
+    Otherwise the oldest audio is overwritten (live: keep up with real time).
+    """
+
+    def __init__(self, capacity: int, blocking: bool = False):
+        self.data = np.zeros(capacity, dtype=np.float32)
+        self.capacity = capacity
+        self.blocking = blocking
+        self.written = 0        # samples written so far
+        self.released = 0       # samples before this index are no longer needed
+        self.closed = False
+        self.cond = threading.Condition()
+
+    def write(self, samples):
+        samples = np.asarray(samples, dtype=np.float32)
+        with self.cond:
+            if self.blocking:
+                # Feed in pieces so no write overruns the unreleased window
+                offset = 0
+                while offset < len(samples) and not self.closed:
+                    while self.written - self.released >= self.capacity and not self.closed:
+                        self.cond.wait(0.5)
+                    room = self.capacity - (self.written - self.released)
+                    self._put(samples[offset:offset + room])
+                    offset += room
+            else:
+                self._put(samples)
+
+    def _put(self, samples):
+        count = len(samples)
+        if count > self.capacity:
+            self.written += count - self.capacity
+            samples = samples[-self.capacity:]
+            count = self.capacity
+        start = self.written % self.capacity
+        first = min(count, self.capacity - start)
+        self.data[start:start + first] = samples[:first]
+        self.data[:count - first] = samples[first:]
+        self.written += count
+        self.cond.notify_all()
+
+    def read(self, start: int, length: int):
+        """Copy of samples [start, start + length), or None if part of it was overwritten."""
+        with self.cond:
+            if start < self.written - self.capacity or start + length > self.written:
+                return None
+            index = np.arange(start, start + length) % self.capacity
+            return self.data[index]
+
+    def release(self, index: int):
+        """Samples before index may be overwritten."""
+        with self.cond:
+            self.released = max(self.released, index)
+            self.cond.notify_all()
+
+    def wait_for(self, index: int, timeout: float = None) -> bool:
+        """Block until sample index has been written; False if the stream closed first."""
+        with self.cond:
+            self.cond.wait_for(lambda: self.written >= index or self.closed, timeout)
+            return self.written >= index
+
+    def close(self):
+        with self.cond:
+            self.closed = True
+            self.cond.notify_all()
+
+
+class AudioStreamEngine:
+    """
+    Overlapping-window audio analysis off the capture thread.
+
+    A capture thread pulls blocks from read_block() (None at end of stream)
+    into an AudioRingBuffer. The caller's thread, in run(), takes a window of
+    window_seconds every hop_seconds and runs infer_fn(waveform), then
+    on_result(start_seconds, result). With the hop shorter than the window,
+    a sound that straddles one window's edge lands whole in the next one.
+
+    live: when inference falls behind, jump to the newest window and count
+    the skipped ones (windows_skipped). Otherwise (files) capture waits for
+    analysis and every window is analysed, including a zero-padded last one.
+
+    stage_metrics: a metrics.StageMetrics to record block reads (decode),
+    window inference and skipped windows (as frames) in.
+    """
+
+    def __init__(self, read_block, infer_fn, on_result, sample_rate: int = SAMPLE_RATE,
+                 window_seconds: float = 0.975, hop_seconds: float = 0.4875,
+                 live: bool = True, buffer_seconds: float = 10.0, stage_metrics=None):
+        self.read_block = read_block
+        self.infer_fn = infer_fn
+        self.on_result = on_result
+        self.sample_rate = sample_rate
+        self.window = int(round(window_seconds * sample_rate))
+        self.hop = max(1, int(round(hop_seconds * sample_rate)))
+        self.live = live
+        self.ring = AudioRingBuffer(max(int(buffer_seconds * sample_rate), 2 * self.window),
+                                    blocking=not live)
+        self.stop_event = threading.Event()
+        self.error = None
+        self.windows_analyzed = 0
+        self.windows_skipped = 0
+        self.lag = 0.0
+        self.infer_seconds = 0.0
+        self.stage_metrics = stage_metrics
+
+    def run(self):
+        """Analyse until the source ends or stop() is called."""
+        capture = threading.Thread(target=self._capture, name="audio-capture", daemon=True)
+        capture.start()
+        try:
+            self._analyse()
+        finally:
+            self.stop()
+            capture.join(5.0)
+        if self.error is not None:
+            raise self.error
+
+    def stop(self):
+        self.stop_event.set()
+        self.ring.close()
+
+    def _capture(self):
+        try:
+            while not self.stop_event.is_set():
+                began = time.perf_counter()
+                block = self.read_block()
+                if block is None:
+                    break
+                if self.stage_metrics is not None:
+                    self.stage_metrics.decode.observe(time.perf_counter() - began)
+                self.ring.write(block)
+        except Exception as e:
+            self.error = e
+        finally:
+            self.ring.close()
+
+    def _analyse(self):
+        start = 0
+        analysed_until = 0
+        while not self.stop_event.is_set():
+            if not self.ring.wait_for(start + self.window, timeout=0.5):
+                if self.ring.closed:
+                    break
+                continue
+            if self.live:
+                behind = (self.ring.written - self.window - start) // self.hop
+                if behind > 0:
+                    start += behind * self.hop
+                    self.windows_skipped += behind
+                    if self.stage_metrics is not None:
+                        self.stage_metrics.frames_dropped.inc(behind)
+            waveform = self.ring.read(start, self.window)
+            if waveform is None:
+                # Overwritten while we waited: catch up to what's still there
+                start = max(start, self.ring.written - self.window)
+                continue
+            self.ring.release(start + self.hop)
+            self._infer(start, waveform)
+            analysed_until = start + self.window
+            start += self.hop
+
+        # Tail shorter than a window (end of a file): pad it with silence
+        if not self.live and not self.stop_event.is_set() and self.ring.written > analysed_until:
+            start = min(start, max(0, self.ring.written - self.window))
+            tail = self.ring.read(start, self.ring.written - start)
+            if tail is not None and len(tail):
+                self._infer(start, np.pad(tail, (0, max(0, self.window - len(tail)))))
+
+    def _infer(self, start: int, waveform):
+        began = time.perf_counter()
+        result = self.infer_fn(waveform)
+        seconds = time.perf_counter() - began
+        self.infer_seconds += seconds
+        self.windows_analyzed += 1
+        if self.stage_metrics is not None:
+            self.stage_metrics.infer.observe(seconds)
+            self.stage_metrics.frames_inferred.inc()
+        self.lag = (self.ring.written - start - self.window) / self.sample_rate
+        self.on_result(start / self.sample_rate, result)
+
+    def metrics(self) -> dict:
+        return {
+            "windows_analyzed": self.windows_analyzed,
+            "windows_skipped": self.windows_skipped,
+            "lag_seconds": round(max(0.0, self.lag), 3),
+            "mean_infer_ms": round(1000 * self.infer_seconds / self.windows_analyzed, 2)
+                             if self.windows_analyzed else 0.0,
+        }
+
+
+# --- sources ---
+
+class MicrophoneSource:
+    """16-bit mono capture from the default input device through PyAudio."""
+
+    live = True
+
+    def __init__(self, sample_rate: int, block_size: int):
+        import pyaudio
+        self.pyaudio = pyaudio.PyAudio()
+        self.block_size = block_size
+        self.stream = self.pyaudio.open(format=pyaudio.paInt16, channels=1, rate=sample_rate,
+                                        input=True, frames_per_buffer=block_size)
+
+    def read(self):
+        data = self.stream.read(self.block_size, exception_on_overflow=False)
+        return np.frombuffer(data, dtype=np.int16) / 32768.0
+
+    def close(self):
+        self.stream.stop_stream()
+        self.stream.close()
+        self.pyaudio.terminate()
+
+
+class FfmpegAudioSource:
+    """
+    Decodes the audio track of any file or stream ffmpeg can open (video
+    files, WAV, MP3, RTSP, ...) to 16-bit mono PCM at sample_rate.
+    """
+
+    def __init__(self, source: str, sample_rate: int, block_size: int, live: bool = False):
+        self.live = live
+        self.block_bytes = block_size * 2
+        self.proc = subprocess.Popen(
+            [find_ffmpeg(), "-nostdin", "-loglevel", "error", "-i", source,
+             "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "s16le", "-"],
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def read(self):
+        data = self.proc.stdout.read(self.block_bytes)
+        if not data:
+            self.proc.wait()
+            if self.proc.returncode:
+                raise ValueError(f"Could not decode audio: {self.proc.stderr.read().decode(errors='ignore')}")
+            return None
+        data = data[:len(data) // 2 * 2]
+        return np.frombuffer(data, dtype=np.int16) / 32768.0
+
+    def close(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+
+
+class WavSource:
+    """16-bit PCM WAV files without ffmpeg: mixed down to mono, linearly resampled."""
+
+    live = False
+
+    def __init__(self, path: str, sample_rate: int, block_size: int):
+        with wave.open(path, "rb") as wav:
+            if wav.getsampwidth() != 2:
+                raise ValueError("Only 16-bit PCM WAV can be read without ffmpeg")
+            channels, rate = wav.getnchannels(), wav.getframerate()
+            samples = np.frombuffer(wav.readframes(wav.getnframes()), dtype=np.int16) / 32768.0
+        samples = samples.reshape(-1, channels).mean(axis=1)
+        if rate != sample_rate:
+            positions = np.arange(0, len(samples), rate / sample_rate)
+            samples = np.interp(positions, np.arange(len(samples)), samples)
+        self.samples = samples.astype(np.float32)
+        self.block_size = block_size
+        self.position = 0
+
+    def read(self):
+        if self.position >= len(self.samples):
+            return None
+        block = self.samples[self.position:self.position + self.block_size]
+        self.position += self.block_size
+        return block
+
+    def close(self):
+        pass
+
+
+def open_audio_source(source: str, sample_rate: int = SAMPLE_RATE, block_size: int = 1600):
+    """
+    Microphone for "0", otherwise the audio track of a file or stream URL
+    through ffmpeg (plain WAV files also work without it).
+    """
+    source = str(source)
+    if source == "0":
+        return MicrophoneSource(sample_rate, block_size)
+    if find_ffmpeg():
+        return FfmpegAudioSource(source, sample_rate, block_size, live=is_live_source(source))
+    if source.lower().endswith(".wav"):
+        return WavSource(source, sample_rate, block_size)
+    raise ValueError(f"Decoding audio from {source} needs ffmpeg")
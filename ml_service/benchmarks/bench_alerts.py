@@ -0,0 +1,69 @@
+"""
+AlertDispatcher against a local stub backend: how long send() blocks the
+caller, how alerts are batched, and recovery after a backend outage.
+
+Usage (from ml_service/):
+    python benchmarks/bench_alerts.py [--alerts 1000] [--latency 0.05]
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+from common import Timer
+from stub_backend import start_stub_backend
+
+from alerts import AlertDeduplicator, AlertDispatcher
+
+
+def payload(i: int) -> dict:
+    return {"type": "Crowd Density", "description": f"bench alert {i}", "latitude": 40.7128,
+            "longitude": -74.006, "confidence": 0.9, "severity": "medium"}
+
+
+def wait_delivered(state, expected: int, timeout: float = 60.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if len(state.incidents) >= expected:
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def run(label, alerts, latency, fail_requests, spool_dir):
+    server, url, state = start_stub_backend(latency=latency, fail_requests=fail_requests)
+    # Zero-length dedup window so every alert is delivered
+    dispatcher = AlertDispatcher(url, spool_path=str(Path(spool_dir) / f"{label}.jsonl"),
+                                 backoff_base=0.2, backoff_max=2.0,
+                                 dedup=AlertDeduplicator(windows={"Crowd Density": 0.0}))
+    send_times = []
+    with Timer() as total:
+        for i in range(alerts):
+            start = time.perf_counter()
+            dispatcher.send(payload(i))
+            send_times.append(time.perf_counter() - start)
+        delivered = wait_delivered(state, alerts)
+    dispatcher.close()
+    server.shutdown()
+
+    send_times.sort()
+    p50 = send_times[len(send_times) // 2] * 1e6
+    p99 = send_times[int(len(send_times) * 0.99)] * 1e6
+    print(f"{label:<10} send p50 {p50:7.1f}us  p99 {p99:7.1f}us  "
+          f"requests {state.requests:5d}  delivered {len(state.incidents):5d}/{alerts} "
+          f"in {total.seconds:6.2f}s  {'ok' if delivered else 'INCOMPLETE'}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--alerts", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.05, help="Stub backend latency per request (s)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run("healthy", args.alerts, args.latency, 0, tmp)
+        run("outage", args.alerts, args.latency, 5, tmp)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,120 @@
+"""
+Inference backends (model_registry.BACKENDS) side by side on the same
+frames: single-frame latency, batched throughput, and parity of the
+detection boxes with the PyTorch backend.
+
+Parity: on every frame, each PyTorch box is paired with the unmatched box
+of the same class that overlaps it most (IoU >= 0.5). "matched" is the share
+of boxes (from either side) that found a partner; mean IoU and the largest
+confidence difference are over the pairs. A backend passes with >= 95%
+matched and mean IoU >= 0.9 (INT8 is expected to be a bit looser).
+
+Exports are cached in MODEL_EXPORT_DIR (model_exports/), so only the first
+run pays for them.
+
+Usage (from ml_service/):
+    python benchmarks/bench_backends.py [--video clip.mp4] [--weights yolov8n.pt] [--backends torch onnx]
+"""
+import argparse
+import tempfile
+
+import numpy as np
+
+from common import Timer, make_synthetic_clip, read_frames
+
+from model_registry import BACKENDS, ModelRegistry
+
+
+def iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def boxes_of(result):
+    boxes = result.boxes
+    return list(zip(boxes.xyxy.cpu().numpy().tolist(), boxes.cls.cpu().numpy().tolist(),
+                    boxes.conf.cpu().numpy().tolist()))
+
+
+def compare(reference: list, other: list) -> dict:
+    """Pair up boxes frame by frame (see module docstring)."""
+    total = matched = 0
+    ious, conf_deltas = [], []
+    for ref_boxes, other_boxes in zip(reference, other):
+        total += len(ref_boxes) + len(other_boxes)
+        free = list(other_boxes)
+        for box, cls, conf in ref_boxes:
+            candidates = [(iou(box, o[0]), o) for o in free if o[1] == cls]
+            if not candidates:
+                continue
+            best_iou, best = max(candidates, key=lambda c: c[0])
+            if best_iou >= 0.5:
+                free.remove(best)
+                matched += 2
+                ious.append(best_iou)
+                conf_deltas.append(abs(conf - best[2]))
+    return {
+        "matched": matched / total if total else 1.0,
+        "mean_iou": float(np.mean(ious)) if ious else 1.0,
+        "max_conf_delta": max(conf_deltas, default=0.0),
+        "boxes": total,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--video", help="Sample clip (a synthetic clip is generated if omitted)")
+    parser.add_argument("--weights", default="yolov8n.pt")
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--frames", type=int, default=64)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--conf", type=float, default=0.25, help="Confidence threshold for the parity boxes")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = args.video or make_synthetic_clip(f"{tmp}/synthetic.mp4", num_frames=args.frames)
+        frames = read_frames(clip, limit=args.frames)
+
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    reference = None
+    print(f"frames: {len(frames)}  batch: {args.batch_size}")
+    print(f"{'backend':>10}  {'p50 ms':>7}  {'p95 ms':>7}  {'batch fps':>9}  {'matched':>7}  "
+          f"{'mean IoU':>8}  {'max dconf':>9}  {'boxes':>6}  parity")
+    for backend in backends:
+        registry = ModelRegistry(backend=backend)
+        try:
+            model = registry.get_model(args.weights)
+        except Exception as e:
+            print(f"{backend:>10}  could not load: {e}")
+            continue
+        if registry.backend_of(args.weights) != backend:
+            print(f"{backend:>10}  unavailable (fell back to torch)")
+            continue
+
+        model(frames[:1], verbose=False)  # warm up
+        latencies = []
+        results = []
+        for frame in frames:
+            with Timer() as t:
+                result = model([frame], conf=args.conf, verbose=False)[0]
+            latencies.append(t.seconds * 1000)
+            results.append(boxes_of(result))
+        with Timer() as t:
+            for i in range(0, len(frames), args.batch_size):
+                model(frames[i:i + args.batch_size], verbose=False)
+        throughput = len(frames) / t.seconds
+
+        if reference is None:
+            reference = results
+        parity = compare(reference, results)
+        passed = parity["matched"] >= 0.95 and parity["mean_iou"] >= 0.9
+        print(f"{backend:>10}  {np.percentile(latencies, 50):>7.1f}  {np.percentile(latencies, 95):>7.1f}  "
+              f"{throughput:>9.1f}  {100 * parity['matched']:>6.1f}%  {parity['mean_iou']:>8.3f}  "
+              f"{parity['max_conf_delta']:>9.3f}  {len(sum(results, [])):>6}  {'ok' if passed else 'MISMATCH'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Throughput of VideoAnalyzer.analyze_video for different batch sizes, and a
+check that every batch size produces the same detections as batch size 1.
+
+Usage (from ml_service/):
+    python benchmarks/bench_batching.py [--video clip.mp4] [--batch-sizes 1 4 8 16]
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from common import Timer, fps_of, resolve_clip
+
+from video_analyzer import VideoAnalyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--video", help="Sample clip (a synthetic clip is generated if omitted)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    analyzer = VideoAnalyzer()
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = resolve_clip(args.video, tmp)
+        # Warm up so first-call setup is not charged to batch size 1
+        analyzer.analyze_video(clip, str(Path(tmp) / "warmup.mp4"), batch_size=1)
+
+        reference = None
+        print(f"{'batch':>5}  {'fps':>8}  {'seconds':>8}  identical")
+        for batch_size in args.batch_sizes:
+            output = str(Path(tmp) / f"analyzed_b{batch_size}.mp4")
+            with Timer() as t:
+                result = analyzer.analyze_video(clip, output, batch_size=batch_size)
+            if reference is None:
+                reference = result['detections']
+            identical = result['detections'] == reference
+            fps = fps_of(result['total_frames'], t.seconds)
+            print(f"{batch_size:>5}  {fps:>8.2f}  {t.seconds:>8.2f}  {identical}")
+
+
+if __name__ == "__main__":
+    main()
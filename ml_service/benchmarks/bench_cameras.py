@@ -0,0 +1,65 @@
+"""
+CPU cost of running N cameras through the StreamManager at once. Each
+camera plays the same clip in real time; frames from cameras sharing a
+detector type are batched into one model call, so CPU per analysed frame
+should fall as cameras are added.
+
+Usage (from ml_service/):
+    python benchmarks/bench_cameras.py [--video clip.mp4] [--cameras 1 2 4 8] [--seconds 10]
+"""
+import argparse
+import resource
+import tempfile
+import time
+
+from common import resolve_clip
+
+from detectors.crowd import CrowdDetector
+from stream_manager import StreamManager
+
+
+class BenchCrowdDetector(CrowdDetector):
+    # Sample often enough that inference, not the schedule, dominates
+    target_fps = 5.0
+    active_fps = 5.0
+
+    def send_alert(self, count):
+        pass
+
+
+def cpu_seconds() -> float:
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return usage.ru_utime + usage.ru_stime
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--video", help="Sample clip (a synthetic clip is generated if omitted)")
+    parser.add_argument("--cameras", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--seconds", type=float, default=10.0)
+    parser.add_argument("--workers", type=int, default=2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = resolve_clip(args.video, tmp)
+        # Load the model before timing
+        BenchCrowdDetector().model
+
+        print(f"{'cameras':>7}  {'frames':>7}  {'batches':>7}  {'cpu s':>7}  {'cpu ms/frame':>12}")
+        for count in args.cameras:
+            manager = StreamManager({"crowd": BenchCrowdDetector}, workers=args.workers)
+            cpu_start = cpu_seconds()
+            for i in range(count):
+                manager.start(f"cam{i}", clip, "crowd")
+            time.sleep(args.seconds)
+            status = manager.status()
+            manager.shutdown()
+            cpu = cpu_seconds() - cpu_start
+
+            frames = status["inference"]["frames"]
+            per_frame = 1000 * cpu / frames if frames else float("nan")
+            print(f"{count:>7}  {frames:>7}  {status['inference']['batches']:>7}  {cpu:>7.2f}  {per_frame:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
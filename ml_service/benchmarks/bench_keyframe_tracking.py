@@ -0,0 +1,122 @@
+"""
+Detect-then-track (keyframe_tracker.KeyframeTracker) against running the
+model on every frame, for each video detector.
+
+Every frame of the clip goes through detector.process_frame() on one
+thread, once with full inference (the ground truth) and once per keyframe
+interval. Reports per run:
+- fps on one core, and the speedup over full inference,
+- how many frames reached the model (early keyframes included),
+- drift against the ground truth boxes of the same frame: recall and
+  precision at IoU 0.5, mean IoU of the matched boxes, and mean error of
+  the per-frame box count (what crowd alerts are decided on),
+- alerts raised (loitering after --loiter-seconds; with the default 0 every
+  new track id alerts once, so extra alerts mean ids that didn't hold).
+
+By default the models are benchmarks/stub_model.py stand-ins taking
+--stub-latency-ms per frame (roughly YOLOv8n on a CPU core), so the run is
+offline and repeatable; --model real uses the actual weights.
+
+Usage (from ml_service/):
+    python benchmarks/bench_keyframe_tracking.py [--video clip.mp4] [--frames 300]
+        [--intervals 3 5 10] [--detectors crowd suspicious violence] [--model stub|real]
+"""
+import argparse
+import tempfile
+
+import numpy as np
+
+from common import Timer, fps_of, make_synthetic_clip, read_frames
+
+from keyframe_tracker import KeyframeTracker, match_boxes
+
+
+def make_detector(name, interval, loiter_seconds):
+    from detectors.crowd import CrowdDetector
+    from detectors.suspicious import SuspiciousDetector
+    from detectors.violence import ViolenceDetector
+    detector = {"crowd": CrowdDetector, "violence": ViolenceDetector,
+                "suspicious": SuspiciousDetector}[name]()
+    if interval > 1:
+        detector.tracker = KeyframeTracker(interval=interval)
+    if name == "suspicious":
+        detector.loitering_threshold = loiter_seconds
+    # Count alerts instead of queueing them for the backend
+    alerts = []
+    detector.dispatch_alert = lambda payload, box=None, frame_shape=None: alerts.append(payload)
+    return detector, alerts
+
+
+def run(name, frames, interval, loiter_seconds):
+    """Boxes per frame, seconds, alerts and tracker stats for one pass over frames."""
+    detector, alerts = make_detector(name, interval, loiter_seconds)
+    detector.model  # load outside the timing
+    boxes = []
+    with Timer() as t:
+        for frame in frames:
+            outcome = detector.process_frame(frame)
+            boxes.append(np.array([det["box"] for det in outcome["detections"]], dtype=np.float64).reshape(-1, 4))
+    stats = detector.tracker.stats() if detector.tracker else {"frames_detected": len(frames)}
+    return boxes, t.seconds, len(alerts), stats
+
+
+def drift(truth, boxes):
+    matched = ious = 0
+    iou_sum = 0.0
+    count_error = 0
+    for expected, got in zip(truth, boxes):
+        pairs = match_boxes(expected, got, min_iou=0.5)
+        matched += len(pairs)
+        iou_sum += sum(iou for _, _, iou in pairs)
+        ious += len(pairs)
+        count_error += abs(len(expected) - len(got))
+    total_truth = sum(len(b) for b in truth)
+    total_got = sum(len(b) for b in boxes)
+    return {
+        "recall": matched / total_truth if total_truth else 1.0,
+        "precision": matched / total_got if total_got else 1.0,
+        "mean_iou": iou_sum / ious if ious else 0.0,
+        "count_mae": count_error / len(truth),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--video", help="Sample clip (a synthetic clip is generated if omitted)")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--intervals", type=int, nargs="+", default=[3, 5, 10])
+    parser.add_argument("--detectors", nargs="+", default=["crowd", "suspicious", "violence"])
+    parser.add_argument("--model", choices=("stub", "real"), default="stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=30.0)
+    parser.add_argument("--loiter-seconds", type=float, default=0.0)
+    args = parser.parse_args()
+
+    # One core: the figure to compare is frames per second per core
+    import torch
+    torch.set_num_threads(1)
+    if args.model == "stub":
+        from stub_model import use_stub_models
+        use_stub_models(args.stub_latency_ms / 1000)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = args.video or make_synthetic_clip(f"{tmp}/synthetic.mp4", num_frames=args.frames)
+        frames = read_frames(clip, limit=args.frames)
+
+    print(f"frames: {len(frames)}  model: {args.model}"
+          + (f" ({args.stub_latency_ms:g} ms/frame)" if args.model == "stub" else ""))
+    for name in args.detectors:
+        truth, seconds, alerts, _ = run(name, frames, 1, args.loiter_seconds)
+        base_fps = fps_of(len(frames), seconds)
+        print(f"{name:>10} every frame  {base_fps:7.1f} fps  alerts {alerts}")
+        for interval in args.intervals:
+            boxes, seconds, alerts, stats = run(name, frames, interval, args.loiter_seconds)
+            fps = fps_of(len(frames), seconds)
+            d = drift(truth, boxes)
+            print(f"{name:>10} keyframe/{interval:<3} {fps:7.1f} fps  x{fps / base_fps:4.1f}  "
+                  f"model frames {stats['frames_detected']:>4} (early {stats.get('early_keyframes', 0)})  "
+                  f"recall {d['recall']:.3f}  precision {d['precision']:.3f}  IoU {d['mean_iou']:.3f}  "
+                  f"count err {d['count_mae']:.2f}  alerts {alerts}")
+
+
+if __name__ == "__main__":
+    main()
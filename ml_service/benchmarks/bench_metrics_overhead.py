@@ -0,0 +1,82 @@
+"""
+What the /metrics instrumentation costs (see metrics.py).
+
+Two numbers:
+- the instrumentation of one frame on its own: the timer reads, stage
+  observations and counter increments an analysed frame goes through,
+  repeated in a tight loop, as a share of the time a frame takes to analyse;
+- end to end: VideoAnalyzer.analyze_video (report mode) with the registry
+  enabled vs disabled, alternating runs and taking the median. This one is
+  noisy on a busy machine; the first is the figure to hold under 1%.
+
+Usage (from ml_service/):
+    python benchmarks/bench_metrics_overhead.py [--video clip.mp4] [--frames 150] [--repeats 5]
+"""
+import argparse
+import statistics
+import tempfile
+import time
+
+from common import Timer, make_synthetic_clip
+
+from metrics import StageMetrics, metrics
+
+
+def instrumentation_seconds(iterations: int) -> float:
+    """Seconds of instrumentation per analysed frame (the calls analyze_video makes)."""
+    stage = StageMetrics("bench", "bench")
+    with Timer() as t:
+        for _ in range(iterations):
+            began = time.perf_counter()
+            stage.decode.observe(time.perf_counter() - began)
+            stage.frames_read.inc()
+            began = time.perf_counter()
+            stage.infer.observe(time.perf_counter() - began)
+            stage.frames_inferred.inc()
+            began = time.perf_counter()
+            annotated = time.perf_counter()
+            stage.annotate.observe(annotated - began)
+            drawn = time.perf_counter()
+            stage.draw.observe(drawn - annotated)
+            stage.encode.observe(time.perf_counter() - drawn)
+    stage.remove()
+    return t.seconds / iterations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--video", help="Sample clip (a synthetic clip is generated if omitted)")
+    parser.add_argument("--frames", type=int, default=150)
+    parser.add_argument("--repeats", type=int, default=5)
+    args = parser.parse_args()
+
+    from video_analyzer import VideoAnalyzer
+    analyzer = VideoAnalyzer()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = args.video or make_synthetic_clip(f"{tmp}/synthetic.mp4", num_frames=args.frames)
+        analyzer.analyze_video(clip, f"{tmp}/warmup.mp4", output_mode="report")  # load + warm up
+
+        runs = {True: [], False: []}
+        frames = 0
+        for _ in range(args.repeats):
+            for enabled in (False, True):
+                metrics.enabled = enabled
+                with Timer() as t:
+                    report = analyzer.analyze_video(clip, f"{tmp}/out.mp4", output_mode="report")
+                frames = report["frames_analyzed"]
+                runs[enabled].append(t.seconds)
+        metrics.enabled = True
+
+    per_frame = statistics.median(runs[False]) / frames
+    cost = instrumentation_seconds(100000)
+    off, on = statistics.median(runs[False]), statistics.median(runs[True])
+    print(f"frames: {frames}  repeats: {args.repeats}")
+    print(f"analysis: {1000 * per_frame:.2f} ms/frame  instrumentation: {1e6 * cost:.1f} us/frame "
+          f"= {100 * cost / per_frame:.3f}% {'(ok, < 1%)' if cost / per_frame < 0.01 else '(OVER 1%)'}")
+    print(f"end to end: metrics off {frames / off:.1f} fps, on {frames / on:.1f} fps "
+          f"({100 * (on - off) / off:+.2f}%, includes run-to-run noise)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Motion gate and ROI cropping (frame_gate.FrameGate) on a fixed-camera
+style clip: a still, sensor-noisy scene with one stretch where objects
+move. Reports:
+- what the gate costs per frame,
+- how many frames and pixels it kept away from the model,
+- whether every moving frame still got through,
+- model latency on the full frame vs an ROI crop.
+
+Usage (from ml_service/):
+    python benchmarks/bench_motion_gate.py [--frames 600] [--size 1280x720]
+"""
+import argparse
+
+import cv2
+import numpy as np
+
+from common import Timer
+
+from frame_gate import FrameGate
+
+
+def fixed_camera_frames(num_frames, size, moving):
+    """Static background + sensor noise; rectangles move during the `moving` (start, end) frames."""
+    width, height = size
+    rng = np.random.default_rng(0)
+    background = rng.integers(40, 120, (height, width, 3), dtype=np.uint8)
+    cv2.rectangle(background, (width // 4, height // 3), (width // 2, height - 20), (30, 30, 30), -1)
+    for i in range(num_frames):
+        frame = cv2.add(background, rng.integers(0, 6, (height, width, 3), dtype=np.uint8))
+        if moving[0] <= i < moving[1]:
+            x = (i * 9) % (width - 80)
+            cv2.rectangle(frame, (x, height // 2), (x + 60, height // 2 + 140), (200, 180, 160), -1)
+        yield i, frame
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--frames", type=int, default=600)
+    parser.add_argument("--size", default="1280x720")
+    parser.add_argument("--model-runs", type=int, default=10, help="Inference timings per variant (0 to skip)")
+    args = parser.parse_args()
+    size = tuple(int(v) for v in args.size.split("x"))
+    moving = (args.frames // 3, args.frames // 3 + args.frames // 6)
+
+    # The lower half of the frame, where the motion happens
+    roi = [[[0.0, 0.45], [1.0, 0.45], [1.0, 1.0], [0.0, 1.0]]]
+    for label, gate in [("motion", FrameGate(max_skip_seconds=1e9)),
+                        ("motion+roi", FrameGate(roi=roi, max_skip_seconds=1e9))]:
+        missed = 0
+        seconds = 0.0
+        for i, frame in fixed_camera_frames(args.frames, size, moving):
+            with Timer() as t:
+                passed = gate.check(frame)
+            seconds += t.seconds
+            if moving[0] <= i < moving[1] and not passed:
+                missed += 1
+        stats = gate.stats()
+        print(f"{label:>10}: check {1000 * seconds / args.frames:.3f} ms/frame  "
+              f"frames skipped {stats['frames_skipped_pct']}%  pixels skipped {stats['pixels_skipped_pct']}%  "
+              f"moving frames missed {missed}/{moving[1] - moving[0]}")
+
+    if args.model_runs:
+        from detectors.crowd import CrowdDetector
+        detector = CrowdDetector()
+        frame = next(fixed_camera_frames(1, size, (0, 1)))[1]
+        detector.infer([frame])  # load + warm up
+        for label, gate in [("full frame", FrameGate(motion=False)),
+                            ("roi crop", FrameGate(roi=roi, motion=False))]:
+            with Timer() as t:
+                for _ in range(args.model_runs):
+                    gate.infer(detector.infer, [frame])
+            print(f"{label:>10}: {1000 * t.seconds / args.model_runs:.1f} ms/inference")
+
+
+if __name__ == "__main__":
+    main()
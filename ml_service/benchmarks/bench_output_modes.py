@@ -0,0 +1,69 @@
+"""
+Timing of VideoAnalyzer.analyze_video's output modes on one clip:
+annotated (mp4v and H.264), events (only stretches with detections
+re-encoded, the rest stream-copied) and report (no video at all), plus
+the per-frame cost of the frame.copy() that in-place drawing removed.
+Inference is the same in every mode, so "output s" (time over the
+report-only run) is what each kind of video output costs. Every mode
+must report the same detections as the report-only run.
+
+Events mode and the H.264 writer need ffmpeg (on PATH or FFMPEG_BINARY);
+without it they fall back to a full re-encode / mp4v, which the table shows.
+
+Usage (from ml_service/):
+    python benchmarks/bench_output_modes.py [--video clip.mp4] [--frames 600]
+"""
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+from common import Timer, fps_of, make_synthetic_clip, read_frames
+
+from video_analyzer import VideoAnalyzer
+
+MODES = [
+    ("report", "mp4v"),
+    ("annotated", "mp4v"),
+    ("annotated", "h264"),
+    ("events", "mp4v"),
+]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--video", help="Sample clip (a synthetic clip is generated if omitted)")
+    parser.add_argument("--frames", type=int, default=600, help="Length of the synthetic clip")
+    parser.add_argument("--batch-size", type=int, default=4)
+    args = parser.parse_args()
+
+    analyzer = VideoAnalyzer()
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = args.video or make_synthetic_clip(Path(tmp) / "synthetic.mp4", num_frames=args.frames)
+        # Load the models before timing anything
+        analyzer.infer_batch(read_frames(clip, limit=1))
+
+        frames = read_frames(clip, limit=200)
+        with Timer() as t:
+            for frame in frames:
+                frame.copy()
+        print(f"frame.copy(): {1000 * t.seconds / max(1, len(frames)):.3f} ms/frame (no longer paid)")
+
+        baseline = None
+        print(f"{'mode':>9}  {'codec':>5}  {'seconds':>8}  {'fps':>8}  {'output s':>8}  "
+              f"{'video MB':>8}  {'events':>6}  {'render':>7}  identical")
+        for mode, codec in MODES:
+            output = Path(tmp) / f"{mode}_{codec}.mp4"
+            with Timer() as t:
+                result = analyzer.analyze_video(clip, str(output), batch_size=args.batch_size,
+                                                output_mode=mode, codec=codec)
+            if baseline is None:
+                baseline = (t.seconds, result['detections'])
+            size = os.path.getsize(output) / 1e6 if output.exists() else 0.0
+            print(f"{mode:>9}  {codec:>5}  {t.seconds:>8.2f}  {fps_of(result['total_frames'], t.seconds):>8.2f}  "
+                  f"{t.seconds - baseline[0]:>+8.2f}  {size:>8.2f}  {len(result['detections']):>6}  "
+                  f"{result.get('render', '-'):>7}  {result['detections'] == baseline[1]}")
+
+
+if __name__ == "__main__":
+    main()
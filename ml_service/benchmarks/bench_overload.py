@@ -0,0 +1,108 @@
+"""
+Overload control (overload.OverloadController) with more cameras than the
+inference pool can keep up with.
+
+The same set of cameras (a synthetic clip played back in real time) runs
+through a StreamManager twice, without and with the controller. Each run
+samples, once per second, every camera's lag and processed fps. It
+reports per camera:
+- processed fps and p95 lag,
+- the quality level the camera ended at, with its input size, sampling
+  factor and pause state,
+plus the controller's step-downs and step-ups. Violence cameras should
+keep their quality and keep up, and crowd cameras should degrade first.
+
+By default the models are benchmarks/stub_model.py stand-ins taking
+--stub-latency-ms per frame at 640 px (less at a smaller imgsz), so the
+run is offline and repeatable; --model real uses the actual weights.
+
+Usage (from ml_service/):
+    python benchmarks/bench_overload.py [--cameras violence:1 suspicious:1 crowd:3]
+        [--seconds 30] [--workers 2] [--model stub|real] [--stub-latency-ms 80]
+"""
+import argparse
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from common import make_synthetic_clip
+
+from overload import OverloadController
+from stream_manager import StreamManager
+
+
+def run(clip, cameras, seconds, workers, control):
+    from detectors.crowd import CrowdDetector
+    from detectors.suspicious import SuspiciousDetector
+    from detectors.violence import ViolenceDetector
+    factories = {"crowd": CrowdDetector, "violence": ViolenceDetector, "suspicious": SuspiciousDetector}
+    manager = StreamManager(factories, workers=workers)
+    for camera_id, detector_type in cameras:
+        manager.start(camera_id, clip, detector_type, motion_gate=False)
+        # Count alerts instead of queueing them for the backend
+        manager.get(camera_id).detector.dispatch_alert = lambda *args, **kwargs: None
+    controller = OverloadController(manager, interval=1.0, recover_ticks=3) if control else None
+    if controller:
+        controller.start()
+
+    lags = {camera_id: [] for camera_id, _ in cameras}
+    processed = {camera_id: 0 for camera_id, _ in cameras}
+    started = time.monotonic()
+    stop = threading.Event()
+    while not stop.wait(1.0) and time.monotonic() - started < seconds:
+        for camera_id, _ in cameras:
+            cam = manager.get(camera_id)
+            if not cam.paused:
+                lags[camera_id].append(cam.scheduler.lag)
+    elapsed = time.monotonic() - started
+    for camera_id, _ in cameras:
+        processed[camera_id] = manager.get(camera_id).scheduler.frames_processed
+
+    report = {camera_id: {"fps": processed[camera_id] / elapsed,
+                          "p95_lag": float(np.percentile(lags[camera_id], 95)) if lags[camera_id] else 0.0,
+                          "quality": manager.get(camera_id).status()["quality"]}
+              for camera_id, _ in cameras}
+    decisions = controller.status()["decisions"] if controller else []
+    if controller:
+        controller.stop()
+    manager.shutdown()
+    return report, decisions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--cameras", nargs="+", default=["violence:1", "suspicious:1", "crowd:3"],
+                        help="detector:count pairs")
+    parser.add_argument("--seconds", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--model", choices=("stub", "real"), default="stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=80.0)
+    args = parser.parse_args()
+
+    if args.model == "stub":
+        from stub_model import use_stub_models
+        use_stub_models(args.stub_latency_ms / 1000)
+    cameras = []
+    for spec in args.cameras:
+        detector_type, count = spec.split(":")
+        cameras += [(f"{detector_type}-{i}", detector_type) for i in range(int(count))]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = make_synthetic_clip(f"{tmp}/synthetic.mp4", num_frames=int(30 * (args.seconds + 5)))
+        for control in (False, True):
+            report, decisions = run(clip, cameras, args.seconds, args.workers, control)
+            print(f"overload control {'on' if control else 'off'}:")
+            for camera_id, r in report.items():
+                q = r["quality"]
+                print(f"  {camera_id:>14}  {r['fps']:5.1f} fps  p95 lag {r['p95_lag']:6.2f} s  "
+                      f"level {q['level']} (imgsz {q['imgsz'] or 'default'}, fps x{q['fps_scale']}"
+                      f"{', paused' if q['paused'] else ''})")
+            if control:
+                steps = [d["action"] for d in decisions]
+                print(f"  decisions: {steps.count('step_down')} down, {steps.count('step_up')} up")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Speedup curve for segment-parallel analysis (segments.analyze_video_parallel)
+with 1..N worker processes, and a check that every run reports the same
+detections and writes the same number of frames as the serial run.
+
+Usage (from ml_service/):
+    python benchmarks/bench_segments.py [--video long_clip.mp4] [--max-workers 8]
+"""
+import argparse
+import os
+import tempfile
+from pathlib import Path
+
+import cv2
+
+from common import Timer, fps_of, make_synthetic_clip
+
+from segments import analyze_video_parallel
+from video_analyzer import VideoAnalyzer
+
+
+def count_frames(path):
+    cap = cv2.VideoCapture(str(path))
+    frames = 0
+    while cap.grab():
+        frames += 1
+    cap.release()
+    return frames
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--video", help="Sample clip (a synthetic clip is generated if omitted)")
+    parser.add_argument("--frames", type=int, default=1200, help="Length of the synthetic clip")
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    args = parser.parse_args()
+
+    analyzer = VideoAnalyzer()
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = args.video or make_synthetic_clip(Path(tmp) / "synthetic.mp4", num_frames=args.frames)
+
+        with Timer() as t:
+            serial = analyzer.analyze_video(clip, str(Path(tmp) / "serial.mp4"))
+        serial_frames = count_frames(Path(tmp) / "serial.mp4")
+        baseline = t.seconds
+        print(f"cores: {os.cpu_count()}  frames: {serial['total_frames']}")
+        print(f"{'workers':>7}  {'segments':>8}  {'fps':>8}  {'seconds':>8}  {'speedup':>7}  identical")
+        print(f"{'serial':>7}  {1:>8}  {fps_of(serial['total_frames'], baseline):>8.2f}  "
+              f"{baseline:>8.2f}  {1.0:>7.2f}  True")
+
+        for workers in range(1, args.max_workers + 1):
+            output = Path(tmp) / f"parallel_{workers}.mp4"
+            with Timer() as t:
+                result = analyze_video_parallel(clip, str(output), workers=workers, analyzer=analyzer)
+            identical = (result['detections'] == serial['detections']
+                         and count_frames(output) == serial_frames)
+            print(f"{workers:>7}  {result['segments']:>8}  {fps_of(result['total_frames'], t.seconds):>8.2f}  "
+                  f"{t.seconds:>8.2f}  {baseline / t.seconds:>7.2f}  {identical}")
+
+
+if __name__ == "__main__":
+    main()
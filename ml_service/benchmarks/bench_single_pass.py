@@ -0,0 +1,53 @@
+"""
+Compare the old two-pass detection (people, then weapons) against the
+single multi-class pass used by VideoAnalyzer.analyze_video.
+
+Usage (from ml_service/):
+    python benchmarks/bench_single_pass.py [--video clip.mp4] [--frames 150]
+"""
+import argparse
+import tempfile
+from pathlib import Path
+
+from common import Timer, fps_of, read_frames, resolve_clip
+
+from video_analyzer import VideoAnalyzer
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--video", help="Sample clip (a synthetic clip is generated if omitted)")
+    parser.add_argument("--frames", type=int, default=150, help="Max frames to time")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = resolve_clip(args.video, tmp)
+        frames = read_frames(clip, limit=args.frames)
+        analyzer = VideoAnalyzer()
+        model = analyzer.yolo_model
+
+        # Warm up so model fusing / first-call setup is not timed
+        model(frames[0], classes=analyzer.detect_classes, verbose=False)
+
+        with Timer() as two_pass:
+            for frame in frames:
+                model(frame, classes=[analyzer.person_class], verbose=False)
+                model(frame, classes=analyzer.weapon_classes, verbose=False)
+
+        with Timer() as single_pass:
+            for frame in frames:
+                boxes = model(frame, classes=analyzer.detect_classes, verbose=False)[0].boxes
+                boxes[boxes.cls == analyzer.person_class]
+                boxes[boxes.cls != analyzer.person_class]
+
+        with Timer() as end_to_end:
+            result = analyzer.analyze_video(clip, str(Path(tmp) / "analyzed.mp4"))
+
+    print(f"Frames timed:              {len(frames)}")
+    print(f"Two-pass detection:        {fps_of(len(frames), two_pass.seconds):7.2f} fps")
+    print(f"Single-pass detection:     {fps_of(len(frames), single_pass.seconds):7.2f} fps")
+    print(f"analyze_video end-to-end:  {fps_of(result['total_frames'], end_to_end.seconds):7.2f} fps")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Startup time and memory for the video detectors + VideoAnalyzer, comparing
+one YOLO() load per consumer (the old behaviour) with the shared model
+registry. Each mode runs in a fresh subprocess so RSS numbers don't mix.
+
+Usage (from ml_service/):
+    python benchmarks/bench_startup.py
+"""
+import json
+import resource
+import subprocess
+import sys
+import time
+
+from common import ML_SERVICE_DIR
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def run_legacy():
+    from ultralytics import YOLO
+
+    start = time.perf_counter()
+    models = [YOLO("yolov8n.pt") for _ in range(3)]  # crowd, suspicious, analyzer
+    for _ in range(2):  # violence detector + analyzer each try violence.pt
+        try:
+            models.append(YOLO("violence.pt"))
+        except Exception:
+            models.append(YOLO("yolov8n.pt"))
+    construct = time.perf_counter() - start
+    return {"construct_s": construct, "first_use_s": 0.0}
+
+
+def run_registry():
+    from detectors.crowd import CrowdDetector
+    from detectors.violence import ViolenceDetector
+    from detectors.suspicious import SuspiciousDetector
+    from video_analyzer import VideoAnalyzer
+
+    start = time.perf_counter()
+    consumers = [CrowdDetector(), ViolenceDetector(), SuspiciousDetector()]
+    analyzer = VideoAnalyzer()
+    construct = time.perf_counter() - start
+
+    # Models are lazy, so charge their loading to first use
+    start = time.perf_counter()
+    for detector in consumers:
+        detector.model
+    analyzer.yolo_model
+    analyzer.violence_model
+    first_use = time.perf_counter() - start
+    return {"construct_s": construct, "first_use_s": first_use}
+
+
+def main():
+    if len(sys.argv) > 1 and sys.argv[1] in ("legacy", "registry"):
+        # Child process: measure one mode and print JSON
+        baseline = peak_rss_mb()
+        result = run_legacy() if sys.argv[1] == "legacy" else run_registry()
+        result["peak_rss_mb"] = peak_rss_mb()
+        result["rss_delta_mb"] = result["peak_rss_mb"] - baseline
+        print(json.dumps(result))
+        return
+
+    print(f"{'mode':<10} {'construct':>10} {'first use':>10} {'peak RSS':>10}")
+    for mode in ("legacy", "registry"):
+        out = subprocess.run([sys.executable, __file__, mode], cwd=ML_SERVICE_DIR,
+                             capture_output=True, text=True, check=True)
+        r = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{mode:<10} {r['construct_s']:>9.2f}s {r['first_use_s']:>9.2f}s {r['peak_rss_mb']:>8.0f}MB")
+
+
+if __name__ == "__main__":
+    main()
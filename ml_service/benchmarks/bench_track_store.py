@@ -0,0 +1,81 @@
+"""
+Memory of SuspiciousDetector's track state over a simulated week of a busy
+camera: the old unbounded dict-of-dicts against the bounded TrackStore.
+
+Usage (from ml_service/):
+    python benchmarks/bench_track_store.py [--days 7] [--arrival-every 10] [--fps 1]
+"""
+import argparse
+import random
+import tracemalloc
+
+from common import Timer
+
+from detectors.track_store import TrackStore
+
+
+def simulate(days: float, arrival_every: float, fps: float, seed: int = 0):
+    """Yield (now, visible track ids) once per analysed frame."""
+    rng = random.Random(seed)
+    visible = {}  # track_id -> leaves_at
+    next_id = 1
+    next_arrival = 0.0
+    step = 1.0 / fps
+    now = 0.0
+    end = days * 86400
+    while now < end:
+        while next_arrival <= now:
+            visible[next_id] = now + rng.expovariate(1 / 60.0)  # mean 60s in view
+            next_id += 1
+            next_arrival += rng.expovariate(1 / arrival_every)
+        for track_id in [t for t, leaves_at in visible.items() if leaves_at <= now]:
+            del visible[track_id]
+        yield now, list(visible)
+        now += step
+
+
+def run_legacy(args):
+    history = {}
+    for now, ids in simulate(args.days, args.arrival_every, args.fps):
+        for track_id in ids:
+            if track_id not in history:
+                history[track_id] = {"start_time": now, "last_seen_time": now, "alerted": False}
+            else:
+                history[track_id]["last_seen_time"] = now
+    return history
+
+
+def run_store(args):
+    store = TrackStore()
+    for now, ids in simulate(args.days, args.arrival_every, args.fps):
+        for track_id in ids:
+            store.touch(track_id, now)
+        store.evict_expired(now)
+    return store
+
+
+def measure(fn, args):
+    tracemalloc.start()
+    with Timer() as t:
+        tracks = fn(args)
+    # Measured while the track state is still alive
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return len(tracks), current, peak, t.seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--days", type=float, default=7.0)
+    parser.add_argument("--arrival-every", type=float, default=10.0, help="Mean seconds between new people")
+    parser.add_argument("--fps", type=float, default=1.0, help="Analysed frames per simulated second")
+    args = parser.parse_args()
+
+    print(f"{'store':<8} {'tracks held':>11} {'retained':>12} {'peak':>12} {'time':>8}")
+    for label, fn in (("dict", run_legacy), ("bounded", run_store)):
+        tracks, current, peak, seconds = measure(fn, args)
+        print(f"{label:<8} {tracks:>11} {current / 1024:>10.0f}KB {peak / 1024:>10.0f}KB {seconds:>7.1f}s")
+
+
+if __name__ == "__main__":
+    main()
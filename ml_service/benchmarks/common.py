@@ -0,0 +1,74 @@
+"""
+Shared helpers for the ml_service benchmark scripts.
+
+Scripts in this folder are run from the ml_service directory, e.g.
+    python benchmarks/bench_single_pass.py --video samples/street.mp4
+"""
+import sys
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+ML_SERVICE_DIR = Path(__file__).resolve().parent.parent
+if str(ML_SERVICE_DIR) not in sys.path:
+    sys.path.insert(0, str(ML_SERVICE_DIR))
+
+
+def make_synthetic_clip(path, num_frames=150, size=(640, 480), fps=30):
+    """
+    Write a small synthetic clip (moving rectangles on a noisy background)
+    so benchmarks can run without a sample video.
+    """
+    width, height = size
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, (width, height))
+    rng = np.random.default_rng(0)
+    background = rng.integers(0, 60, (height, width, 3), dtype=np.uint8)
+    for i in range(num_frames):
+        frame = background.copy()
+        for k in range(5):
+            x = int((i * (3 + k) + k * 97) % max(1, width - 60))
+            y = int(40 + k * (height - 120) / 5)
+            cv2.rectangle(frame, (x, y), (x + 50, y + 110), (80 + 30 * k, 160, 200), -1)
+        out.write(frame)
+    out.release()
+    return str(path)
+
+
+def read_frames(video_path, limit=None):
+    """Decode a clip into memory so decode cost is excluded from model timings."""
+    cap = cv2.VideoCapture(str(video_path))
+    frames = []
+    while cap.isOpened():
+        success, frame = cap.read()
+        if not success or (limit and len(frames) >= limit):
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def resolve_clip(video, workdir):
+    """Return the given clip, or generate a synthetic one under workdir."""
+    if video:
+        return video
+    workdir = Path(workdir)
+    workdir.mkdir(parents=True, exist_ok=True)
+    return make_synthetic_clip(workdir / "synthetic.mp4")
+
+
+def fps_of(num_frames, seconds):
+    return num_frames / seconds if seconds > 0 else 0.0
+
+
+class Timer:
+    """Context manager that records elapsed wall time in `.seconds`."""
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.seconds = time.perf_counter() - self.start
+        return False
@@ -0,0 +1,53 @@
+"""
+Minimal stand-in for the Node backend's incident endpoints, for exercising
+AlertDispatcher without a database. Can add latency and fail on demand.
+"""
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubState:
+    def __init__(self, latency: float = 0.0, fail_requests: int = 0):
+        self.latency = latency
+        self.fail_requests = fail_requests  # answer this many requests with 503 first
+        self.requests = 0
+        self.incidents = []
+        self.lock = threading.Lock()
+
+
+def start_stub_backend(latency: float = 0.0, fail_requests: int = 0):
+    """Start the stub on a free port. Returns (server, incidents_url, state)."""
+    state = StubState(latency, fail_requests)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if state.latency:
+                time.sleep(state.latency)
+            with state.lock:
+                state.requests += 1
+                failing = state.fail_requests > 0
+                if failing:
+                    state.fail_requests -= 1
+                else:
+                    payload = json.loads(body or b"{}")
+                    items = payload.get("incidents", [payload])
+                    state.incidents.extend(items)
+            status, reply = (503, b'{"error":"unavailable"}') if failing else (200, b'{"ok":true}')
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(reply)))
+            self.end_headers()
+            self.wfile.write(reply)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/api/incidents"
+    return server, url, state
@@ -0,0 +1,97 @@
+"""
+Deterministic stand-in for a YOLO detection model, so the benchmarks run
+offline and give the same detections on every run and machine.
+
+It finds bright blobs (the moving rectangles of common.make_synthetic_clip)
+with a threshold and connected components, and returns real ultralytics
+Results, so every consumer (VideoAnalyzer, detectors, overlays) takes its
+normal path. The colour of a blob picks its class: most are people, and
+two of make_synthetic_clip's five rectangles are a knife and a bat, so the
+weapon branches run too. latency adds a fixed per-frame cost, to stand in
+for a model of known speed at 640 px input; a smaller imgsz scales it with
+the input area, as it roughly does for YOLO on a CPU.
+"""
+import time
+
+import cv2
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+PERSON, BAT, KNIFE = 0, 34, 43
+NAMES = {i: f"class{i}" for i in range(80)}
+NAMES.update({PERSON: "person", BAT: "baseball bat", KNIFE: "knife"})
+
+# make_synthetic_clip colours its k-th rectangle with blue = 80 + 30 * k
+CLASS_BY_SHADE = {0: PERSON, 1: PERSON, 2: PERSON, 3: KNIFE, 4: BAT}
+
+
+class StubModel:
+    def __init__(self, latency: float = 0.0, threshold: int = 120, min_area: int = 400):
+        self.latency = latency
+        self.threshold = threshold
+        self.min_area = min_area
+        self.names = NAMES
+        # Attributes ModelRegistry copies into each handle; predictor holds the tracker state
+        self.predictor = None
+        self.callbacks = {}
+        self.overrides = {}
+
+    def __call__(self, source, classes=None, conf=None, verbose=False, imgsz=None, **kwargs):
+        frames = source if isinstance(source, list) else [source]
+        if self.latency:
+            scale = (imgsz / 640) ** 2 if imgsz else 1.0
+            time.sleep(self.latency * scale * len(frames))
+        return [self._detect(frame, classes, conf) for frame in frames]
+
+    predict = __call__
+
+    def track(self, source, persist=False, classes=None, conf=None, verbose=False, imgsz=None, **kwargs):
+        """Boxes get ids by matching the nearest centre in the previous frame (per handle)."""
+        results = self(source, classes=classes, conf=conf, imgsz=imgsz)
+        if self.predictor is None or not persist:
+            self.predictor = {"next_id": 1, "centres": {}}
+        state = self.predictor
+        for result in results:
+            data = result.boxes.data.clone()
+            centres = {}
+            ids = []
+            for box in data.tolist():
+                centre = ((box[0] + box[2]) / 2, (box[1] + box[3]) / 2)
+                track_id = min(state["centres"], default=None,
+                               key=lambda i: np.hypot(*np.subtract(state["centres"][i], centre)))
+                if (track_id is None or track_id in centres
+                        or np.hypot(*np.subtract(state["centres"][track_id], centre)) > 80):
+                    track_id = state["next_id"]
+                    state["next_id"] += 1
+                centres[track_id] = centre
+                ids.append(float(track_id))
+            state["centres"] = centres
+            if len(ids):
+                # xyxy, id, conf, cls
+                data = torch.cat([data[:, :4], torch.tensor(ids).unsqueeze(1), data[:, 4:]], dim=1)
+            result.update(boxes=data)
+        return results
+
+    def _detect(self, frame, classes, conf):
+        mask = (frame[:, :, 1] > self.threshold).astype(np.uint8)
+        count, _, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=4)
+        rows = []
+        for x, y, w, h, area in stats[1:count]:
+            if area < self.min_area:
+                continue
+            shade = int(round((float(np.median(frame[y:y + h, x:x + w, 0])) - 80) / 30))
+            cls = CLASS_BY_SHADE.get(shade, PERSON)
+            score = 0.9 if cls == PERSON else 0.7
+            if (classes is not None and cls not in classes) or (conf is not None and score < conf):
+                continue
+            rows.append([x, y, x + w, y + h, score, cls])
+        boxes = torch.tensor(rows, dtype=torch.float32).reshape(-1, 6)
+        return Results(orig_img=frame, path="", names=self.names, boxes=boxes)
+
+
+def use_stub_models(latency: float = 0.0, weights=("yolov8n.pt",)):
+    """Serve the given weights from a StubModel through the shared model registry."""
+    from model_registry import model_registry
+    for name in weights:
+        model_registry.register(name, StubModel(latency), backend="stub")
@@ -0,0 +1,307 @@
+"""
+Benchmark suite: the service's hot paths on a synthetic clip, with results
+as JSON so runs on different commits can be compared.
+
+Cases (each in a fresh process, so peak RSS is the case's own):
+- analyze_annotated / analyze_report: VideoAnalyzer.analyze_video, latency
+  is the interval between finished frames
+- detector_crowd / detector_violence / detector_suspicious: the per-frame
+  path (process_frame: inference, alert logic, overlay)
+- mjpeg: drawing an overlay and JPEG-encoding a frame for live viewers
+- alerts: AlertDispatcher.send() against a local stub backend (latency is
+  the time send() holds the caller; fps is alerts delivered per second)
+- startup: a fresh interpreter importing main (import_ms, and which heavy
+  libraries that already pulled in) and then warming up the models the way
+  the service does after startup (ready_ms, from interpreter start)
+
+--model stub (default) serves yolov8n.pt from benchmarks/stub_model.py, a
+deterministic stand-in that needs no weights or network; --model real uses
+the real weights (downloaded on first use).
+
+Usage (from ml_service/):
+    python benchmarks/suite.py [--model stub|real] [--frames 300] [--output results.json]
+    python benchmarks/suite.py --compare base.json new.json [--tolerance 0.1]
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+
+from common import ML_SERVICE_DIR, Timer, make_synthetic_clip, read_frames
+
+CASES = ("analyze_annotated", "analyze_report", "detector_crowd", "detector_violence",
+         "detector_suspicious", "mjpeg", "alerts", "startup")
+
+# Runs in its own interpreter so nothing is imported before main
+STARTUP_PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import main
+imported = time.perf_counter()
+heavy = [name for name in ("torch", "ultralytics", "tensorflow") if name in sys.modules]
+if {stub!r}:
+    from stub_model import use_stub_models
+    use_stub_models({stub_latency!r})
+main.warmup.run()
+ready = time.perf_counter()
+print(json.dumps({{
+    "import_ms": round(1000 * (imported - start), 1),
+    "ready_ms": round(1000 * (ready - start), 1),
+    "heavy_imports_at_import": heavy,
+    "warmup": {{name: model["state"] for name, model in main.warmup.status()["models"].items()}},
+    "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+}}))
+"""
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KiB on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def summarize(latencies: list, count: int, seconds: float, **extra) -> dict:
+    latencies = np.array(latencies) * 1000
+    return {
+        "fps": round(count / seconds, 2) if seconds > 0 else 0.0,
+        "latency_ms": {p: round(float(np.percentile(latencies, q)), 3) if len(latencies) else None
+                       for p, q in (("p50", 50), ("p95", 95), ("p99", 99))},
+        "count": count,
+        **extra,
+    }
+
+
+# --- cases (run in a child process) ---
+
+def case_analyze(clip, output_mode, workdir):
+    from video_analyzer import VideoAnalyzer
+    analyzer = VideoAnalyzer()
+    analyzer.yolo_model(read_frames(clip, limit=1), verbose=False)    # load + warm up
+    stamps = []
+    with Timer() as t:
+        report = analyzer.analyze_video(clip, str(Path(workdir) / f"{output_mode}.mp4"),
+                                        output_mode=output_mode,
+                                        progress_callback=lambda done, total: stamps.append(time.perf_counter()))
+    return summarize(np.diff(stamps).tolist(), report["frames_analyzed"], t.seconds,
+                     detections=len(report["detections"]), frame_hits=report["frame_hits"])
+
+
+def case_detector(clip, name):
+    from detectors.crowd import CrowdDetector
+    from detectors.suspicious import SuspiciousDetector
+    from detectors.violence import ViolenceDetector
+    detector = {"crowd": CrowdDetector, "violence": ViolenceDetector,
+                "suspicious": SuspiciousDetector}[name]()
+    frames = read_frames(clip)
+    detector.process_frame(frames[0])   # load + warm up
+    latencies = []
+    boxes = 0
+    with Timer() as t:
+        for frame in frames:
+            with Timer() as frame_time:
+                outcome = detector.process_frame(frame)
+            latencies.append(frame_time.seconds)
+            boxes += len(outcome["detections"])
+    return summarize(latencies, len(frames), t.seconds, boxes=boxes)
+
+
+def case_mjpeg(clip):
+    from detectors.base_detector import BaseDetector
+    frames = read_frames(clip)
+    detections = [{"label": "Person", "confidence": 0.9, "box": (40 + 90 * i, 60, 100 + 90 * i, 200),
+                   "color": (0, 255, 0)} for i in range(5)]
+    latencies = []
+    sizes = []
+    with Timer() as t:
+        for frame in frames:
+            with Timer() as frame_time:
+                BaseDetector.draw_overlay(frame, detections)
+                ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 80])
+            latencies.append(frame_time.seconds)
+            sizes.append(len(buffer))
+    return summarize(latencies, len(frames), t.seconds, mean_kb=round(float(np.mean(sizes)) / 1024, 1))
+
+
+def case_alerts(workdir, alerts=2000):
+    from stub_backend import start_stub_backend
+    from alerts import AlertDeduplicator, AlertDispatcher
+    server, url, state = start_stub_backend(latency=0.01)
+    # Zero-length dedup window so every alert is delivered
+    dispatcher = AlertDispatcher(url, spool_path=str(Path(workdir) / "spool.jsonl"),
+                                 dedup=AlertDeduplicator(windows={"Crowd Density": 0.0}))
+    latencies = []
+    with Timer() as t:
+        for i in range(alerts):
+            payload = {"type": "Crowd Density", "description": f"bench alert {i}", "latitude": 40.7128,
+                       "longitude": -74.006, "confidence": 0.9, "severity": "medium"}
+            with Timer() as send_time:
+                dispatcher.send(payload)
+            latencies.append(send_time.seconds)
+        deadline = time.monotonic() + 60
+        while len(state.incidents) < alerts and time.monotonic() < deadline:
+            time.sleep(0.01)
+    dispatcher.close()
+    server.shutdown()
+    return summarize(latencies, len(state.incidents), t.seconds, requests=state.requests)
+
+
+def case_startup(workdir, model, stub_latency):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join([str(ML_SERVICE_DIR), str(ML_SERVICE_DIR / "benchmarks")]))
+    env.setdefault("MODEL_DIR", str(ML_SERVICE_DIR / "models"))
+    # main creates uploads/ and outputs/ in its working directory
+    cwd = Path(workdir) / "startup"
+    cwd.mkdir(exist_ok=True)
+    script = STARTUP_PROBE.format(stub=model == "stub", stub_latency=stub_latency)
+    proc = subprocess.run([sys.executable, "-c", script], cwd=cwd, env=env, capture_output=True, text=True)
+    if proc.returncode:
+        raise RuntimeError((proc.stderr.strip().splitlines() or ["startup probe failed"])[-1])
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def run_case(case, clip, workdir, model="stub", stub_latency=0.0):
+    if case == "startup":
+        return case_startup(workdir, model, stub_latency)
+    if case.startswith("analyze_"):
+        return case_analyze(clip, case[len("analyze_"):], workdir)
+    if case.startswith("detector_"):
+        return case_detector(clip, case[len("detector_"):])
+    if case == "mjpeg":
+        return case_mjpeg(clip)
+    return case_alerts(workdir)
+
+
+# --- driver ---
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ML_SERVICE_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_suite(args) -> dict:
+    results = {
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "model": args.model,
+        "stub_latency_ms": args.stub_latency_ms if args.model == "stub" else None,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "frames": args.frames,
+        "size": args.size,
+        "cases": {},
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        clip = args.video or make_synthetic_clip(f"{tmp}/synthetic.mp4", num_frames=args.frames,
+                                                 size=tuple(int(v) for v in args.size.split("x")))
+        results["video"] = args.video or "synthetic"
+        for case in args.cases:
+            command = [sys.executable, __file__, "--case", case, "--clip", clip, "--workdir", tmp,
+                       "--model", args.model, "--stub-latency-ms", str(args.stub_latency_ms)]
+            proc = subprocess.run(command, cwd=ML_SERVICE_DIR, capture_output=True, text=True)
+            try:
+                result = json.loads(proc.stdout.strip().splitlines()[-1])
+            except (IndexError, ValueError):
+                result = {"error": (proc.stderr.strip().splitlines() or ["no output"])[-1]}
+            results["cases"][case] = result
+            if "error" in result:
+                print(f"{case:>20}  failed: {result['error']}")
+            elif case == "startup":
+                print(f"{case:>20}  import {result['import_ms']:>8.1f} ms  ready {result['ready_ms']:>8.1f} ms  "
+                      f"heavy imports at import: {', '.join(result['heavy_imports_at_import']) or 'none'}  "
+                      f"rss {result['peak_rss_mb']:>7.1f} MB")
+            else:
+                latency = result["latency_ms"]
+                print(f"{case:>20}  {result['fps']:>9.1f} fps  p50 {latency['p50']:>8.2f} ms  "
+                      f"p95 {latency['p95']:>8.2f} ms  p99 {latency['p99']:>8.2f} ms  "
+                      f"rss {result['peak_rss_mb']:>7.1f} MB")
+    return results
+
+
+# (label, value of a case result, higher is better)
+COMPARED = (
+    ("fps", lambda r: r.get("fps"), True),
+    ("p95 ms", lambda r: (r.get("latency_ms") or {}).get("p95"), False),
+    ("import ms", lambda r: r.get("import_ms"), False),
+    ("ready ms", lambda r: r.get("ready_ms"), False),
+    ("rss MB", lambda r: r.get("peak_rss_mb"), False),
+)
+
+
+def compare(base_path, new_path, tolerance: float) -> int:
+    """Print per-case changes; returns the number of regressions beyond tolerance."""
+    base, new = json.loads(Path(base_path).read_text()), json.loads(Path(new_path).read_text())
+    print(f"base {base.get('commit')} ({base.get('model')})  ->  new {new.get('commit')} ({new.get('model')})")
+    regressions = 0
+    for case, result in new["cases"].items():
+        before = base["cases"].get(case)
+        if before is None or "error" in before or "error" in result:
+            print(f"{case:>20}  not comparable")
+            continue
+        cells = []
+        for name, get, higher_better in COMPARED:
+            old, value = get(before), get(result)
+            if old is None or value is None:
+                continue
+            delta = (value - old) / old if old else 0.0
+            worse = -delta if higher_better else delta
+            flag = " !" if worse > tolerance else ""
+            regressions += bool(flag)
+            cells.append(f"{name} {old:.2f} -> {value:.2f} ({100 * delta:+.1f}%){flag}")
+        print(f"{case:>20}  " + "   ".join(cells))
+    print(f"{regressions} regression(s) beyond {100 * tolerance:.0f}%")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", choices=("stub", "real"), default="stub")
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Per-frame cost added by the stub model")
+    parser.add_argument("--video", help="Sample clip (a synthetic clip is generated if omitted)")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--size", default="640x480")
+    parser.add_argument("--cases", nargs="+", default=list(CASES), choices=CASES)
+    parser.add_argument("--output", help="Write the results JSON here")
+    parser.add_argument("--compare", nargs=2, metavar=("BASE", "NEW"), help="Compare two results files")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change counted as a regression")
+    # Internal: run one case in this process and print its JSON
+    parser.add_argument("--case", help=argparse.SUPPRESS)
+    parser.add_argument("--clip", help=argparse.SUPPRESS)
+    parser.add_argument("--workdir", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.compare:
+        sys.exit(1 if compare(*args.compare, args.tolerance) else 0)
+
+    if args.case:
+        if args.model == "stub" and args.case != "startup":
+            from stub_model import use_stub_models
+            use_stub_models(args.stub_latency_ms / 1000)
+        try:
+            result = run_case(args.case, args.clip, args.workdir, args.model, args.stub_latency_ms / 1000)
+            result.setdefault("peak_rss_mb", round(peak_rss_mb(), 1))
+        except Exception as e:
+            result = {"error": f"{type(e).__name__}: {e}"}
+        print(json.dumps(result))
+        return
+
+    results = run_suite(args)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        Path(args.output).write_text(text + "\n")
+        print(f"Results written to {args.output}")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+import asyncio
+import threading
+
+
+class FrameBroadcaster:
+    """
+    Fan-out of encoded frames from one producer thread to many async viewers.
+
+    The producer encodes each frame once and publish()es the bytes; every
+    subscriber reads the latest published frame. A viewer that is slower
+    than the producer skips straight to the newest frame instead of
+    queueing old ones or holding the producer up.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.subscribers = set()    # (event loop, asyncio.Event) per viewer
+        self.latest = None
+        self.seq = 0
+        self.closed = False
+        self.frames_skipped = 0
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self.subscribers)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self.subscribers)
+
+    def publish(self, data: bytes):
+        """Called from the producer thread with one encoded frame."""
+        with self.lock:
+            self.latest = data
+            self.seq += 1
+            subscribers = list(self.subscribers)
+        self._wake(subscribers)
+
+    def close(self):
+        """End every subscription once it has sent the last frame."""
+        with self.lock:
+            self.closed = True
+            subscribers = list(self.subscribers)
+        self._wake(subscribers)
+
+    @staticmethod
+    def _wake(subscribers):
+        for loop, event in subscribers:
+            try:
+                loop.call_soon_threadsafe(event.set)
+            except RuntimeError:
+                pass  # viewer's event loop already closed
+
+    async def subscribe(self):
+        """Async iterator over published frames, newest first, skipping any missed."""
+        entry = (asyncio.get_running_loop(), asyncio.Event())
+        with self.lock:
+            self.subscribers.add(entry)
+        seen = 0
+        try:
+            while True:
+                with self.lock:
+                    seq, data, closed = self.seq, self.latest, self.closed
+                if seq != seen and data is not None:
+                    if seen and seq - seen > 1:
+                        self.frames_skipped += seq - seen - 1
+                    seen = seq
+                    yield data
+                    continue
+                if closed:
+                    return
+                await entry[1].wait()
+                entry[1].clear()
+        finally:
+            with self.lock:
+                self.subscribers.discard(entry)
@@ -1,104 +1,132 @@
-import time
-import requests
 import csv
-import io
-import pyaudio
+import importlib.util
+import os
+import threading
+from pathlib import Path
 import numpy as np
+from audio_engine import SAMPLE_RATE, AudioStreamEngine, open_audio_source
+from metrics import StageMetrics
+from model_registry import MODEL_DIR
 from .base_detector import BaseDetector
 
-try:
-    import tensorflow as tf
-    import tensorflow_hub as hub
-    TF_AVAILABLE = True
-except ImportError:
-    TF_AVAILABLE = False
+# TensorFlow takes seconds to import, so only check it's installed here; it's imported with the model
+TF_AVAILABLE = all(importlib.util.find_spec(name) is not None
+                   for name in ("tensorflow", "tensorflow_hub"))
+if not TF_AVAILABLE:
     print("Warning: TensorFlow not found. Audio Detection will be disabled.")
 
+# TF Hub handle or local SavedModel directory. Downloads are cached under
+# MODEL_DIR/tfhub (TFHUB_CACHE_DIR), so later starts work offline.
+YAMNET_MODEL = os.environ.get("YAMNET_MODEL", "https://tfhub.dev/google/yamnet/1")
+
+_yamnet = None
+_yamnet_lock = threading.Lock()
+
+
+def load_yamnet():
+    """The YAMNet model and its class names, loaded once per process."""
+    global _yamnet
+    with _yamnet_lock:
+        if _yamnet is None:
+            os.environ.setdefault("TFHUB_CACHE_DIR", str(Path(MODEL_DIR) / "tfhub"))
+            import tensorflow as tf
+            import tensorflow_hub as hub
+            print("Loading YAMNet Model...")
+            model = hub.load(YAMNET_MODEL)
+            class_map_path = model.class_map_path().numpy().decode('utf-8')
+            with tf.io.gfile.GFile(class_map_path) as csvfile:
+                class_names = [row['display_name'] for row in csv.DictReader(csvfile)]
+            print("YAMNet Loaded.")
+            _yamnet = (model, class_names)
+    return _yamnet
+
 class AudioDetector(BaseDetector):
+    # YAMNet looks at 0.975 s of audio; windows overlap by half so a sound
+    # cut by one window's edge is whole in the next
+    window_seconds = 0.975
+    hop_seconds = 0.4875
+    score_threshold = 0.3
+
     def __init__(self):
         super().__init__()
-        self.backend_url = "http://localhost:5000/api/incidents"
-        
+
         if not TF_AVAILABLE:
             print("AudioDetector: TensorFlow dependencies missing. Please install 'tensorflow-cpu' and 'tensorflow_hub'.")
-            return
-
-        # YAMNet Model
-        print("Loading YAMNet Model...")
-        try:
-            self.model = hub.load('https://tfhub.dev/google/yamnet/1')
-            self.class_map_path = self.model.class_map_path().numpy().decode('utf-8')
-            self.class_names = self.load_class_names(self.class_map_path)
-            print("YAMNet Loaded.")
-        except Exception as e:
-            print(f"Failed to load YAMNet: {e}")
-            self.model = None
 
         # Audio Config
-        self.sample_rate = 16000
-        self.chunk_size = 16000 * 1  # 1 second chunks (YAMNet native is 0.975s)
-        self.format = pyaudio.paInt16
-        self.channels = 1
-        
-        # Target Classes (Indices will be looked up)
+        self.sample_rate = SAMPLE_RATE
+        self.engine = None
+        self.events = []    # sounds found in the current/last stream, with their time
+
+        # Target Classes (Indices are looked up when the model loads)
         self.target_keywords = ["Gunshot", "Scream", "Explosion", "Glass", "Alarm"]
-        self.target_indices = [i for i, name in enumerate(self.class_names) if any(k in name for k in self.target_keywords)]
+        self.class_names = []
+        self.target_mask = np.zeros(0, dtype=bool)
 
-    def load_class_names(self, csv_path):
-        with tf.io.gfile.GFile(csv_path) as csvfile:
-            reader = csv.DictReader(csvfile)
-            return [row['display_name'] for row in reader]
+    def load_model(self):
+        # YAMNet Model (shared by every AudioDetector, see load_yamnet)
+        model, self.class_names = load_yamnet()
+        self.target_mask = np.array([any(k in name for k in self.target_keywords)
+                                     for name in self.class_names], dtype=bool)
+        return model
 
     def process_stream(self, source):
-        if not TF_AVAILABLE or not hasattr(self, 'model') or self.model is None:
+        """
+        source: "0" for the microphone, otherwise a file (WAV, or the audio
+        track of a video) or stream URL, decoded through ffmpeg.
+        """
+        if not TF_AVAILABLE:
             print("Audio detection unavailable due to missing dependencies or model load failure.")
             return
+        try:
+            self.model
+        except Exception as e:
+            print(f"Failed to load YAMNet: {e}")
+            return
 
-        if source == "0":
-            self.listen_to_mic()
-        else:
-            print("File analysis not supported in this simplified YAMNet implementation yet.")
-
-    def listen_to_mic(self):
-        p = pyaudio.PyAudio()
-        stream = p.open(format=self.format,
-                        channels=self.channels,
-                        rate=self.sample_rate,
-                        input=True,
-                        frames_per_buffer=self.chunk_size)
+        try:
+            audio = open_audio_source(source, self.sample_rate, int(self.hop_seconds * self.sample_rate))
+        except Exception as e:
+            print(f"Could not open audio source {source}: {e}")
+            return
 
         print(f"Listening for Sound Events: {self.target_keywords}...")
-
+        self.events = []
+        self.engine = AudioStreamEngine(audio.read, self.infer_window, self.handle_window,
+                                        sample_rate=self.sample_rate,
+                                        window_seconds=self.window_seconds,
+                                        hop_seconds=self.hop_seconds, live=audio.live,
+                                        stage_metrics=StageMetrics(self.camera_id or "local",
+                                                                   type(self).__name__))
         try:
-            while True:
-                data = stream.read(self.chunk_size, exception_on_overflow=False)
-                # Convert to numpy array (-1.0 to 1.0)
-                waveform = np.frombuffer(data, dtype=np.int16) / 32768.0
-                
-                # Run Inference
-                scores, embeddings, spectrogram = self.model(waveform)
-                
-                # Get Top Prediction
-                mean_scores = np.mean(scores, axis=0)
-                top_class_index = np.argmax(mean_scores)
-                top_score = mean_scores[top_class_index]
-                label = self.class_names[top_class_index]
-
-                # Check if it's a target class
-                if top_score > 0.3: # Threshold
-                    # print(f"Detected: {label} ({top_score:.2f})")
-                     if any(k in label for k in self.target_keywords):
-                        print(f"CRITICAL SOUND DETECTED: {label} ({top_score:.2f})")
-                        self.send_alert(label, top_score)
-                
-                # Small sleep if needed, though read() blocks
-                
+            self.engine.run()
         except Exception as e:
             print(f"Audio processing error: {e}")
         finally:
-            stream.stop_stream()
-            stream.close()
-            p.terminate()
+            audio.close()
+
+    def listen_to_mic(self):
+        self.process_stream("0")
+
+    def infer_window(self, waveform):
+        # Per-patch class scores, (patches, 521)
+        scores, embeddings, spectrogram = self.model(waveform)
+        return np.asarray(scores)
+
+    def handle_window(self, start_seconds, scores):
+        # Alert only when a target class is the most likely sound of the window
+        mean_scores = scores.mean(axis=0)
+        top_class_index = int(np.argmax(mean_scores))
+        top_score = float(mean_scores[top_class_index])
+        if top_score > self.score_threshold and self.target_mask[top_class_index]:
+            label = self.class_names[top_class_index]
+            print(f"CRITICAL SOUND DETECTED: {label} ({top_score:.2f}) at {start_seconds:.2f}s")
+            self.events.append({"label": label, "confidence": top_score, "time": round(start_seconds, 3)})
+            # Overlapping windows report the same sound twice; the alert dispatcher folds repeats
+            self.send_alert(label, top_score)
+
+    def get_metrics(self) -> dict:
+        return self.engine.metrics() if self.engine is not None else {}
 
     def send_alert(self, label, confidence):
         payload = {
@@ -110,10 +138,8 @@ class AudioDetector(BaseDetector):
             "severity": "critical",
             "status": "verified"
         }
-        try:
-            requests.post(self.backend_url, json=payload)
-        except Exception as e:
-            pass # print(f"Failed to send alert: {e}")
+        self.dispatch_alert(payload)
 
     def cleanup(self):
-        pass
+        if self.engine is not None:
+            self.engine.stop()
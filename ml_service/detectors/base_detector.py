@@ -1,8 +1,57 @@
 from abc import ABC, abstractmethod
+import threading
+import time
+
+import cv2
+
+from alerts import alert_dispatcher
+from frame_gate import FrameGate
+from metrics import StageMetrics
+from model_registry import model_registry
+from pipeline import FramePipeline, open_capture
+from scheduler import FrameScheduler, is_live_source
 
 class BaseDetector(ABC):
+    # Analysis rate in frames/sec, and the faster rate used right after activity
+    target_fps = 5.0
+    active_fps = None
+    # Weights loaded through the shared model registry on first use of self.model
+    model_weights = None
+    # Whether frames from different cameras may share one infer() call
+    shares_batches = True
+    # Under overload, detectors with a larger priority number are degraded
+    # first and restored last; optional ones may be paused (see overload.py)
+    priority = 1
+    optional = False
+
     def __init__(self):
-        pass
+        self.pipeline = None
+        self.scheduler = None
+        self.stage_metrics = None
+        # Motion gate and regions of interest for run_pipeline (see frame_gate.py)
+        self.gate = FrameGate()
+        # Set by the stream manager; tags alerts and keys their deduplication
+        self.camera_id = None
+        # Model input size; None for the model's own (lowered under overload)
+        self.imgsz = None
+        # Optional detect-then-track (see keyframe_tracker.py): the model only
+        # runs on keyframes and boxes are carried through the frames between
+        self.tracker = None
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """The detector's model handle, loaded lazily on first access."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    self._model = self.load_model()
+        return self._model
+
+    def load_model(self):
+        """Resolve the detector's model; override to choose weights at load time."""
+        return model_registry.get_model(self.model_weights)
 
     @abstractmethod
     def process_stream(self, source: str):
@@ -18,3 +67,172 @@ class BaseDetector(ABC):
         Release resources (cameras, streams, etc.)
         """
         pass
+
+    def infer(self, frames: list) -> list:
+        """
+        Run the detector's model on a batch of frames.
+        Returns one result per frame, in the same order.
+        """
+        raise NotImplementedError
+
+    def predict_args(self) -> dict:
+        """Extra keyword arguments for model calls in infer(): the input size, if lowered."""
+        return {"imgsz": self.imgsz} if self.imgsz else {}
+
+    def batch_key(self):
+        """Detectors with equal keys can run each other's frames in one infer() call."""
+        if self.shares_batches:
+            return (type(self).__name__, self.imgsz)
+        return (type(self).__name__, id(self))
+
+    def handle_result(self, frame, result) -> bool:
+        """
+        Act on one frame's inference result (counting, alerting, ...).
+        Called in frame order from the pipeline's sink thread.
+        Returns True if the frame showed activity worth sampling faster for.
+        """
+        raise NotImplementedError
+
+    def describe(self, result) -> list:
+        """
+        Turn one frame's result into overlay detections: dicts with
+        'label', 'confidence', 'box' (x1, y1, x2, y2) and 'color' (BGR).
+        """
+        return []
+
+    def process_frame(self, frame) -> dict:
+        """
+        Per-frame API: run inference once, then alert and build the overlay
+        from that same result.
+
+        Returns dict with keys: detections, overlay (annotated copy), active
+        """
+        if self.tracker is not None:
+            result = self.tracker.infer(self.infer, [frame])[0]
+        else:
+            result = self.infer([frame])[0]
+        return self.finish_frame(frame, result)
+
+    def finish_frame(self, frame, result, draw: bool = True) -> dict:
+        """Alerting + overlay for a result already computed by infer()."""
+        active = self.handle_result(frame, result)
+        detections = self.describe(result)
+        overlay = self.draw_overlay(frame.copy(), detections) if draw else None
+        return {"detections": detections, "overlay": overlay, "active": bool(active)}
+
+    @staticmethod
+    def draw_overlay(frame, detections: list):
+        """Draw detections onto frame in place and return it."""
+        for det in detections:
+            x1, y1, x2, y2 = det["box"]
+            color = det.get("color", (0, 255, 0))
+            cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+            text = det["label"]
+            if det.get("confidence") is not None:
+                text = f"{text} ({det['confidence']:.2f})"
+            cv2.putText(frame, text, (x1, y1-10),
+                        cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 2)
+        return frame
+
+    @staticmethod
+    def box_coords(box) -> tuple:
+        return tuple(map(int, box.xyxy[0]))
+
+    def dispatch_alert(self, payload: dict, box=None, frame_shape=None):
+        """
+        Queue an alert tagged with this detector's camera; batching, delivery
+        and retries happen in the background (see alerts.AlertDispatcher).
+        box/frame_shape place it in the frame, so repeats in the same region
+        are folded into one incident while alerts elsewhere stay separate.
+        """
+        if self.camera_id is not None:
+            payload["camera_id"] = self.camera_id
+        region = None
+        if box is not None and frame_shape is not None:
+            region = alert_dispatcher.dedup.region_of(box, frame_shape)
+        alert_dispatcher.send(payload, region=region)
+
+    def run_pipeline(self, source: str):
+        """
+        Run decode -> infer -> handle_result on separate threads until the
+        source ends or stop_pipeline() is called. The scheduler skips frames
+        to hold target_fps and inference always gets the freshest frame.
+        Frames the gate finds unchanged are skipped, and the model only sees
+        the gate's regions of interest. With a tracker set, frames between
+        keyframes get tracked boxes instead of a model call. Stage latencies
+        and frame counters are recorded under this detector's camera (see
+        metrics.StageMetrics).
+        """
+        cap = open_capture(source)
+        self.scheduler = FrameScheduler(cap, self.target_fps, self.active_fps,
+                                        live=is_live_source(source))
+        self.stage_metrics = StageMetrics(self.camera_id or "local", type(self).__name__)
+        metrics = self.stage_metrics
+
+        def read():
+            while True:
+                began = time.perf_counter()
+                frame = self.scheduler.read()
+                if frame is None:
+                    return None
+                checked = time.perf_counter()
+                passed = self.gate.check(frame)
+                metrics.decode.observe(checked - began)
+                metrics.gate.observe(time.perf_counter() - checked)
+                metrics.frames_read.inc()
+                if passed:
+                    return frame
+                metrics.frames_gated.inc()
+
+        def infer(frames):
+            results = [None] * len(frames)
+            tracker = self.tracker
+            if tracker is not None:
+                for i, frame in enumerate(frames):
+                    began = time.perf_counter()
+                    results[i] = tracker.track(frame)
+                    metrics.track.observe(time.perf_counter() - began)
+                    if results[i] is not None:
+                        metrics.frames_tracked.inc()
+            todo = [i for i, result in enumerate(results) if result is None]
+            if todo:
+                began = time.perf_counter()
+                detected = self.gate.infer(self.infer, [frames[i] for i in todo])
+                metrics.infer.observe(time.perf_counter() - began)
+                metrics.frames_inferred.inc(len(todo))
+                for i, result in zip(todo, detected):
+                    results[i] = tracker.update(frames[i], result) if tracker is not None else result
+            return results
+
+        self.pipeline = FramePipeline(read, infer, self._on_result,
+                                      name=type(self).__name__, latest_only=True,
+                                      on_drop=metrics.frames_dropped.inc)
+        try:
+            self.pipeline.run()
+        finally:
+            cap.release()
+            self.pipeline = None
+
+    def _on_result(self, frame, result):
+        began = time.perf_counter()
+        outcome = self.finish_frame(frame, result, draw=False)
+        self.stage_metrics.annotate.observe(time.perf_counter() - began)
+        self.scheduler.frame_done(frame, active=outcome["active"])
+
+    def stop_pipeline(self):
+        if self.pipeline is not None:
+            self.pipeline.stop()
+
+    def get_metrics(self) -> dict:
+        """Lag, processed FPS and frame counters for the current/last stream."""
+        if self.scheduler is None:
+            return {}
+        metrics = self.scheduler.metrics()
+        metrics["gate"] = self.gate.stats()
+        if self.tracker is not None:
+            metrics["tracker"] = self.tracker.stats()
+        pipeline = self.pipeline
+        if pipeline is not None:
+            metrics["frames_dropped"] = pipeline.dropped
+            metrics["queue_depths"] = pipeline.queue_depths()
+        return metrics
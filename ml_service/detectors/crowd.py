@@ -1,47 +1,48 @@
-from ultralytics import YOLO
 import cv2
-import time
-import requests
 from .base_detector import BaseDetector
 
 class CrowdDetector(BaseDetector):
-    def __init__(self):
-        super().__init__()
-        # Load a pretrained YOLOv8n model
-        self.model = YOLO("yolov8n.pt") 
-        self.backend_url = "http://localhost:5000/api/incidents" # Node.js Backend
+    # Sample slowly to avoid flooding, faster while people are in view
+    target_fps = 1.0
+    active_fps = 2.0
+    # Pretrained YOLOv8n model, shared through the model registry
+    model_weights = "yolov8n.pt"
+    # Counting is the first thing to give up under overload
+    priority = 2
+    optional = True
 
     def process_stream(self, source):
         # Handle webcam (0) or video file/url
         try:
-            cap_source = 0 if source == "0" else source
-            cap = cv2.VideoCapture(cap_source)
-            
-            while cap.isOpened():
-                success, frame = cap.read()
-                if not success:
-                    break
-
-                # Run YOLOv8 inference on the frame
-                results = self.model(frame, classes=[0], verbose=False) # 0 is 'person' class in COCO
-
-                # Count people
-                person_count = len(results[0].boxes)
-                
-                # Simple Logic: If > 10 people -> Crowd Incident
-                if person_count > 10:
-                    print(f"High Density Detected: {person_count} people")
-                    self.send_alert(person_count)
-                
-                # Rate limit processing to avoid flooding
-                time.sleep(1) 
-
-            cap.release()
+            self.run_pipeline(source)
         except Exception as e:
             print(f"Error in CrowdDetector: {e}")
         finally:
             cv2.destroyAllWindows()
 
+    def infer(self, frames):
+        # Run YOLOv8 inference on the frames
+        return self.model(frames, classes=[0], verbose=False, **self.predict_args()) # 0 is 'person' class in COCO
+
+    def handle_result(self, frame, result):
+        # Count people
+        person_count = len(result.boxes)
+        
+        # Simple Logic: If > 10 people -> Crowd Incident
+        if person_count > 10:
+            print(f"High Density Detected: {person_count} people")
+            self.send_alert(person_count)
+
+        # Sample faster while anyone is in view
+        return person_count > 0
+
+    def describe(self, result):
+        return [
+            {"label": "Person", "confidence": float(box.conf[0]),
+             "box": self.box_coords(box), "color": (0, 255, 0)}
+            for box in result.boxes
+        ]
+
     def send_alert(self, count):
         payload = {
             "type": "Crowd Density",
@@ -51,11 +52,8 @@ class CrowdDetector(BaseDetector):
             "confidence": 0.9,
             "severity": "high" if count > 20 else "medium"
         }
-        try:
-            requests.post(self.backend_url, json=payload)
-        except Exception as e:
-            print(f"Failed to send alert: {e}")
+        self.dispatch_alert(payload)
 
     def cleanup(self):
-        pass
+        self.stop_pipeline()
 
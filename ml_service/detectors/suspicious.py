@@ -1,64 +1,75 @@
-from ultralytics import YOLO
 import cv2
 import time
-import requests
 from .base_detector import BaseDetector
+from .track_store import TrackStore
 
 class SuspiciousDetector(BaseDetector):
+    target_fps = 10.0 # track slightly faster than crowd
+    active_fps = 15.0
+    # Registry handles have their own predictor, so tracker state isn't shared
+    # with other detectors using the same weights
+    model_weights = "yolov8n.pt"
+    # Tracking is stateful per camera, so never batch with other cameras
+    shares_batches = False
+
     def __init__(self):
         super().__init__()
-        self.model = YOLO("yolov8n.pt") 
-        self.backend_url = "http://localhost:5000/api/incidents"
-        self.track_history = {} # track_id -> {start_time, last_seen_time, alerted}
         self.loitering_threshold = 10 # seconds
+        # track_id -> TrackRecord(start_time, last_seen_time, alerted), bounded by TTL and size
+        self.track_history = TrackStore(ttl=30.0, max_tracks=1024)
 
     def process_stream(self, source):
         try:
-            cap_source = 0 if source == "0" else source
-            cap = cv2.VideoCapture(cap_source)
-            
-            while cap.isOpened():
-                success, frame = cap.read()
-                if not success:
-                    break
-
-                # Run YOLOv8 Tracking
-                # persist=True is crucial for tracking
-                results = self.model.track(frame, classes=[0], persist=True, verbose=False)
-
-                if results and results[0].boxes.id is not None:
-                    track_ids = results[0].boxes.id.int().cpu().tolist()
-                    current_time = time.time()
-
-                    for track_id in track_ids:
-                        if track_id not in self.track_history:
-                            self.track_history[track_id] = {
-                                "start_time": current_time,
-                                "last_seen_time": current_time,
-                                "alerted": False
-                            }
-                        else:
-                            self.track_history[track_id]["last_seen_time"] = current_time
-                            
-                            # Check duration
-                            duration = current_time - self.track_history[track_id]["start_time"]
-                            if duration > self.loitering_threshold and not self.track_history[track_id]["alerted"]:
-                                print(f"Suspicious Activity (Loitering) Detected: ID {track_id} for {int(duration)}s")
-                                self.send_alert(track_id, duration)
-                                self.track_history[track_id]["alerted"] = True
-                
-                # Cleanup old tracks (optional, to save memory)
-                # self.cleanup_old_tracks()
-                
-                time.sleep(0.1) # track slightly faster than crowd
-
-            cap.release()
+            self.run_pipeline(source)
         except Exception as e:
             print(f"Error in SuspiciousDetector: {e}")
         finally:
             cv2.destroyAllWindows()
 
-    def send_alert(self, track_id, duration):
+    def infer(self, frames):
+        # Run YOLOv8 Tracking
+        # persist=True is crucial for tracking
+        return self.model.track(frames, classes=[0], persist=True, verbose=False, **self.predict_args())
+
+    def handle_result(self, frame, result):
+        if result.boxes.id is not None:
+            track_ids = result.boxes.id.int().cpu().tolist()
+            current_time = time.time()
+
+            for box, track_id in zip(result.boxes, track_ids):
+                track = self.track_history.touch(track_id, current_time)
+
+                # Check duration
+                duration = current_time - track.start_time
+                if duration > self.loitering_threshold and not track.alerted:
+                    print(f"Suspicious Activity (Loitering) Detected: ID {track_id} for {int(duration)}s")
+                    self.send_alert(track_id, duration, self.box_coords(box), frame.shape)
+                    track.alerted = True
+
+        # Cleanup old tracks to bound memory on 24/7 cameras
+        self.cleanup_old_tracks()
+
+        return len(result.boxes) > 0
+
+    def cleanup_old_tracks(self):
+        self.track_history.evict_expired(time.time())
+
+    def describe(self, result):
+        if result.boxes.id is None:
+            return []
+        detections = []
+        for box, track_id in zip(result.boxes, result.boxes.id.int().cpu().tolist()):
+            track = self.track_history.get(track_id)
+            loitering = track is not None and track.alerted
+            detections.append({
+                "label": f"LOITERING ID {track_id}" if loitering else f"ID {track_id}",
+                "confidence": float(box.conf[0]),
+                "box": self.box_coords(box),
+                "color": (0, 0, 255) if loitering else (0, 255, 255),
+            })
+        return detections
+
+    def send_alert(self, track_id, duration, box=None, frame_shape=None):
         payload = {
             "type": "Suspicious Activity",
             "description": f"Person (ID: {track_id}) loitering for {int(duration)} seconds",
@@ -68,10 +79,7 @@ class SuspiciousDetector(BaseDetector):
             "severity": "medium",
             "status": "pending"
         }
-        try:
-            requests.post(self.backend_url, json=payload)
-        except Exception as e:
-            print(f"Failed to send alert: {e}")
+        self.dispatch_alert(payload, box, frame_shape)
 
     def cleanup(self):
-        pass
+        self.stop_pipeline()
@@ -0,0 +1,70 @@
+from collections import OrderedDict
+
+
+class TrackRecord:
+    __slots__ = ("track_id", "start_time", "last_seen_time", "alerted")
+
+    def __init__(self, track_id: int, now: float):
+        self.track_id = track_id
+        self.start_time = now
+        self.last_seen_time = now
+        self.alerted = False
+
+
+class TrackStore:
+    """
+    Bounded track_id -> TrackRecord map for long-running cameras.
+
+    Records are kept in last-seen order, so expired ones are always at the
+    front and eviction is cheap. A track not seen for `ttl` seconds is
+    dropped, and the least recently seen track is dropped whenever the store
+    would exceed `max_tracks`. An ID that comes back after more than `ttl`
+    seconds is treated as a new person, since trackers reuse IDs.
+    """
+
+    def __init__(self, ttl: float = 30.0, max_tracks: int = 1024):
+        self.ttl = ttl
+        self.max_tracks = max_tracks
+        self.tracks = OrderedDict()
+        self.evicted = 0
+        self.reused = 0
+
+    def touch(self, track_id: int, now: float) -> TrackRecord:
+        """Record a sighting of track_id and return its (possibly new) record."""
+        record = self.tracks.get(track_id)
+        if record is not None and now - record.last_seen_time > self.ttl:
+            del self.tracks[track_id]
+            self.reused += 1
+            record = None
+
+        if record is None:
+            record = TrackRecord(track_id, now)
+            self.tracks[track_id] = record
+            while len(self.tracks) > self.max_tracks:
+                self.tracks.popitem(last=False)
+                self.evicted += 1
+        else:
+            record.last_seen_time = now
+            self.tracks.move_to_end(track_id)
+        return record
+
+    def get(self, track_id: int):
+        return self.tracks.get(track_id)
+
+    def evict_expired(self, now: float) -> int:
+        """Drop tracks not seen for ttl seconds; returns how many were dropped."""
+        dropped = 0
+        while self.tracks:
+            oldest = next(iter(self.tracks.values()))
+            if now - oldest.last_seen_time <= self.ttl:
+                break
+            self.tracks.popitem(last=False)
+            dropped += 1
+        self.evicted += dropped
+        return dropped
+
+    def __len__(self):
+        return len(self.tracks)
+
+    def __contains__(self, track_id):
+        return track_id in self.tracks
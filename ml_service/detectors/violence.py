@@ -1,76 +1,104 @@
 import cv2
-import time
-import requests
 import numpy as np
-from ultralytics import YOLO
+from model_registry import model_registry
 from .base_detector import BaseDetector
 
 class ViolenceDetector(BaseDetector):
+    target_fps = 10.0
+    active_fps = 15.0
+    # Weapons and fights are degraded last and restored first under overload
+    priority = 0
+
     def __init__(self):
         super().__init__()
-        self.backend_url = "http://localhost:5000/api/incidents"
         
+        # Resolved when the model is first loaded (see load_model)
+        self.specialized_model = None
+
+        # COCO Classes: 43: knife, 34: baseball bat, 76: scissors
+        self.weapon_classes = [43, 34] 
+
+    def load_model(self):
         # NOTE: Ideally use a model trained on "Real Life Violence" dataset
         # If user downloads 'violence.pt', we use it. Otherwise fallback to standard YOLOv8n
         # and checking for aggressive weapons (Knife, Bat, etc.)
-        try:
-             # Attempt to load specialized model
-             # User should put 'violence.pt' in the root or detectors folder
-             self.model = YOLO("violence.pt")
-             self.specialized_model = True
-             print("Loaded Custom Violence Model (violence.pt)")
-        except:
-             print("Custom 'violence.pt' not found. Falling back to standard YOLOv8n + Weapon Detection.")
-             self.model = YOLO("yolov8n.pt") 
-             self.specialized_model = False
-             
-        # COCO Classes: 43: knife, 34: baseball bat, 76: scissors
-        self.weapon_classes = [43, 34] 
+        # Attempt to load specialized model
+        # User should put 'violence.pt' in the working directory or MODEL_DIR (models/)
+        model = model_registry.try_get_model("violence.pt")
+        if model is not None:
+            self.specialized_model = True
+            print("Loaded Custom Violence Model (violence.pt)")
+            return model
+
+        print("Custom 'violence.pt' not found. Falling back to standard YOLOv8n + Weapon Detection.")
+        self.specialized_model = False
+        return model_registry.get_model("yolov8n.pt")
 
     def process_stream(self, source):
         try:
-            cap_source = 0 if source == "0" else source
-            cap = cv2.VideoCapture(cap_source)
-            
-            while cap.isOpened():
-                success, frame = cap.read()
-                if not success:
-                    break
-
-                # Run Inference
-                # If specialized, it likely has 2 classes: 0: Non-Violence, 1: Violence
-                # If standard, we check for weapons
-                if self.specialized_model:
-                    results = self.model(frame, verbose=False)
-                    # Assuming 'violence' is class 1 (or by name)
-                    for r in results:
-                        for box in r.boxes:
-                            cls_id = int(box.cls[0])
-                            conf = float(box.conf[0])
-                            label = self.model.names[cls_id]
-                            
-                            if label.lower() in ['violence', 'fight'] and conf > 0.6:
-                                print(f"FIGHT DETECTED: {label} ({conf:.2f})")
-                                self.send_alert("Violent Altercation", f"Model detected {label}")
-                else:
-                    # Fallback Standard Logic
-                    results = self.model(frame, classes=[0] + self.weapon_classes, verbose=False)
-                    detected_config = results[0].boxes.cls.cpu().tolist()
-                    weapons_found = [cls_id for cls_id in detected_config if cls_id in self.weapon_classes]
-
-                    if weapons_found:
-                        print(f"Weapon Detected! Class IDs: {weapons_found}")
-                        self.send_alert("Weapon Detected", "High probability of violence: Weapon sighted")
-
-                time.sleep(0.1) 
-
-            cap.release()
+            self.run_pipeline(source)
         except Exception as e:
             print(f"Error in ViolenceDetector: {e}")
         finally:
             cv2.destroyAllWindows()
 
-    def send_alert(self, type_label, description):
+    def infer(self, frames):
+        # Run Inference
+        # If specialized, it likely has 2 classes: 0: Non-Violence, 1: Violence
+        # If standard, we check for weapons
+        model = self.model
+        if self.specialized_model:
+            return model(frames, verbose=False, **self.predict_args())
+        return model(frames, classes=[0] + self.weapon_classes, verbose=False, **self.predict_args())
+
+    def handle_result(self, frame, result):
+        # Resolve the model (and specialized_model) even if another camera's
+        # detector ran this frame's batch
+        model = self.model
+        if self.specialized_model:
+            # Assuming 'violence' is class 1 (or by name)
+            for box in result.boxes:
+                cls_id = int(box.cls[0])
+                conf = float(box.conf[0])
+                label = model.names[cls_id]
+                
+                if label.lower() in ['violence', 'fight'] and conf > 0.6:
+                    print(f"FIGHT DETECTED: {label} ({conf:.2f})")
+                    self.send_alert("Violent Altercation", f"Model detected {label}",
+                                    self.box_coords(box), frame.shape)
+        else:
+            # Fallback Standard Logic
+            detected_config = result.boxes.cls.cpu().tolist()
+            weapons_found = [cls_id for cls_id in detected_config if cls_id in self.weapon_classes]
+
+            if weapons_found:
+                print(f"Weapon Detected! Class IDs: {weapons_found}")
+                weapon_box = result.boxes[detected_config.index(weapons_found[0])]
+                self.send_alert("Weapon Detected", "High probability of violence: Weapon sighted",
+                                self.box_coords(weapon_box), frame.shape)
+
+        return len(result.boxes) > 0
+
+    def describe(self, result):
+        model = self.model
+        detections = []
+        for box in result.boxes:
+            cls_id = int(box.cls[0])
+            conf = float(box.conf[0])
+            if self.specialized_model:
+                label = model.names[cls_id]
+                if label.lower() in ['violence', 'fight'] and conf > 0.6:
+                    detections.append({"label": "VIOLENCE", "confidence": conf,
+                                       "box": self.box_coords(box), "color": (255, 0, 0)})
+            elif cls_id in self.weapon_classes:
+                detections.append({"label": "WEAPON", "confidence": conf,
+                                   "box": self.box_coords(box), "color": (0, 0, 255)})
+            else:
+                detections.append({"label": "Person", "confidence": conf,
+                                   "box": self.box_coords(box), "color": (0, 255, 0)})
+        return detections
+
+    def send_alert(self, type_label, description, box=None, frame_shape=None):
         payload = {
             "type": "Violence",
             "description": description,
@@ -80,11 +108,7 @@ class ViolenceDetector(BaseDetector):
             "severity": "critical",
             "status": "verified"
         }
-        try:
-             # Basic debounce could go here
-            requests.post(self.backend_url, json=payload)
-        except Exception as e:
-            pass # print(f"Failed to send alert: {e}")
+        self.dispatch_alert(payload, box, frame_shape)
 
     def cleanup(self):
-        pass
+        self.stop_pipeline()
@@ -0,0 +1,150 @@
+import numpy as np
+
+
+def format_time(frame_number: int, fps: float) -> str:
+    return f"{frame_number / fps:.2f}s" if fps else "0.00s"
+
+
+class FrameHits:
+    """
+    Per-frame detections in columnar form: one row per hit, with frame
+    number, type, confidence and description. Much smaller than a list of
+    dicts, and saved as a compressed NPZ for callers that want frame-level
+    detail.
+    """
+
+    def __init__(self):
+        self.frames = []
+        self.types = []
+        self.confidences = []
+        self.descriptions = []
+
+    def add(self, frame_number: int, type_label: str, confidence: float, description: str):
+        self.frames.append(frame_number)
+        self.types.append(type_label)
+        self.confidences.append(confidence)
+        self.descriptions.append(description)
+
+    def extend(self, other: "FrameHits"):
+        self.frames.extend(other.frames)
+        self.types.extend(other.types)
+        self.confidences.extend(other.confidences)
+        self.descriptions.extend(other.descriptions)
+
+    def __len__(self):
+        return len(self.frames)
+
+    def rows(self):
+        return zip(self.frames, self.types, self.confidences, self.descriptions)
+
+    def save(self, path, fps: float):
+        """Write frame (int32), type (uint8 index into type_names), confidence (float32), description."""
+        type_names = sorted(set(self.types))
+        codes = {name: i for i, name in enumerate(type_names)}
+        np.savez_compressed(
+            path,
+            frame=np.asarray(self.frames, dtype=np.int32),
+            type=np.asarray([codes[t] for t in self.types], dtype=np.uint8),
+            type_names=np.asarray(type_names, dtype=str),
+            confidence=np.asarray(self.confidences, dtype=np.float32),
+            description=np.asarray(self.descriptions, dtype=str),
+            fps=np.float32(fps),
+        )
+
+    @classmethod
+    def load(cls, path) -> tuple:
+        """Read a file written by save(); returns (hits, fps)."""
+        with np.load(path) as data:
+            hits = cls()
+            hits.frames = data["frame"].tolist()
+            hits.types = data["type_names"][data["type"]].tolist()
+            hits.confidences = data["confidence"].tolist()
+            hits.descriptions = data["description"].tolist()
+            return hits, float(data["fps"])
+
+
+class EventAggregator:
+    """
+    Merges per-frame hits into events as frames go by.
+
+    Hits of one type on consecutive frames, or separated by at most max_gap
+    frames without a hit (flicker), form one event. An event has a start
+    and end frame and time, the number of frames with a hit, peak and mean
+    confidence (per frame, taking the strongest hit), and a keyframe: the
+    frame of its peak confidence. Events are reported in the same dict shape
+    as the old per-frame rows (type, frame, timestamp, description,
+    confidence), with "frame" pointing at the keyframe.
+    """
+
+    def __init__(self, fps: float, max_gap: int = None):
+        self.fps = fps
+        # Half a second without a hit still counts as the same event
+        self.max_gap = max_gap if max_gap is not None else max(1, int(round((fps or 0) / 2)))
+        self.open = {}      # type -> running event state
+        self.events = []
+
+    def add(self, frame_number: int, type_label: str, confidence: float, description: str):
+        state = self.open.get(type_label)
+        if state is not None and frame_number - state["end"] > self.max_gap + 1:
+            self._close(type_label)
+            state = None
+        if state is None:
+            self.open[type_label] = {"start": frame_number, "end": frame_number, "frames": 1,
+                                     "sum": confidence, "frame_max": confidence, "peak": confidence,
+                                     "peak_frame": frame_number, "peak_description": description}
+            return
+
+        if frame_number == state["end"]:
+            # Another hit on the same frame: the frame counts with its strongest hit
+            if confidence <= state["frame_max"]:
+                return
+            state["sum"] += confidence - state["frame_max"]
+            state["frame_max"] = confidence
+        else:
+            state["end"] = frame_number
+            state["frames"] += 1
+            state["sum"] += confidence
+            state["frame_max"] = confidence
+        if confidence > state["peak"]:
+            state["peak"] = confidence
+            state["peak_frame"] = frame_number
+            state["peak_description"] = description
+
+    def close_idle(self, frame_number: int):
+        """Close events that can no longer be extended once frame_number is reached."""
+        for type_label in [t for t, s in self.open.items() if frame_number - s["end"] > self.max_gap + 1]:
+            self._close(type_label)
+
+    def finish(self) -> list:
+        for type_label in list(self.open):
+            self._close(type_label)
+        self.events.sort(key=lambda event: (event["start_frame"], event["type"]))
+        return self.events
+
+    def _close(self, type_label: str):
+        state = self.open.pop(type_label)
+        start_time = format_time(state["start"], self.fps)
+        end_time = format_time(state["end"], self.fps)
+        self.events.append({
+            "type": type_label,
+            "frame": state["peak_frame"],
+            "timestamp": format_time(state["peak_frame"], self.fps),
+            "description": f"{state['peak_description']} ({start_time} - {end_time})",
+            "confidence": state["peak"],
+            "start_frame": state["start"],
+            "end_frame": state["end"],
+            "start_time": start_time,
+            "end_time": end_time,
+            "frames": state["frames"],
+            "peak_confidence": state["peak"],
+            "mean_confidence": round(state["sum"] / state["frames"], 4),
+            "keyframe": state["peak_frame"],
+        })
+
+
+def aggregate_events(hits: FrameHits, fps: float, max_gap: int = None) -> list:
+    """Events for a complete set of per-frame hits (in frame order)."""
+    aggregator = EventAggregator(fps, max_gap)
+    for frame_number, type_label, confidence, description in hits.rows():
+        aggregator.add(frame_number, type_label, confidence, description)
+    return aggregator.finish()
@@ -0,0 +1,176 @@
+import threading
+import time
+
+import cv2
+import numpy as np
+
+
+def box_data(result):
+    """A copy of result.boxes.data that can be changed (model outputs are inference-mode tensors)."""
+    data = result.boxes.data
+    return data.clone() if hasattr(data, "clone") else data.copy()
+
+
+def parse_roi(polygons):
+    """
+    Validate ROI polygons: a list of polygons, each a list of at least three
+    [x, y] points given as fractions (0..1) of the frame's width and height.
+    """
+    if not polygons:
+        return []
+    parsed = []
+    for polygon in polygons:
+        points = [(float(x), float(y)) for x, y in polygon]
+        if len(points) < 3:
+            raise ValueError("An ROI polygon needs at least 3 points")
+        if not all(0.0 <= v <= 1.0 for point in points for v in point):
+            raise ValueError("ROI points are fractions of the frame size (0..1)")
+        parsed.append(points)
+    return parsed
+
+
+class FrameGate:
+    """
+    Decides which frames of a fixed camera need inference, and which part.
+    Frames where less than min_changed of the (ROI) pixels moved are skipped,
+    but one passes at least every max_skip_seconds. The model only sees the
+    ROI polygons' bounding box, with the rest blacked out.
+    """
+
+    def __init__(self, roi=None, motion: bool = True, scale_width: int = 160,
+                 pixel_threshold: int = 25, min_changed: float = 0.002,
+                 max_skip_seconds: float = 5.0):
+        self.motion = motion
+        self.scale_width = scale_width
+        self.pixel_threshold = pixel_threshold
+        self.min_changed = min_changed
+        self.max_skip_seconds = max_skip_seconds
+
+        self.lock = threading.Lock()
+        self.roi = parse_roi(roi)
+        self._shape = None          # frame shape the masks below were built for
+        self._mask = None           # full-size ROI mask (uint8), None = whole frame
+        self._crop = None           # (x1, y1, x2, y2) bounding box of the ROI
+        self._small_mask = None     # ROI mask at motion-check size
+        self._reference = None      # last frame sent to the model, at motion-check size
+        self._last_pass = float("-inf")
+
+        self.frames_checked = 0
+        self.frames_skipped = 0
+        self.pixels_total = 0
+        self.pixels_inferred = 0
+        self.last_changed = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.motion or bool(self.roi)
+
+    def set_roi(self, polygons):
+        """Replace the ROI polygons (None or [] for the whole frame)."""
+        roi = parse_roi(polygons)
+        with self.lock:
+            self.roi = roi
+            self._shape = None
+            self._reference = None
+
+    def _prepare(self, shape):
+        """Build the ROI masks and crop box for frames of this shape."""
+        height, width = shape[:2]
+        self._shape = shape
+        self._reference = None
+        small_size = (self.scale_width, max(1, round(height * self.scale_width / width)))
+        if not self.roi:
+            self._mask = None
+            self._crop = (0, 0, width, height)
+            self._small_mask = None
+            return
+        mask = np.zeros((height, width), dtype=np.uint8)
+        for polygon in self.roi:
+            points = np.array([(round(x * (width - 1)), round(y * (height - 1))) for x, y in polygon],
+                              dtype=np.int32)
+            cv2.fillPoly(mask, [points], 255)
+        x, y, w, h = cv2.boundingRect(mask)
+        self._mask = mask
+        self._crop = (x, y, x + max(1, w), y + max(1, h))
+        self._small_mask = cv2.resize(mask, small_size, interpolation=cv2.INTER_NEAREST) > 0
+
+    def check(self, frame) -> bool:
+        """True if frame should go to the model; False to keep the previous result."""
+        now = time.monotonic()
+        with self.lock:
+            if self._shape != frame.shape:
+                self._prepare(frame.shape)
+            self.frames_checked += 1
+            self.pixels_total += frame.shape[0] * frame.shape[1]
+
+            passed = True
+            if self.motion:
+                height, width = frame.shape[:2]
+                small = cv2.resize(frame, (self.scale_width, max(1, round(height * self.scale_width / width))),
+                                   interpolation=cv2.INTER_AREA)
+                small = cv2.GaussianBlur(cv2.cvtColor(small, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+                if self._reference is not None and now - self._last_pass < self.max_skip_seconds:
+                    moved = cv2.absdiff(small, self._reference) > self.pixel_threshold
+                    if self._small_mask is not None:
+                        moved &= self._small_mask
+                        area = int(self._small_mask.sum())
+                    else:
+                        area = moved.size
+                    self.last_changed = float(moved.sum()) / max(1, area)
+                    passed = self.last_changed >= self.min_changed
+                if passed:
+                    self._reference = small
+
+            if passed:
+                self._last_pass = now
+                x1, y1, x2, y2 = self._crop
+                self.pixels_inferred += (x2 - x1) * (y2 - y1)
+            else:
+                self.frames_skipped += 1
+            return passed
+
+    def crop(self, frame):
+        """The part of frame the model should see, and its (x, y) offset in frame."""
+        with self.lock:
+            if self._shape != frame.shape:
+                self._prepare(frame.shape)
+            mask, (x1, y1, x2, y2) = self._mask, self._crop
+        if mask is None:
+            return frame, (0, 0)
+        region = frame[y1:y2, x1:x2]
+        return cv2.bitwise_and(region, region, mask=mask[y1:y2, x1:x2]), (x1, y1)
+
+    @staticmethod
+    def restore(result, offset, frame_shape):
+        """Shift a result computed on a crop back into full-frame coordinates (in place)."""
+        dx, dy = offset
+        boxes = getattr(result, "boxes", None)
+        if boxes is None or (not (dx or dy) and tuple(result.orig_shape) == tuple(frame_shape[:2])):
+            return result   # the crop was the whole frame
+        data = box_data(result)
+        data[:, [0, 2]] += dx
+        data[:, [1, 3]] += dy
+        result.orig_shape = tuple(frame_shape[:2])
+        result.update(boxes=data)
+        return result
+
+    def infer(self, infer_fn, frames: list) -> list:
+        """Run infer_fn on the ROI crops of frames and return full-frame results."""
+        crops = [self.crop(frame) for frame in frames]
+        results = infer_fn([image for image, _ in crops])
+        return [self.restore(result, offset, frame.shape)
+                for result, (_, offset), frame in zip(results, crops, frames)]
+
+    def stats(self) -> dict:
+        with self.lock:
+            checked = self.frames_checked
+            return {
+                "motion_gate": self.motion,
+                "roi": self.roi,
+                "frames_checked": checked,
+                "frames_skipped": self.frames_skipped,
+                "frames_skipped_pct": round(100.0 * self.frames_skipped / checked, 1) if checked else 0.0,
+                "pixels_skipped_pct": (round(100.0 * (1 - self.pixels_inferred / self.pixels_total), 1)
+                                       if self.pixels_total else 0.0),
+                "last_changed_pct": round(100.0 * self.last_changed, 2),
+            }
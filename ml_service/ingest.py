@@ -0,0 +1,363 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+try:
+    from python_multipart.multipart import MultipartParser, parse_options_header
+except ImportError:  # python-multipart < 0.0.13
+    from multipart.multipart import MultipartParser, parse_options_header
+
+INCOMING_PREFIX = ".incoming-"
+
+# Most bytes read from the start of an upload to decide whether it can be decoded while arriving
+SNIFF_BYTES = 1024 * 1024
+
+# Give up on an upload that stops growing for this long without finishing
+IDLE_TIMEOUT = 60.0
+
+
+def _marker_path(incoming_path) -> Path:
+    return Path(str(incoming_path) + ".done")
+
+
+class UploadIngest:
+    """
+    Receives one upload chunk by chunk.
+
+    Bytes are appended to a hidden incoming file in upload_dir and hashed
+    as they arrive, so a job can start decoding the file while it is still
+    growing (see growing_source). On finish() the file is stored under its
+    SHA-256 (uploads/<sha256><ext>); an upload whose content is already
+    stored is discarded instead of kept twice. The stored file is deleted
+    once the last job reading it is over (results are kept by ResultCache).
+    A small marker file next to the incoming file tells readers the upload
+    is complete and where it ended up.
+    """
+
+    # Stored upload path -> number of unfinished jobs reading it, shared by every ingest
+    stored_lock = threading.Lock()
+    stored_readers = {}
+
+    def __init__(self, upload_dir, filename: str):
+        self.upload_dir = Path(upload_dir)
+        self.upload_dir.mkdir(parents=True, exist_ok=True)
+        self.filename = Path(filename or "upload").name
+        self.suffix = Path(self.filename).suffix.lower() or ".mp4"
+        self.incoming_path = self.upload_dir / f"{INCOMING_PREFIX}{uuid.uuid4().hex}{self.suffix}"
+        self.file = open(self.incoming_path, "wb")
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+        self.path = None
+        self.duplicate = False
+        self.lock = threading.Lock()
+        self.reader_done = False    # the job reading this upload has finished
+
+    def write(self, data: bytes):
+        self.file.write(data)
+        self.file.flush()  # readers tail the file, so don't hold bytes back
+        self.sha256.update(data)
+        self.size += len(data)
+
+    def finish(self) -> Path:
+        """Store the upload under its content hash; returns the stored path."""
+        with self.lock:
+            self.file.close()
+            digest = self.sha256.hexdigest()
+            path = self.upload_dir / f"{digest}{self.suffix}"
+            with UploadIngest.stored_lock:
+                if path.exists():
+                    self.duplicate = True
+                    self.incoming_path.unlink()
+                else:
+                    # Readers that already opened the incoming file keep their handle across the rename
+                    self.incoming_path.replace(path)
+                UploadIngest.stored_readers[path] = UploadIngest.stored_readers.get(path, 0) + 1
+            self.path = path
+            self._write_marker({"path": str(path), "size": self.size, "sha256": digest})
+            if self.reader_done:
+                self._release_stored()
+        return path
+
+    def abort(self):
+        """The client went away mid-upload: end readers and drop the partial file."""
+        with self.lock:
+            self.file.close()
+            self._write_marker({"aborted": True, "size": self.size})
+            self.incoming_path.unlink(missing_ok=True)
+
+    def cleanup(self):
+        """
+        The job reading this upload is over: remove the marker (if the upload
+        is too) and the stored file unless another job still reads it.
+        """
+        with self.lock:
+            self.reader_done = True
+            if self.file.closed:
+                _marker_path(self.incoming_path).unlink(missing_ok=True)
+            if self.path is not None:
+                self._release_stored()
+
+    def info(self) -> dict:
+        return {"sha256": self.sha256.hexdigest(), "size": self.size,
+                "duplicate": self.duplicate, "stored_as": self.path.name if self.path else None}
+
+    def _release_stored(self):
+        with UploadIngest.stored_lock:
+            readers = UploadIngest.stored_readers.pop(self.path, 1) - 1
+            if readers > 0:
+                UploadIngest.stored_readers[self.path] = readers
+            else:
+                self.path.unlink(missing_ok=True)
+
+    def _write_marker(self, info: dict):
+        marker = _marker_path(self.incoming_path)
+        if self.reader_done:
+            return  # nobody is waiting for it
+        tmp = marker.with_suffix(".tmp")
+        tmp.write_text(json.dumps(info))
+        tmp.replace(marker)
+
+    @staticmethod
+    def clean_stale(upload_dir):
+        """
+        Delete incoming files and their markers left behind by a previous run:
+        those untouched for IDLE_TIMEOUT, so uploads another process is still
+        receiving (or a reader still waits on) are kept.
+        """
+        cutoff = time.time() - IDLE_TIMEOUT
+        for path in Path(upload_dir).glob(f"{INCOMING_PREFIX}*"):
+            try:
+                if path.stat().st_mtime < cutoff:
+                    path.unlink()
+            except FileNotFoundError:
+                pass
+
+
+async def receive_upload(request, field: str, on_start):
+    """
+    Stream a multipart/form-data request body without buffering it.
+
+    on_start(filename) is called when the `field` file part begins and must
+    return an UploadIngest; the part's bytes are written to it as they
+    arrive. Returns the ingest (finished), or raises ValueError if the
+    request has no such file part. The ingest is aborted if the body ends
+    early.
+    """
+    content_type, params = parse_options_header(request.headers.get("content-type", ""))
+    boundary = params.get(b"boundary")
+    if content_type != b"multipart/form-data" or not boundary:
+        raise ValueError("Expected a multipart/form-data upload")
+
+    events = []
+    headers = {}
+    header = {"field": b"", "value": b""}
+
+    def on_header_field(data, start, end):
+        header["field"] += data[start:end]
+
+    def on_header_value(data, start, end):
+        header["value"] += data[start:end]
+
+    def on_header_end():
+        headers[header["field"].lower()] = header["value"]
+        header["field"], header["value"] = b"", b""
+
+    def on_headers_finished():
+        _, options = parse_options_header(headers.get(b"content-disposition", b""))
+        events.append(("start", options.get(b"name", b"").decode(),
+                       options.get(b"filename", b"").decode(errors="ignore")))
+        headers.clear()
+
+    def on_part_data(data, start, end):
+        events.append(("data", bytes(data[start:end])))
+
+    def on_part_end():
+        events.append(("end",))
+
+    parser = MultipartParser(boundary, {
+        "on_header_field": on_header_field, "on_header_value": on_header_value,
+        "on_header_end": on_header_end, "on_headers_finished": on_headers_finished,
+        "on_part_data": on_part_data, "on_part_end": on_part_end,
+    })
+
+    ingest = None
+    receiving = False
+    finished = False
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for event in events:
+                if event[0] == "start":
+                    receiving = event[1] == field and ingest is None
+                    if receiving:
+                        ingest = on_start(event[2])
+                elif event[0] == "data" and receiving:
+                    ingest.write(event[1])
+                elif event[0] == "end" and receiving:
+                    receiving = False
+                    ingest.finish()
+                    finished = True
+            events.clear()
+        parser.finalize()
+    finally:
+        if ingest is not None and not finished:
+            ingest.abort()
+    if ingest is None:
+        raise ValueError(f"No '{field}' file in the upload")
+    return ingest
+
+
+# --- reading an upload that is still arriving (runs in the job worker) ---
+
+def is_streamable(head: bytes):
+    """
+    Whether a container can be decoded front to back as it arrives, judged
+    from its first bytes; None if more bytes are needed to tell.
+    MP4/MOV files can only if the index (moov box) comes before the media
+    data (or the file is fragmented); other containers are assumed to be
+    sequential.
+    """
+    if len(head) < 8:
+        return None
+    if head[4:8] != b"ftyp":
+        return True
+    pos = 0
+    while pos + 8 <= len(head):
+        size = int.from_bytes(head[pos:pos + 4], "big")
+        box = head[pos + 4:pos + 8]
+        if box in (b"moov", b"moof"):
+            return True
+        if box == b"mdat":
+            return False
+        if size == 1:
+            if pos + 16 > len(head):
+                return None
+            size = int.from_bytes(head[pos + 8:pos + 16], "big")
+        if size < 8:
+            return False
+        pos += size
+    return None
+
+
+def _read_marker(incoming_path):
+    try:
+        return json.loads(_marker_path(incoming_path).read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _wait_complete(incoming_path, poll: float = 0.1) -> dict:
+    """Block until the upload's marker appears; raises if it was aborted or stalled."""
+    last_size, last_change = -1, time.monotonic()
+    while True:
+        marker = _read_marker(incoming_path)
+        if marker is not None:
+            if marker.get("aborted"):
+                raise ValueError("Upload was aborted")
+            return marker
+        try:
+            size = os.path.getsize(incoming_path)
+        except OSError:
+            size = last_size
+        if size != last_size:
+            last_size, last_change = size, time.monotonic()
+        elif time.monotonic() - last_change > IDLE_TIMEOUT:
+            raise TimeoutError("Upload stopped arriving")
+        time.sleep(poll)
+
+
+def _feed_fifo(source, head: bytes, fifo_path: str, incoming_path, stop_event, poll: float = 0.05):
+    """Copy the growing file into the FIFO until the upload is complete."""
+    try:
+        with open(fifo_path, "wb") as fifo:
+            fifo.write(head)
+            last_change = time.monotonic()
+            while not stop_event.is_set():
+                data = source.read(64 * 1024)
+                if data:
+                    fifo.write(data)
+                    last_change = time.monotonic()
+                    continue
+                marker = _read_marker(incoming_path)
+                if marker is not None:
+                    # Marker is written after the last byte, so one more read drains the file
+                    data = source.read()
+                    if data:
+                        fifo.write(data)
+                    break
+                if time.monotonic() - last_change > IDLE_TIMEOUT:
+                    break
+                time.sleep(poll)
+    except (BrokenPipeError, OSError):
+        pass  # the decoder stopped reading
+    finally:
+        source.close()
+
+
+@contextmanager
+def growing_source(incoming_path, wait_complete: bool = False):
+    """
+    Yield a path the decoder can open for an upload that may still be arriving.
+
+    For streamable containers this is a FIFO fed from the growing file, so
+    decoding starts right away. Otherwise (non-faststart MP4, no FIFO
+    support on this platform, wait_complete=True for seek-based segment
+    analysis, or the upload already finished) it waits for the upload and
+    yields the stored file.
+    """
+    try:
+        source = open(incoming_path, "rb")
+    except FileNotFoundError:
+        source = None  # already finished and moved into place
+
+    head = b""
+    streamable = None
+    if source is not None and not wait_complete and hasattr(os, "mkfifo"):
+        last_change = time.monotonic()
+        while streamable is None and len(head) < SNIFF_BYTES:
+            data = source.read(SNIFF_BYTES - len(head))
+            if data:
+                head += data
+                last_change = time.monotonic()
+                streamable = is_streamable(head)
+            elif _read_marker(incoming_path) is not None or time.monotonic() - last_change > IDLE_TIMEOUT:
+                break
+            else:
+                time.sleep(0.05)
+
+    if not streamable:
+        if source is not None:
+            source.close()
+        yield _wait_complete(incoming_path)["path"]
+        return
+
+    fifo_dir = tempfile.mkdtemp(prefix="ingest_")
+    fifo_path = os.path.join(fifo_dir, "stream" + Path(incoming_path).suffix)
+    os.mkfifo(fifo_path)
+    stop_event = threading.Event()
+    feeder = threading.Thread(target=_feed_fifo, name="upload-feeder", daemon=True,
+                              args=(source, head, fifo_path, incoming_path, stop_event))
+    feeder.start()
+    try:
+        yield fifo_path
+        marker = _read_marker(incoming_path)
+        if marker is None or marker.get("aborted"):
+            raise ValueError("Upload ended before it was complete")
+    finally:
+        stop_event.set()
+        if feeder.is_alive():
+            # Unblock a feeder still waiting for a reader to open the FIFO
+            try:
+                fd = os.open(fifo_path, os.O_RDONLY | os.O_NONBLOCK)
+                os.close(fd)
+            except OSError:
+                pass
+        feeder.join(2.0)
+        shutil.rmtree(fifo_dir, ignore_errors=True)
@@ -0,0 +1,356 @@
+import asyncio
+import multiprocessing
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+
+from metrics import QUEUE_DEPTH, metrics
+
+# Seconds between progress messages sent by a worker
+PROGRESS_INTERVAL = 0.5
+
+
+class JobCancelled(Exception):
+    pass
+
+
+# --- worker process side ---
+
+_progress_queue = None
+_cancel_dir = None
+_worker_analyzer = None
+
+
+def _init_worker(progress_queue, cancel_dir, warm_up: bool = False):
+    global _progress_queue, _cancel_dir
+    _progress_queue = progress_queue
+    _cancel_dir = cancel_dir
+    # Forked from the API process: count only what this worker does
+    metrics.reset()
+    if warm_up:
+        _warm_up_worker()
+
+
+def _warm_up_worker():
+    """Load the analyzer's models as the worker starts rather than in its first job."""
+    global _worker_analyzer
+    try:
+        from model_registry import model_registry
+        from video_analyzer import VideoAnalyzer
+        _worker_analyzer = VideoAnalyzer()
+        model_registry.warm_up(_worker_analyzer.coco_weights)
+        _worker_analyzer.violence_model     # optional; loaded if present
+    except Exception as e:
+        # The first job loads (and reports failures) as usual
+        print(f"Analysis worker warm-up failed: {e}")
+
+
+def _run_analysis(job_id: str, video_path: str, output_path: str, batch_size: int = None,
+                  segment_workers: int = 1, growing: bool = False, frame_detail_path: str = None,
+                  output_mode: str = "annotated", codec: str = "mp4v") -> dict:
+    """
+    Runs in a pool process. The analyzer (and its models) is kept for the process's next jobs.
+    growing: video_path is an upload still being received (see ingest.UploadIngest).
+    frame_detail_path: also save per-frame hits as NPZ (see events.FrameHits).
+    output_mode, codec: see VideoAnalyzer.analyze_video.
+    """
+    global _worker_analyzer
+    if _worker_analyzer is None:
+        from video_analyzer import VideoAnalyzer
+        _worker_analyzer = VideoAnalyzer()
+
+    _progress_queue.put((job_id, "started", time.time()))
+    last_report = 0.0
+
+    def send_metrics():
+        # Stage timings and frame counts since the last message, added up in the API process
+        snapshot = metrics.snapshot(reset=True)
+        if snapshot:
+            _progress_queue.put((job_id, "metrics", snapshot))
+
+    def report(frames_processed, total_frames):
+        nonlocal last_report
+        now = time.monotonic()
+        if now - last_report >= PROGRESS_INTERVAL:
+            last_report = now
+            # JobManager.cancel() drops a flag file named after the job
+            if os.path.exists(os.path.join(_cancel_dir, job_id)):
+                raise JobCancelled(job_id)
+            _progress_queue.put((job_id, "progress", (frames_processed, total_frames)))
+            send_metrics()
+
+    def analyze(source):
+        if segment_workers > 1:
+            from segments import analyze_video_parallel
+            return analyze_video_parallel(source, output_path, workers=segment_workers, batch_size=batch_size,
+                                          progress_callback=report, analyzer=_worker_analyzer,
+                                          frame_detail_path=frame_detail_path,
+                                          output_mode=output_mode, codec=codec,
+                                          cancel_path=os.path.join(_cancel_dir, job_id))
+        return _worker_analyzer.analyze_video(source, output_path, batch_size=batch_size,
+                                              progress_callback=report, frame_detail_path=frame_detail_path,
+                                              output_mode=output_mode, codec=codec)
+
+    try:
+        if growing:
+            from ingest import growing_source
+            # Segments seek and event windows re-read the source, so both need the complete file
+            with growing_source(video_path, wait_complete=segment_workers > 1 or output_mode == "events") as source:
+                return analyze(source)
+        return analyze(video_path)
+    finally:
+        send_metrics()
+
+
+def _noop():
+    return None
+
+
+# --- API process side ---
+
+class Job:
+    def __init__(self, job_id: str, video_path: str, output_path: str, info: dict = None):
+        self.job_id = job_id
+        self.video_path = video_path
+        self.output_path = output_path
+        self.extra_paths = []   # other files the job writes (removed with the video on failure)
+        self.info = info or {}
+        self.status = "queued"
+        self.submitted_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.frames_processed = 0
+        self.total_frames = 0
+        self.result = None
+        self.error = None
+        self.future = None      # the worker's run
+        self.done = Future()    # the job's outcome (a job can finish without its run, see resolve())
+
+    @property
+    def finished(self) -> bool:
+        return self.status in ("done", "failed", "cancelled")
+
+    def to_dict(self) -> dict:
+        end = self.finished_at or time.time()
+        elapsed = end - self.started_at if self.started_at else 0.0
+        fps = self.frames_processed / elapsed if elapsed > 0 else 0.0
+        eta = None
+        if self.status == "running" and fps > 0 and self.total_frames:
+            eta = round(max(0, self.total_frames - self.frames_processed) / fps, 1)
+        progress = self.frames_processed / self.total_frames if self.total_frames else 0.0
+        return {
+            "job_id": self.job_id,
+            "status": self.status,
+            **self.info,
+            "submitted_at": self.submitted_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "frames_processed": self.frames_processed,
+            "total_frames": self.total_frames,
+            "progress": round(min(1.0, progress), 3),
+            "fps": round(fps, 2),
+            "eta_seconds": eta,
+            "error": self.error,
+        }
+
+
+class JobManager:
+    """
+    Runs video analysis jobs in a pool of worker processes, off the API's event loop.
+
+    submit() returns a job id at once; status() reports frames processed,
+    throughput and ETA from progress messages the workers send over a queue.
+    At most max_workers jobs run at a time, the rest wait in order. Each
+    worker process loads the models once and reuses them for later jobs.
+    Only the newest max_finished finished jobs are remembered.
+    warm_up: workers load the models as they start instead of in their first job.
+    """
+
+    def __init__(self, max_workers: int = 2, max_finished: int = 200, warm_up: bool = False):
+        self.max_workers = max(1, max_workers)
+        self.max_finished = max_finished
+        self.warm_up = warm_up
+        self.jobs = {}
+        self.lock = threading.Lock()
+        # Workers are forked before any model is loaded in this process, see start()
+        self.context = multiprocessing.get_context(
+            "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+        self.progress = self.context.Queue()
+        self.cancel_dir = tempfile.mkdtemp(prefix="jobs_")
+        self.executor = None
+        self.listener = None
+
+    def start(self):
+        """Create the pool and its worker processes up front (call at startup)."""
+        with self.lock:
+            if self.executor is None:
+                self.executor = self._new_executor()
+        if self.listener is None:
+            self.listener = threading.Thread(target=self._listen, name="job-progress", daemon=True)
+            self.listener.start()
+        return self
+
+    def _new_executor(self):
+        executor = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=self.context,
+                                       initializer=_init_worker,
+                                       initargs=(self.progress, self.cancel_dir, self.warm_up))
+        executor.submit(_noop)  # launches the workers now rather than on the first job
+        return executor
+
+    def shutdown(self):
+        with self.lock:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if self.listener is not None:
+            self.progress.put(None)
+            self.listener.join(2.0)
+            self.listener = None
+        shutil.rmtree(self.cancel_dir, ignore_errors=True)
+
+    def submit(self, video_path: str, output_path: str, job_id: str = None,
+               batch_size: int = None, segment_workers: int = 1, growing: bool = False,
+               frame_detail_path: str = None, output_mode: str = "annotated", codec: str = "mp4v",
+               info: dict = None) -> str:
+        """
+        segment_workers > 1 splits the file into segments analysed in parallel (see segments.py).
+        growing: video_path is an upload still arriving; analysis starts without waiting for it.
+        frame_detail_path: also save per-frame hits there as NPZ.
+        output_mode: "annotated", "report" (no video) or "events"; codec: "mp4v" or "h264".
+        """
+        self.start()
+        args = (video_path, output_path, batch_size, segment_workers, growing, frame_detail_path,
+                output_mode, codec)
+        job = Job(job_id or uuid.uuid4().hex[:12], video_path, output_path, info)
+        if frame_detail_path:
+            job.extra_paths.append(frame_detail_path)
+        with self.lock:
+            try:
+                job.future = self.executor.submit(_run_analysis, job.job_id, *args)
+            except BrokenProcessPool:
+                # A worker died (e.g. out of memory); replace the pool
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = self._new_executor()
+                job.future = self.executor.submit(_run_analysis, job.job_id, *args)
+            self.jobs[job.job_id] = job
+            self._prune()
+        job.future.add_done_callback(lambda future: self._on_done(job, future))
+        return job.job_id
+
+    def add_done(self, result: dict, job_id: str = None, info: dict = None) -> str:
+        """Record a job whose result was obtained without running it (e.g. a cache hit)."""
+        job = Job(job_id or uuid.uuid4().hex[:12], None, None, info)
+        with self.lock:
+            self.jobs[job.job_id] = job
+            self._prune()
+        self._finish(job, "done", result=result)
+        return job.job_id
+
+    def get(self, job_id: str):
+        return self.jobs.get(job_id)
+
+    def status(self, job_id: str = None):
+        if job_id is not None:
+            job = self.get(job_id)
+            return job.to_dict() if job else None
+        jobs = list(self.jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"max_workers": self.max_workers, "counts": counts, "jobs": [job.to_dict() for job in jobs]}
+
+    def collect_metrics(self):
+        """Queued and running jobs, for /metrics."""
+        jobs = list(self.jobs.values())
+        QUEUE_DEPTH.labels("", "", "jobs_queued").set(sum(1 for job in jobs if job.status == "queued"))
+        QUEUE_DEPTH.labels("", "", "jobs_running").set(sum(1 for job in jobs if job.status == "running"))
+
+    async def wait(self, job_id: str) -> dict:
+        """Await a job's result without blocking the event loop; raises if the job failed."""
+        job = self.jobs[job_id]
+        return await asyncio.wrap_future(job.done)
+
+    def cancel(self, job_id: str) -> bool:
+        """Stop a job: dropped if still queued, otherwise its worker gives up at the next progress check."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return False
+        if not job.future.cancel():
+            Path(self.cancel_dir, job_id).touch()
+        self._finish(job, "cancelled", error="cancelled")
+        return True
+
+    def resolve(self, job_id: str, result: dict, **info):
+        """Finish a job with a result obtained elsewhere (e.g. a cache hit) and stop its worker run."""
+        job = self.get(job_id)
+        if job is None or job.finished:
+            return
+        if not job.future.cancel():
+            Path(self.cancel_dir, job_id).touch()
+        job.info.update(info)
+        self._finish(job, "done", result=result)
+
+    def _finish(self, job: Job, status: str, result: dict = None, error: str = None):
+        with self.lock:
+            if job.finished:
+                return
+            job.status, job.result, job.error = status, result, error
+            job.finished_at = time.time()
+            if result is not None:
+                job.started_at = job.started_at or job.submitted_at
+                job.total_frames = job.total_frames or result.get("total_frames", 0)
+                job.frames_processed = job.total_frames
+        if result is not None:
+            job.done.set_result(result)
+        else:
+            job.done.set_exception(JobCancelled(job.job_id) if status == "cancelled" else RuntimeError(error))
+
+    def _on_done(self, job: Job, future):
+        Path(self.cancel_dir, job.job_id).unlink(missing_ok=True)
+        error = None if future.cancelled() else future.exception()
+        if future.cancelled() or error is not None or job.finished:
+            # Don't leave a half-written video behind
+            for path in [job.output_path, *job.extra_paths]:
+                Path(path).unlink(missing_ok=True)
+        if future.cancelled():
+            self._finish(job, "cancelled", error="cancelled")
+        elif error is not None:
+            self._finish(job, "failed", error=str(error) or type(error).__name__)
+        else:
+            self._finish(job, "done", result=future.result())
+
+    def _listen(self):
+        while True:
+            try:
+                message = self.progress.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            if message is None:
+                return
+            job_id, kind, value = message
+            if kind == "metrics":
+                metrics.merge(value)
+                continue
+            with self.lock:
+                job = self.jobs.get(job_id)
+                if job is None or job.finished:
+                    continue
+                if kind == "started":
+                    job.status = "running"
+                    job.started_at = value
+                elif kind == "progress":
+                    job.frames_processed, job.total_frames = value
+
+    def _prune(self):
+        finished = [job for job in self.jobs.values() if job.finished]
+        for job in finished[:max(0, len(finished) - self.max_finished)]:
+            del self.jobs[job.job_id]
@@ -0,0 +1,244 @@
+import copy
+import threading
+
+import cv2
+import numpy as np
+
+from frame_gate import box_data
+
+
+def box_iou(a, b):
+    """IoU of every box in a (N x 4, xyxy) with every box in b (M x 4): an N x M array."""
+    a = np.asarray(a, dtype=np.float64).reshape(-1, 4)
+    b = np.asarray(b, dtype=np.float64).reshape(-1, 4)
+    x1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    y1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    x2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    y2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(x2 - x1, 0, None) * np.clip(y2 - y1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_boxes(a, b, min_iou: float = 0.5) -> list:
+    """Greedy one-to-one matching by IoU: [(index in a, index in b, iou)], best first."""
+    iou = box_iou(a, b)
+    pairs = []
+    while iou.size:
+        i, j = np.unravel_index(np.argmax(iou), iou.shape)
+        if iou[i, j] < min_iou:
+            break
+        pairs.append((int(i), int(j), float(iou[i, j])))
+        iou[i, :] = -1
+        iou[:, j] = -1
+    return pairs
+
+
+class KeyframeTracker:
+    """
+    Detect-then-track for one camera: the model only sees every interval-th
+    frame, and boxes are moved through the frames between by Lucas-Kanade
+    optical flow. A frame goes to the model early when too few flow points
+    survive. On keyframes, detections overlapping a tracked box keep its
+    track id. track() returns None when the frame needs the model, whose
+    result then goes to update().
+    """
+
+    # Lucas-Kanade window and pyramid depth (3 levels follow ~40 px per frame at scale_width)
+    window = (15, 15)
+    levels = 3
+
+    def __init__(self, interval: int = 5, min_confidence: float = 0.5, scale_width: int = 320,
+                 max_points: int = 12, max_error: float = 1.0):
+        self.interval = max(1, int(interval))
+        self.min_confidence = min_confidence
+        self.scale_width = scale_width
+        self.max_points = max_points
+        self.max_error = max_error
+
+        self.lock = threading.Lock()
+        self._result = None         # last result returned (detected or tracked)
+        self._grey = None           # that frame, grey and scaled
+        self._scale = 1.0           # grey size / frame size
+        self._points = []           # per box: N x 2 float32 points in the grey frame
+        self._since_keyframe = 0
+        self._pending = False       # track() asked for the model; waiting for update()
+
+        self.frames_detected = 0
+        self.frames_tracked = 0
+        self.early_keyframes = 0
+        self.last_confidence = 1.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.interval > 1
+
+    def reset(self):
+        """Forget the tracked boxes; the next frame is a keyframe."""
+        with self.lock:
+            self._result = None
+            self._grey = None
+            self._pending = False
+
+    def track(self, frame):
+        """frame's result carried over from the last one, or None if frame needs the model."""
+        with self.lock:
+            if (self._pending or self._result is None or self._since_keyframe + 1 >= self.interval
+                    or tuple(self._result.orig_shape) != tuple(frame.shape[:2])):
+                self._pending = True
+                return None
+            grey = self._prepare(frame)
+            boxes, confidence = self._flow(grey)
+            self.last_confidence = confidence
+            if confidence < self.min_confidence:
+                self.early_keyframes += 1
+                self._pending = True
+                return None
+            result = self._moved(frame, boxes)
+            self._start(result, grey)
+            self._since_keyframe += 1
+            self.frames_tracked += 1
+            return result
+
+    def update(self, frame, result):
+        """Start tracking from a result the model computed for frame; returns it (ids carried over)."""
+        with self.lock:
+            self._pending = False
+            self.frames_detected += 1
+            if result is None or getattr(result, "boxes", None) is None:
+                self._result = None
+                return result
+            if self._result is not None and tuple(self._result.orig_shape) == tuple(frame.shape[:2]):
+                result = self._carry_ids(result)
+            self._start(result, self._prepare(frame))
+            self._since_keyframe = 0
+            self.last_confidence = 1.0
+            return result
+
+    def infer(self, detect_fn, frames: list) -> list:
+        """Results for frames: tracked where possible, the rest from one detect_fn(frames) call."""
+        results = [self.track(frame) for frame in frames]
+        todo = [i for i, result in enumerate(results) if result is None]
+        if todo:
+            for i, result in zip(todo, detect_fn([frames[i] for i in todo])):
+                results[i] = self.update(frames[i], result)
+        return results
+
+    def stats(self) -> dict:
+        with self.lock:
+            total = self.frames_detected + self.frames_tracked
+            return {
+                "keyframe_interval": self.interval,
+                "frames_detected": self.frames_detected,
+                "frames_tracked": self.frames_tracked,
+                "frames_tracked_pct": round(100.0 * self.frames_tracked / total, 1) if total else 0.0,
+                "early_keyframes": self.early_keyframes,
+                "last_confidence": round(self.last_confidence, 3),
+            }
+
+    # --- internals, called with the lock held ---
+
+    def _start(self, result, grey):
+        """Track onwards from result on grey: fresh points inside each of its boxes."""
+        self._result, self._grey = result, grey
+        self._points = [self._pick_points(grey, box) for box in self._xyxy(result) * self._scale]
+
+    def _prepare(self, frame):
+        height, width = frame.shape[:2]
+        self._scale = min(1.0, self.scale_width / width)
+        if self._scale < 1.0:
+            frame = cv2.resize(frame, (self.scale_width, max(1, round(height * self._scale))),
+                               interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+
+    @staticmethod
+    def _xyxy(result) -> np.ndarray:
+        data = result.boxes.xyxy
+        return np.asarray(data.cpu() if hasattr(data, "cpu") else data, dtype=np.float32).reshape(-1, 4)
+
+    def _pick_points(self, grey, box):
+        height, width = grey.shape
+        x1, y1 = max(0, int(box[0])), max(0, int(box[1]))
+        x2, y2 = min(width, int(np.ceil(box[2]))), min(height, int(np.ceil(box[3])))
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            return np.empty((0, 2), dtype=np.float32)
+        corners = cv2.goodFeaturesToTrack(grey[y1:y2, x1:x2], self.max_points, 0.01, 3)
+        if corners is None:
+            return np.empty((0, 2), dtype=np.float32)
+        return (corners.reshape(-1, 2) + (x1, y1)).astype(np.float32)
+
+    def _flow(self, grey):
+        """Move every box from the last frame to grey: (boxes in frame coordinates, confidence)."""
+        boxes = self._xyxy(self._result) * self._scale
+        counts = [len(points) for points in self._points]
+        kept = [0] * len(counts)
+        if sum(counts):
+            start = np.concatenate(self._points).reshape(-1, 1, 2)
+            lk = dict(winSize=self.window, maxLevel=self.levels,
+                      criteria=(cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03))
+            forward, status, _ = cv2.calcOpticalFlowPyrLK(self._grey, grey, start, None, **lk)
+            back, back_status, _ = cv2.calcOpticalFlowPyrLK(grey, self._grey, forward, None, **lk)
+            error = np.linalg.norm((start - back).reshape(-1, 2), axis=1)
+            good = (status.ravel() == 1) & (back_status.ravel() == 1) & (error < self.max_error)
+            offset = 0
+            for k, count in enumerate(counts):
+                keep = good[offset:offset + count]
+                old = start[offset:offset + count].reshape(-1, 2)[keep]
+                new = forward[offset:offset + count].reshape(-1, 2)[keep]
+                boxes[k] = self._move_box(boxes[k], old, new)
+                kept[k] = len(new)
+                offset += count
+
+        # Boxes without points (tiny, featureless) stay put and don't count
+        confidence = sum(kept) / sum(counts) if sum(counts) else 1.0
+        # A box that lost nearly all its points is as good as lost
+        if any(count >= 4 and k < 2 for count, k in zip(counts, kept)):
+            confidence = 0.0
+        return boxes / self._scale, confidence
+
+    @staticmethod
+    def _move_box(box, old, new):
+        if not len(old):
+            return box
+        shift = np.median(new - old, axis=0)
+        scale = 1.0
+        if len(old) >= 3:
+            spread_old = np.median(np.linalg.norm(old - np.median(old, axis=0), axis=1))
+            spread_new = np.median(np.linalg.norm(new - np.median(new, axis=0), axis=1))
+            if spread_old > 1.0:
+                scale = float(np.clip(spread_new / spread_old, 0.8, 1.25))
+        centre = (box[:2] + box[2:]) / 2 + shift
+        half = (box[2:] - box[:2]) / 2 * scale
+        return np.concatenate([centre - half, centre + half])
+
+    def _moved(self, frame, boxes):
+        """A copy of the last result for frame, with its boxes at their new positions."""
+        result = copy.copy(self._result)
+        data = box_data(self._result)
+        data[:, :4] = data.new_tensor(boxes) if hasattr(data, "new_tensor") else boxes
+        result.orig_img = frame
+        result.orig_shape = tuple(frame.shape[:2])
+        result.update(boxes=data)
+        return result
+
+    def _carry_ids(self, result):
+        """
+        Give detections that overlap a tracked box that box's track id, unless
+        another detection in the frame already has it (ids stay unique).
+        """
+        ids, previous_ids = result.boxes.id, self._result.boxes.id
+        if ids is None or previous_ids is None or not len(result.boxes):
+            return result
+        pairs = match_boxes(self._xyxy(result), self._xyxy(self._result), min_iou=0.3)
+        previous_ids = previous_ids.tolist()
+        current_ids = ids.tolist()
+        data = box_data(result)
+        changed = False
+        for i, j, _ in pairs:
+            if previous_ids[j] not in current_ids:
+                current_ids[i] = data[i, 4] = previous_ids[j]
+                changed = True
+        if changed:
+            result.update(boxes=data)
+        return result
@@ -1,21 +1,26 @@
-from fastapi import FastAPI, BackgroundTasks, File, UploadFile
-from fastapi.responses import StreamingResponse, FileResponse
+from fastapi import FastAPI, BackgroundTasks, HTTPException, Request
+from fastapi.responses import StreamingResponse, FileResponse, JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from pydantic import BaseModel
 import uvicorn
-import cv2
-import threading
-import time
-import shutil
+import asyncio
+import importlib
+import json
+import os
+import uuid
 from pathlib import Path
 
-# Import Detectors
-from detectors.crowd import CrowdDetector
-from detectors.violence import ViolenceDetector
-from detectors.suspicious import SuspiciousDetector
-from detectors.audio import AudioDetector
-from video_analyzer import VideoAnalyzer
+from video_analyzer import VideoAnalyzer, OUTPUT_MODES
+from stream_manager import StreamManager
+from alerts import alert_dispatcher
+from jobs import JobManager
+from ingest import UploadIngest, receive_upload
+from result_cache import ResultCache
+from metrics import CONTENT_TYPE, FRAMES_STREAMED, metrics
+from model_registry import model_registry
+from warmup import ModelWarmup
+from overload import OverloadController
 
 app = FastAPI()
 
@@ -27,14 +32,6 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize Detectors
-detectors = {
-    "crowd": CrowdDetector(),
-    "violence": ViolenceDetector(),
-    "suspicious": SuspiciousDetector(),
-    "audio": AudioDetector()
-}
-
 # Initialize Video Analyzer
 video_analyzer = VideoAnalyzer()
 
@@ -47,105 +44,395 @@ OUTPUT_DIR.mkdir(exist_ok=True)
 # Mount static files for serving processed videos
 app.mount("/outputs", StaticFiles(directory="outputs"), name="outputs")
 
-# Global state for streaming
-class StreamState:
-    def __init__(self):
-        self.active_detector = None
-        self.source = None
-        self.is_running = False
-        self.lock = threading.Lock()
+def lazy_detector(module: str, name: str):
+    """Detector factory that imports the detector's module on first use, keeping startup light."""
+    def create():
+        return getattr(importlib.import_module(module), name)()
+    return create
 
-stream_state = StreamState()
+# Video detectors available to live cameras (built when a camera starts)
+DETECTOR_TYPES = {
+    "crowd": lazy_detector("detectors.crowd", "CrowdDetector"),
+    "violence": lazy_detector("detectors.violence", "ViolenceDetector"),
+    "suspicious": lazy_detector("detectors.suspicious", "SuspiciousDetector"),
+}
 
-def generate_frames():
-    """Generator that yields MJPEG frames from the active detector."""
-    # Use standard VideoCapture
-    # Wait until running
-    while not stream_state.is_running:
-        time.sleep(0.1)
+# Shared inference pool size and the most frames batched into one model call
+INFERENCE_WORKERS = 2
+MAX_INFERENCE_BATCH = 8
 
-    cap = cv2.VideoCapture(0 if stream_state.source == "0" else stream_state.source)
-    
-    if not cap.isOpened():
-        print("Error: Could not open video source.")
-        return
-
-    while stream_state.is_running:
-        success, frame = cap.read()
-        if not success:
-            break
-            
-        # Run active detector logic here (simplified integration)
-        # Ideally, we'd modify detectors to accept a frame and return an annotated frame + alerts
-        # For now, we just stream the raw feed to prove connection, 
-        # or we can call specific detector logic if we refactor them to return frames.
-        # Let's just stream the raw video for now to get the "Live Feed" working.
-        
-        ret, buffer = cv2.imencode('.jpg', frame)
-        frame_bytes = buffer.tobytes()
+# Skip inference on camera frames where nothing moved (per camera via ?motion_gate=)
+MOTION_GATE = os.environ.get("MOTION_GATE", "1") != "0"
+
+# Detect-then-track: the model runs on every n-th analysed camera frame and
+# boxes are tracked in between (per camera via ?keyframe_interval=; 1 = off)
+KEYFRAME_INTERVAL = int(os.environ.get("KEYFRAME_INTERVAL", "1"))
+
+# Camera id used by the single-feed endpoints (/start_feed, /video_feed)
+DEFAULT_CAMERA = "default"
+
+stream_manager = StreamManager(DETECTOR_TYPES, workers=INFERENCE_WORKERS, max_batch=MAX_INFERENCE_BATCH)
+
+# Degrade camera analysis (input size, sampling rate, optional detectors)
+# when cameras fall behind or the process uses more than CPU_BUDGET of the cores
+OVERLOAD_CONTROL = os.environ.get("OVERLOAD_CONTROL", "1") != "0"
+overload_controller = OverloadController(stream_manager,
+                                         cpu_budget=float(os.environ.get("CPU_BUDGET", "0.9")),
+                                         max_lag=float(os.environ.get("MAX_LAG_SECONDS", "2.0")))
+
+# Uploaded videos analysed at the same time (each in its own worker process)
+ANALYSIS_WORKERS = int(os.environ.get("ANALYSIS_WORKERS", "2"))
+# Processes one long video is split across (1 = analyse it start to finish on one core)
+SEGMENT_WORKERS = int(os.environ.get("SEGMENT_WORKERS", "1"))
+
+# Load models in the background right after startup instead of on the first request
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "1") != "0"
+
+job_manager = JobManager(max_workers=ANALYSIS_WORKERS, warm_up=MODEL_WARMUP)
+
+# Finished analyses are reused for repeat uploads; outputs/ is kept under this size (LRU)
+RESULT_CACHE_MAX_MB = int(os.environ.get("RESULT_CACHE_MAX_MB", "2048"))
+
+result_cache = ResultCache(OUTPUT_DIR, max_bytes=RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+# Uploads at least this large start decoding while they arrive; smaller ones are
+# received in full and looked up in the result cache before any job runs
+STREAM_UPLOAD_MIN_MB = int(os.environ.get("STREAM_UPLOAD_MIN_MB", "64"))
+
+def warm_up_audio():
+    from detectors.audio import TF_AVAILABLE, load_yamnet
+    if not TF_AVAILABLE:
+        raise RuntimeError("TensorFlow not installed")
+    load_yamnet()
+
+# The COCO model serves every video detector; the others are optional
+warmup_steps = {video_analyzer.coco_weights: (lambda: model_registry.warm_up(video_analyzer.coco_weights), True)}
+if Path(model_registry.resolve(video_analyzer.violence_weights)).exists():
+    warmup_steps[video_analyzer.violence_weights] = (
+        lambda: model_registry.warm_up(video_analyzer.violence_weights), False)
+warmup_steps["yamnet"] = (warm_up_audio, False)
+warmup = ModelWarmup(warmup_steps)
+
+# Queue depths are read when /metrics is scraped
+metrics.add_collector(stream_manager.collect_metrics)
+metrics.add_collector(job_manager.collect_metrics)
+metrics.add_collector(alert_dispatcher.collect_metrics)
+
+@app.on_event("startup")
+def start_jobs():
+    # Fork the analysis workers early, before this process loads any model
+    job_manager.start()
+    UploadIngest.clean_stale(UPLOAD_DIR)
+    if MODEL_WARMUP:
+        warmup.start()
+    if OVERLOAD_CONTROL:
+        overload_controller.start()
+
+@app.on_event("shutdown")
+def shutdown_streams():
+    overload_controller.stop()
+    stream_manager.shutdown()
+    job_manager.shutdown()
+    # Flush queued alerts (anything undeliverable is spooled to disk)
+    alert_dispatcher.close()
+
+async def generate_frames(camera_id: str):
+    """Async generator that yields MJPEG frames from a camera's broadcaster."""
+    # Wait until the camera is started
+    while stream_manager.get(camera_id) is None:
+        await asyncio.sleep(0.1)
+
+    camera = stream_manager.get(camera_id)
+    streamed = FRAMES_STREAMED.labels(camera_id)
+    async for frame_bytes in camera.broadcaster.subscribe():
+        streamed.inc()
         yield (b'--frame\r\n'
                b'Content-Type: image/jpeg\r\n\r\n' + frame_bytes + b'\r\n')
-               
-    cap.release()
-    print("Camera released.")
 
 @app.get("/")
 def read_root():
     return {"status": "ML Service Running"}
 
+@app.get("/health/live")
+def liveness():
+    """The process is up and serving requests (models may still be loading)."""
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+def readiness():
+    """
+    200 once the models are loaded and warmed up, 503 while they are loading
+    or if a required one failed. With MODEL_WARMUP=0 models load on first
+    use and the service reports ready at once.
+    """
+    if not MODEL_WARMUP:
+        return {"ready": True, "warmup": "disabled", "models": {}}
+    status = warmup.status()
+    if not status["ready"]:
+        return JSONResponse(status_code=503, content=status)
+    return status
+
+class RoiRequest(BaseModel):
+    polygons: list = []
+
+def parse_roi_param(roi: str):
+    """?roi= is a JSON list of polygons, e.g. [[[0.1,0.2],[0.9,0.2],[0.9,1.0],[0.1,1.0]]]."""
+    if not roi:
+        return None
+    try:
+        return json.loads(roi)
+    except ValueError:
+        raise ValueError("roi must be a JSON list of polygons")
+
+@app.post("/cameras/{camera_id}/start")
+def start_camera(camera_id: str, source: str = "0", type: str = "crowd", roi: str = None,
+                 motion_gate: bool = None, keyframe_interval: int = None):
+    """
+    Starts (or restarts) a camera with the given source and detector type.
+    roi: JSON list of polygons, points as fractions of the frame size; the
+    model only sees these regions. motion_gate: skip inference while the
+    scene is still (default MOTION_GATE). keyframe_interval: run the model
+    on every n-th frame and track boxes in between (default KEYFRAME_INTERVAL).
+    """
+    try:
+        status = stream_manager.start(camera_id, source, type, roi=parse_roi_param(roi),
+                                      motion_gate=MOTION_GATE if motion_gate is None else motion_gate,
+                                      keyframe_interval=KEYFRAME_INTERVAL if keyframe_interval is None
+                                      else keyframe_interval)
+        return {"status": "Camera Started", **status}
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.post("/cameras/{camera_id}/roi")
+def set_camera_roi(camera_id: str, request: RoiRequest):
+    """Replace a running camera's regions of interest ({"polygons": []} for the whole frame)."""
+    try:
+        if not stream_manager.set_roi(camera_id, request.polygons):
+            raise HTTPException(status_code=404, detail=f"Camera {camera_id} not found")
+    except (ValueError, TypeError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return stream_manager.status(camera_id)
+
+@app.post("/cameras/{camera_id}/stop")
+def stop_camera(camera_id: str):
+    if not stream_manager.stop(camera_id):
+        raise HTTPException(status_code=404, detail=f"Camera {camera_id} not running")
+    return {"status": "Camera Stopped", "camera_id": camera_id}
+
+@app.get("/cameras/{camera_id}/status")
+def camera_status(camera_id: str):
+    status = stream_manager.status(camera_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Camera {camera_id} not found")
+    return status
+
+@app.get("/cameras")
+def list_cameras():
+    return stream_manager.status()
+
+@app.get("/cache/status")
+def cache_status():
+    """Result cache size, hit/miss counters and evictions."""
+    return result_cache.status()
+
+@app.get("/metrics")
+def metrics_endpoint():
+    """
+    Prometheus metrics: per-stage latency histograms, frame counters
+    (read, gated, inferred, dropped, streamed) by camera and detector,
+    alert outcomes and queue depths. Uploads are counted under camera "upload".
+    """
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
+@app.get("/overload/status")
+def overload_status():
+    """Whether cameras are being degraded for load, why, and the latest quality steps."""
+    return overload_controller.status()
+
+@app.get("/alerts/status")
+def alerts_status():
+    """Alert delivery counters, queue depth and on-disk spool size."""
+    return alert_dispatcher.status()
+
+@app.get("/video_feed/{camera_id}")
+async def camera_video_feed(camera_id: str):
+    """
+    Returns the MJPEG stream for one camera.
+    Url: http://localhost:8000/video_feed/{camera_id}
+    """
+    return StreamingResponse(generate_frames(camera_id), media_type="multipart/x-mixed-replace; boundary=frame")
+
 @app.post("/start_feed")
 def start_feed(source: str = "0", type: str = "crowd"):
-    """Starts the video feed generation."""
-    with stream_state.lock:
-        stream_state.source = source
-        stream_state.is_running = True
+    """Starts the default camera feed."""
+    start_camera(DEFAULT_CAMERA, source, type)
     return {"status": "Feed Started", "source": source, "type": type}
 
 @app.post("/stop_feed")
 def stop_feed():
-    """Stops the video feed generation."""
-    with stream_state.lock:
-        stream_state.is_running = False
+    """Stops the default camera feed."""
+    stream_manager.stop(DEFAULT_CAMERA)
     return {"status": "Feed Stopped"}
 
 @app.get("/video_feed")
-def video_feed():
+async def video_feed():
     """
-    Returns the MJPEG stream.
+    Returns the MJPEG stream of the default camera.
     Url: http://localhost:8000/video_feed
     """
-    if not stream_state.is_running:
-         # If not running, maybe return a static image or 404? 
-         # For now, let's just return 404 or a placeholder if possible, 
-         # but normally browser handles broken image.
-         # Let's try to auto-start if valid source exists, or just return.
-         pass
+    return await camera_video_feed(DEFAULT_CAMERA)
+
+def job_result(job) -> dict:
+    result = dict(job.result)
+    output_filename = job.info["output_filename"]
+    if result.get('output_video') is None or output_filename is None:
+        # Report-only analysis
+        result['output_video'] = None
+        result['download_url'] = None
+    else:
+        result['output_video'] = f"/outputs/{output_filename}"
+        result['download_url'] = f"/download/{output_filename}"
+    if result.get('frame_detail'):
+        result['frame_detail'] = f"/outputs/{Path(result['frame_detail']).name}"
+    return result
 
-    return StreamingResponse(generate_frames(), media_type="multipart/x-mixed-replace; boundary=frame")
+async def submit_upload(request: Request, segment_workers: int = None, frame_detail: bool = False,
+                        output_mode: str = "annotated", codec: str = "mp4v") -> str:
+    """
+    Receive the "video" file of a multipart upload as a stream and queue it.
+    Uploads of STREAM_UPLOAD_MIN_MB or more (or of unknown size) are
+    submitted as soon as the file part starts, so analysis runs while the
+    rest is still arriving; the result cache can only be checked once the
+    whole file is hashed, so a repeat upload of a large video costs a few
+    seconds of decoding before its job is resolved from the cache. Smaller
+    uploads are cheap to receive first: a cache hit then starts no job at all.
+    frame_detail: also keep per-frame hits as an NPZ next to the video.
+    output_mode, codec: see VideoAnalyzer.analyze_video.
+    """
+    if output_mode not in OUTPUT_MODES:
+        raise ValueError(f"output_mode must be one of {', '.join(OUTPUT_MODES)}")
+    if codec not in ("mp4v", "h264"):
+        raise ValueError("codec must be mp4v or h264")
+    length = request.headers.get("content-length", "")
+    stream = not length.isdigit() or int(length) >= STREAM_UPLOAD_MIN_MB * 1024 * 1024
+    job_ids = []
+
+    def start_job(ingest, video_path: str, growing: bool):
+        job_id = uuid.uuid4().hex[:12]
+        output_filename = f"analyzed_{job_id}_{ingest.filename}"
+        if codec == "h264":
+            # Browsers play H.264 in MP4
+            output_filename = str(Path(output_filename).with_suffix(".mp4"))
+        frame_detail_path = OUTPUT_DIR / f"{Path(output_filename).stem}_frames.npz" if frame_detail else None
+        job_manager.submit(video_path, str(OUTPUT_DIR / output_filename), job_id=job_id,
+                           segment_workers=segment_workers or SEGMENT_WORKERS, growing=growing,
+                           frame_detail_path=frame_detail_path and str(frame_detail_path),
+                           output_mode=output_mode, codec=codec,
+                           info={"filename": ingest.filename, "output_filename": output_filename,
+                                 "output_mode": output_mode, "codec": codec})
+        job_manager.get(job_id).future.add_done_callback(lambda _: ingest.cleanup())
+        job_ids.append(job_id)
+
+    def on_start(filename):
+        ingest = UploadIngest(UPLOAD_DIR, filename)
+        if stream:
+            start_job(ingest, str(ingest.incoming_path), growing=True)
+        return ingest
+
+    ingest = await receive_upload(request, "video", on_start)
+
+    # Same video, same models and settings: reuse the earlier report and video
+    key = ResultCache.make_key(ingest.info()["sha256"],
+                               {**video_analyzer.cache_config(), "frame_detail": frame_detail,
+                                "output_mode": output_mode, "codec": codec})
+    cached = result_cache.get(key)
+    if not job_ids:
+        if cached is not None:
+            ingest.cleanup()
+            return job_manager.add_done(cached["result"], info={
+                "filename": ingest.filename, "output_filename": cached["output_filename"],
+                "output_mode": output_mode, "codec": codec, "upload": ingest.info(), "cached": True})
+        start_job(ingest, str(ingest.path), growing=False)
+    job_id = job_ids[0]
+    job = job_manager.get(job_id)
+    job.info["upload"] = ingest.info()
+    if cached is not None:
+        job_manager.resolve(job_id, cached["result"], output_filename=cached["output_filename"], cached=True)
+    else:
+        job.info["cached"] = False
+
+        def store(done):
+            if done.exception() is None and not job.info["cached"]:
+                output_path = job.output_path if done.result().get("output_video") else None
+                result_cache.put(key, done.result(), output_path, job.extra_paths)
+
+        job.done.add_done_callback(store)
+    return job_id
+
+@app.post("/jobs")
+async def submit_job(request: Request, segment_workers: int = None, frame_detail: bool = False,
+                     output_mode: str = "annotated", codec: str = "mp4v"):
+    """
+    Queue an uploaded video (multipart field "video") for analysis and
+    return its job id as soon as the upload is received.
+    Poll /jobs/{job_id} for progress and fetch /jobs/{job_id}/result when done.
+    segment_workers: split the video across this many processes (default SEGMENT_WORKERS).
+    frame_detail: also save every per-frame hit as a compact NPZ (linked as frame_detail in the result).
+    output_mode: "annotated" (every frame re-encoded with boxes), "report" (JSON
+    report only, no video) or "events" (only stretches with detections re-encoded;
+    if the upload isn't already in the requested codec, the whole video is).
+    codec: "mp4v" or "h264" (plays in browsers).
+    Detections in the result are events, one per run of consecutive hits.
+    """
+    try:
+        job_id = await submit_upload(request, segment_workers, frame_detail, output_mode, codec)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return job_manager.status(job_id)
+
+@app.get("/jobs")
+def list_jobs():
+    return job_manager.status()
+
+@app.get("/jobs/{job_id}")
+def job_status(job_id: str):
+    """Job state with frames processed, fps and ETA."""
+    status = job_manager.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return status
+
+@app.post("/jobs/{job_id}/cancel")
+def cancel_job(job_id: str):
+    """Stop a queued or running job; a finished job is left as it is."""
+    if job_manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    job_manager.cancel(job_id)
+    return job_manager.status(job_id)
+
+@app.get("/jobs/{job_id}/result")
+def job_result_endpoint(job_id: str):
+    """The analysis report of a finished job (same shape as /analyze_video)."""
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    if job.status != "done":
+        raise HTTPException(status_code=409, detail=f"Job {job_id} is {job.status}")
+    return job_result(job)
 
 @app.post("/analyze_video")
-async def analyze_video(video: UploadFile = File(...)):
+async def analyze_video(request: Request):
     """
-    Analyze an uploaded video file for incidents.
+    Analyze an uploaded video file (multipart field "video") for incidents.
     Returns a JSON report and path to annotated video.
+    Runs as a job (see /jobs) and waits for it without blocking other requests.
     """
     try:
-        # Save uploaded file
-        input_path = UPLOAD_DIR / video.filename
-        output_filename = f"analyzed_{video.filename}"
-        output_path = OUTPUT_DIR / output_filename
-        
-        with open(input_path, "wb") as buffer:
-            shutil.copyfileobj(video.file, buffer)
-        
-        # Analyze video
-        result = video_analyzer.analyze_video(str(input_path), str(output_path))
-        
-        # Add output video URL
-        result['output_video'] = f"/outputs/{output_filename}"
-        result['download_url'] = f"/download/{output_filename}"
-        
-        return result
+        job_id = await submit_upload(request)
+        await job_manager.wait(job_id)
+        return job_result(job_manager.get(job_id))
     except Exception as e:
         return {"error": str(e), "detections": [], "total_frames": 0}
 
@@ -0,0 +1,313 @@
+import bisect
+import os
+import threading
+
+# Prometheus text exposition format, served on /metrics
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Stage latency buckets in seconds, 1 ms .. 10 s
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class _CounterChild:
+    def __init__(self, registry):
+        self.registry = registry
+        self.lock = threading.Lock()
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        if self.registry.enabled:
+            with self.lock:
+                self.value += amount
+
+    def _take(self, reset: bool):
+        with self.lock:
+            value = self.value
+            if reset:
+                self.value = 0.0
+        return value or None
+
+    def _merge(self, value):
+        with self.lock:
+            self.value += value
+
+
+class _GaugeChild(_CounterChild):
+    def set(self, value: float):
+        with self.lock:
+            self.value = value
+
+    def _take(self, reset: bool):
+        return None     # a gauge is the state of one process, it isn't summed across them
+
+
+class _HistogramChild:
+    def __init__(self, registry, buckets):
+        self.registry = registry
+        self.buckets = buckets
+        self.lock = threading.Lock()
+        self.counts = [0] * (len(buckets) + 1)     # the last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float):
+        if self.registry.enabled:
+            index = bisect.bisect_left(self.buckets, value)
+            with self.lock:
+                self.counts[index] += 1
+                self.sum += value
+
+    def _take(self, reset: bool):
+        with self.lock:
+            counts, total = list(self.counts), self.sum
+            if reset:
+                self.counts = [0] * len(self.counts)
+                self.sum = 0.0
+        return (counts, total) if any(counts) else None
+
+    def _merge(self, value):
+        counts, total = value
+        with self.lock:
+            for i, count in enumerate(counts):
+                self.counts[i] += count
+            self.sum += total
+
+
+class Metric:
+    """
+    One named metric and its labelled series. labels(*values) returns the
+    series for those label values (created on first use); hot paths should
+    look a series up once and keep it.
+    """
+
+    kind = None
+
+    def __init__(self, registry, name: str, help: str, labelnames=(), buckets=None):
+        self.registry = registry
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets or LATENCY_BUCKETS)
+        self.children = {}
+        self.lock = threading.Lock()
+
+    def labels(self, *values):
+        key = tuple(str(v) for v in values)
+        child = self.children.get(key)
+        if child is None:
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} takes labels {self.labelnames}")
+            with self.lock:
+                child = self.children.get(key)
+                if child is None:
+                    child = self.children[key] = self._new_child()
+        return child
+
+    def _new_child(self):
+        if self.kind == "histogram":
+            return _HistogramChild(self.registry, self.buckets)
+        if self.kind == "gauge":
+            return _GaugeChild(self.registry)
+        return _CounterChild(self.registry)
+
+    def remove(self, *values):
+        """Drop the series with these label values (e.g. for a camera that was stopped)."""
+        with self.lock:
+            self.children.pop(tuple(str(v) for v in values), None)
+
+    def remove_matching(self, **labels):
+        """Drop every series whose labels include these values."""
+        positions = [(self.labelnames.index(name), str(value)) for name, value in labels.items()]
+        with self.lock:
+            for key in list(self.children):
+                if all(key[i] == value for i, value in positions):
+                    del self.children[key]
+
+    def clear(self):
+        with self.lock:
+            self.children.clear()
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self.lock:
+            children = sorted(self.children.items(), key=lambda item: item[0])
+        for key, child in children:
+            labels = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, key)]
+            if self.kind != "histogram":
+                suffix = "{" + ",".join(labels) + "}" if labels else ""
+                lines.append(f"{self.name}{suffix} {_format_value(child.value)}")
+                continue
+            with child.lock:
+                counts, total = list(child.counts), child.sum
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                bucket_labels = ",".join(labels + [f'le="{_format_value(bound)}"'])
+                lines.append(f"{self.name}_bucket{{{bucket_labels}}} {cumulative}")
+            suffix = "{" + ",".join(labels) + "}" if labels else ""
+            lines.append(f"{self.name}_sum{suffix} {_format_value(total)}")
+            lines.append(f"{self.name}_count{suffix} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    In-process counters, gauges and histograms, rendered in the Prometheus
+    text format.
+
+    Updates cost one lock and an add (a bisect for histograms), and nothing
+    at all when the registry is disabled. Collectors added with
+    add_collector() run at render time, for values that are cheaper to read
+    when scraped (queue depths) than to track on every change.
+
+    Worker processes (analysis jobs, video segments) send their counts to
+    the API process: snapshot(reset=True) there, merge() here.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.metrics = {}
+        self.collectors = []
+
+    def _add(self, kind: str, name: str, help: str, labelnames, buckets=None) -> Metric:
+        if name in self.metrics:
+            return self.metrics[name]
+        metric = Metric(self, name, help, labelnames, buckets)
+        metric.kind = kind
+        self.metrics[name] = metric
+        return metric
+
+    def counter(self, name: str, help: str, labelnames=()) -> Metric:
+        return self._add("counter", name, help, labelnames)
+
+    def gauge(self, name: str, help: str, labelnames=()) -> Metric:
+        return self._add("gauge", name, help, labelnames)
+
+    def histogram(self, name: str, help: str, labelnames=(), buckets=None) -> Metric:
+        return self._add("histogram", name, help, labelnames, buckets)
+
+    def add_collector(self, fn):
+        """fn() is called before every render, to set gauges."""
+        self.collectors.append(fn)
+
+    def render(self) -> str:
+        for fn in self.collectors:
+            try:
+                fn()
+            except Exception as e:
+                print(f"Metrics collector failed: {e}")
+        lines = []
+        for metric in list(self.metrics.values()):
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def snapshot(self, reset: bool = False) -> dict:
+        """Counter and histogram values as {name: {labels: value}}; reset=True starts them over."""
+        snapshot = {}
+        for name, metric in list(self.metrics.items()):
+            values = {}
+            with metric.lock:
+                children = list(metric.children.items())
+            for key, child in children:
+                value = child._take(reset)
+                if value is not None:
+                    values[key] = value
+            if values:
+                snapshot[name] = values
+        return snapshot
+
+    def merge(self, snapshot: dict):
+        """Add another process's snapshot to these metrics."""
+        for name, values in snapshot.items():
+            metric = self.metrics.get(name)
+            if metric is None:
+                continue
+            for key, value in values.items():
+                metric.labels(*key)._merge(value)
+
+    def reset(self):
+        """Forget every series (a forked worker starts from zero instead of the parent's counts)."""
+        for metric in list(self.metrics.values()):
+            metric.clear()
+
+
+class StageMetrics:
+    """
+    The per-frame series of one (camera, detector) loop, looked up once:
+    stage latencies and frame counters. Stages: decode, gate (motion check),
+    infer, track (boxes carried between keyframes, see keyframe_tracker.py),
+    annotate (results to detections and alerts), draw (overlays) and encode
+    (JPEG for viewers, or the output video).
+    """
+
+    stages = ("decode", "gate", "infer", "track", "annotate", "draw", "encode")
+
+    def __init__(self, camera, detector: str):
+        self.camera = str(camera)
+        self.detector = detector
+        for stage in self.stages:
+            setattr(self, stage, STAGE_SECONDS.labels(self.camera, detector, stage))
+        self.frames_read = FRAMES_READ.labels(self.camera, detector)
+        self.frames_gated = FRAMES_GATED.labels(self.camera, detector)
+        self.frames_inferred = FRAMES_INFERRED.labels(self.camera, detector)
+        self.frames_dropped = FRAMES_DROPPED.labels(self.camera, detector)
+        self.frames_tracked = FRAMES_TRACKED.labels(self.camera, detector)
+
+    def remove(self):
+        for metric in (STAGE_SECONDS, FRAMES_READ, FRAMES_GATED, FRAMES_INFERRED, FRAMES_DROPPED,
+                       FRAMES_TRACKED):
+            metric.remove_matching(camera=self.camera, detector=self.detector)
+
+
+# METRICS=0 turns all instrumentation into no-ops
+metrics = MetricsRegistry(enabled=os.environ.get("METRICS", "1") != "0")
+
+STAGE_SECONDS = metrics.histogram(
+    "inciscan_stage_seconds",
+    "Time per frame (per batch for infer) in each stage; decode includes waiting for live sources",
+    ("camera", "detector", "stage"))
+FRAMES_READ = metrics.counter(
+    "inciscan_frames_read_total", "Frames decoded from the source for analysis", ("camera", "detector"))
+FRAMES_GATED = metrics.counter(
+    "inciscan_frames_gated_total", "Frames the motion gate kept from the model", ("camera", "detector"))
+FRAMES_INFERRED = metrics.counter(
+    "inciscan_frames_inferred_total", "Frames run through the model", ("camera", "detector"))
+FRAMES_DROPPED = metrics.counter(
+    "inciscan_frames_dropped_total", "Frames replaced by a newer one before inference", ("camera", "detector"))
+FRAMES_TRACKED = metrics.counter(
+    "inciscan_frames_tracked_total", "Frames whose boxes were carried over by the tracker instead of the model",
+    ("camera", "detector"))
+FRAMES_STREAMED = metrics.counter(
+    "inciscan_frames_streamed_total", "Encoded frames sent to MJPEG viewers", ("camera",))
+ALERTS = metrics.counter(
+    "inciscan_alerts_total",
+    "Alerts by outcome: queued, suppressed (folded repeat), sent, failed (a POST attempt), spooled",
+    ("camera", "type", "outcome"))
+ALERT_POST_SECONDS = metrics.histogram(
+    "inciscan_alert_post_seconds", "Duration of alert batch POSTs to the backend")
+QUALITY_LEVEL = metrics.gauge(
+    "inciscan_quality_level", "Overload degradation step of a camera (0 = full quality)", ("camera", "detector"))
+INFERENCE_IMGSZ = metrics.gauge(
+    "inciscan_inference_imgsz", "Model input size of a camera (0 = the model's own)", ("camera", "detector"))
+SAMPLING_FPS_SCALE = metrics.gauge(
+    "inciscan_sampling_fps_scale", "Factor applied to a camera's sampling rate", ("camera", "detector"))
+DETECTOR_PAUSED = metrics.gauge(
+    "inciscan_detector_paused", "1 while a camera's detector is paused for overload", ("camera", "detector"))
+OVERLOAD_DECISIONS = metrics.counter(
+    "inciscan_overload_decisions_total", "Quality steps taken by the overload controller",
+    ("camera", "detector", "action"))
+OVERLOADED = metrics.gauge(
+    "inciscan_overloaded", "1 while the overload controller sees more load than the service can handle")
+CPU_UTILIZATION = metrics.gauge(
+    "inciscan_cpu_utilization", "Share of the available CPU cores used by the service and its worker processes")
+QUEUE_DEPTH = metrics.gauge(
+    "inciscan_queue_depth", "Items waiting in a queue, at scrape time", ("camera", "detector", "queue"))
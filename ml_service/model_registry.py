@@ -0,0 +1,262 @@
+import copy
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+# "torch": PyTorch eager; "onnx": ONNX Runtime; "onnx-int8": ONNX Runtime with
+# dynamically quantized INT8 weights; "openvino": OpenVINO runtime
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino")
+EXPORT_SUFFIXES = {"onnx": ".onnx", "onnx-int8": ".int8.onnx", "openvino": "_openvino_model"}
+
+# Weight files not found where given are looked up in (and stock ones downloaded to) this directory
+MODEL_DIR = os.environ.get("MODEL_DIR", "models")
+
+
+def YOLO(*args, **kwargs):
+    """ultralytics.YOLO, imported on first use: torch alone takes seconds to import."""
+    from ultralytics import YOLO as _YOLO
+    return _YOLO(*args, **kwargs)
+
+
+def is_stock_weights(name: str) -> bool:
+    """Weights ultralytics can download (yolov8n.pt, ...), as opposed to custom ones."""
+    from ultralytics.utils.downloads import GITHUB_ASSETS_NAMES
+    return Path(name).name in GITHUB_ASSETS_NAMES
+
+
+class ModelRegistry:
+    """
+    Process-wide cache of YOLO weights.
+
+    Each weight file is loaded from disk once, on first use. Callers get a
+    lightweight handle from get_model(): it shares the loaded network (and so
+    its memory) but has its own predictor, so per-consumer state such as
+    model.track(persist=True) tracker state stays separate. Use one handle
+    per consumer thread; handles themselves are not thread-safe.
+
+    backend (default: the INFERENCE_BACKEND env var, else "torch") picks the
+    runtime. For anything but torch the .pt weights are exported once into
+    export_dir (MODEL_EXPORT_DIR, default model_exports/), named after the
+    weight file's hash so changed weights are re-exported, and run through
+    ultralytics' ONNX Runtime / OpenVINO support, so handles return the same
+    Results objects. Those runtimes keep a session per handle rather than
+    sharing one network. If a backend can't be used (package missing, export
+    failed) the weights fall back to torch with a warning.
+
+    Weight names that aren't an existing path are read from model_dir
+    (MODEL_DIR, default models/), where stock weights are also downloaded on
+    first use; with the weights there the service needs no network.
+    """
+
+    def __init__(self, backend: str = None, export_dir: str = None, model_dir: str = None):
+        backend = backend or os.environ.get("INFERENCE_BACKEND", "torch")
+        if backend not in BACKENDS:
+            raise ValueError(f"Unknown inference backend {backend!r}, expected one of {BACKENDS}")
+        self.backend = backend
+        self.export_dir = Path(export_dir or os.environ.get("MODEL_EXPORT_DIR", "model_exports"))
+        self.model_dir = Path(model_dir or MODEL_DIR)
+        self._models = {}       # weights -> loaded YOLO
+        self._backends = {}     # weights -> backend actually in use
+        self._failures = {}     # weights -> load exception
+        self._load_times = {}   # weights -> seconds spent loading
+        self._digests = {}      # weights -> ((mtime, size), sha256)
+        self._loading = {}      # weights -> lock held while they load
+        self._lock = threading.Lock()
+
+    def get_model(self, weights: str):
+        """Return a handle for weights, loading them on first call. Raises if loading fails."""
+        return self._handle(self._load(weights))
+
+    def backend_of(self, weights: str) -> str:
+        """The backend weights actually run on (torch after a fallback), or the configured one if not loaded."""
+        with self._lock:
+            return self._backends.get(weights, self.backend)
+
+    def try_get_model(self, weights: str):
+        """Like get_model, but returns None when the weights can't be loaded."""
+        try:
+            return self.get_model(weights)
+        except Exception:
+            return None
+
+    def register(self, weights: str, model, backend: str = "custom"):
+        """
+        Serve weights from an already-built model instead of loading them,
+        e.g. a stand-in for offline benchmarks (see benchmarks/stub_model.py).
+        The model needs the YOLO attributes handles copy: predictor,
+        callbacks and overrides.
+        """
+        with self._lock:
+            self._models[weights] = model
+            self._backends[weights] = backend
+            self._load_times[weights] = 0.0
+            self._failures.pop(weights, None)
+
+    def resolve(self, weights: str) -> str:
+        """The file weights load from: the path as given if it exists, otherwise under model_dir."""
+        path = Path(weights)
+        if path.exists() or path.is_absolute():
+            return str(path)
+        return str(self.model_dir / path)
+
+    def warm_up(self, weights: str, imgsz: int = 640) -> float:
+        """
+        Load weights and run one inference on a blank frame, so the first
+        real frame doesn't pay for loading and first-call setup. Returns the
+        seconds it took; raises if the weights can't be loaded.
+        """
+        import numpy as np
+        start = time.perf_counter()
+        model = self.get_model(weights)
+        model(np.zeros((imgsz, imgsz, 3), dtype=np.uint8), verbose=False)
+        return time.perf_counter() - start
+
+    def loaded(self) -> dict:
+        """weights -> load time in seconds, for everything loaded so far."""
+        with self._lock:
+            return dict(self._load_times)
+
+    def weights_digest(self, weights: str) -> str:
+        """
+        SHA-256 of a weight file, so results can be tied to the exact model
+        that produced them. Re-hashed only when the file changes; returns
+        "missing:<weights>" if the file isn't on disk.
+        """
+        path = self.resolve(weights)
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return f"missing:{weights}"
+        version = (stat.st_mtime, stat.st_size)
+        cached = self._digests.get(weights)
+        if cached is None or cached[0] != version:
+            digest = hashlib.sha256()
+            with open(path, "rb") as f:
+                for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                    digest.update(chunk)
+            cached = self._digests[weights] = (version, digest.hexdigest())
+        return cached[1]
+
+    def _load(self, weights: str):
+        with self._lock:
+            if weights in self._models:
+                return self._models[weights]
+            if weights in self._failures:
+                raise self._failures[weights]
+            loading = self._loading.setdefault(weights, threading.Lock())
+
+        # Only callers of the same weights wait on this load; the registry lock
+        # stays free, so already-loaded weights are served meanwhile
+        with loading:
+            with self._lock:
+                if weights in self._models:
+                    return self._models[weights]
+                if weights in self._failures:
+                    raise self._failures[weights]
+            start = time.perf_counter()
+            try:
+                model, backend = self._build(weights)
+            except Exception as e:
+                with self._lock:
+                    self._failures[weights] = e
+                    self._loading.pop(weights, None)
+                raise
+            with self._lock:
+                self._load_times[weights] = time.perf_counter() - start
+                self._backends[weights] = backend
+                self._models[weights] = model
+                self._loading.pop(weights, None)
+            return model
+
+    def _build(self, weights: str):
+        """Load weights from disk (exporting them for the backend first); returns (model, backend)."""
+        backend = self.backend
+        path = self.resolve(weights)
+        if not Path(path).exists():
+            if not is_stock_weights(path):
+                # Custom weights that aren't there: fail now rather than look them up online
+                raise FileNotFoundError(f"{weights} not found (looked in {self.model_dir})")
+            Path(path).parent.mkdir(parents=True, exist_ok=True)
+        model = None
+        if backend != "torch":
+            try:
+                model = YOLO(self.export(weights, backend), task="detect")
+            except FileNotFoundError:
+                backend = "torch"   # no such weights; the torch load below reports it
+            except Exception as e:
+                print(f"Could not run {weights} on {backend} ({e}); using PyTorch")
+                backend = "torch"
+        if model is None:
+            model = YOLO(path)
+            # Fuse once here; predictors would otherwise each fuse the shared network
+            if hasattr(model.model, "fuse"):
+                model.model.fuse(verbose=False)
+        return model, backend
+
+    def export(self, weights: str, backend: str) -> str:
+        """
+        Path of weights exported for backend, exporting them on first use.
+        Exports run on a private copy of the weights in a temp dir and are
+        moved into place at the end, so processes exporting at the same time
+        don't see each other's partial files.
+        """
+        source = Path(self.resolve(weights))
+        if not source.exists():
+            # Stock weights (e.g. yolov8n.pt) are downloaded on first load
+            source = Path(YOLO(str(source)).ckpt_path)
+        digest = self.weights_digest(str(source))[:12]
+        target = self.export_dir / f"{source.stem}-{digest}{EXPORT_SUFFIXES[backend]}"
+        if target.exists():
+            return str(target)
+
+        self.export_dir.mkdir(parents=True, exist_ok=True)
+        with tempfile.TemporaryDirectory(dir=self.export_dir, prefix=".export-") as tmp:
+            copy_path = Path(tmp) / source.name
+            shutil.copy2(source, copy_path)
+            if backend == "openvino":
+                exported = YOLO(str(copy_path)).export(format="openvino", dynamic=True, verbose=False)
+            else:
+                exported = YOLO(str(copy_path)).export(format="onnx", dynamic=True, simplify=True,
+                                                        verbose=False)
+                if backend == "onnx-int8":
+                    exported = quantize_onnx(exported, Path(tmp) / f"{source.stem}.int8.onnx")
+            try:
+                os.replace(exported, target)
+            except OSError:
+                if not target.exists():
+                    raise
+        print(f"Exported {weights} for {backend}: {target}")
+        return str(target)
+
+    @staticmethod
+    def _handle(model):
+        handle = copy.copy(model)
+        # Own predictor (and tracker state), own callback lists and overrides
+        handle.predictor = None
+        handle.callbacks = {event: list(fns) for event, fns in model.callbacks.items()}
+        handle.overrides = dict(model.overrides)
+        return handle
+
+
+def quantize_onnx(model_path, output_path) -> str:
+    """
+    Dynamic INT8 quantization of an exported ONNX model (weights stored as
+    uint8, activations quantized at run time), keeping the ultralytics
+    metadata (class names, image size) the loader needs.
+    """
+    import onnx
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(str(model_path), str(output_path), weight_type=QuantType.QUInt8)
+    source, quantized = onnx.load(str(model_path)), onnx.load(str(output_path))
+    if not quantized.metadata_props:
+        quantized.metadata_props.extend(source.metadata_props)
+        onnx.save(quantized, str(output_path))
+    return str(output_path)
+
+
+model_registry = ModelRegistry()
@@ -0,0 +1,193 @@
+import collections
+import os
+import threading
+import time
+
+import psutil
+
+from metrics import CPU_UTILIZATION, OVERLOAD_DECISIONS, OVERLOADED
+
+# Quality steps, best first: (model input size, sampling rate factor).
+# None keeps the model's own input size (640 for the stock weights).
+LEVELS = (
+    (None, 1.0),
+    (480, 1.0),
+    (480, 0.5),
+    (320, 0.5),
+    (320, 0.25),
+)
+# One more step for optional detectors: paused
+PAUSED = len(LEVELS)
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def cpu_seconds_by_process() -> dict:
+    """pid -> CPU seconds used so far, for this process and its children (job and segment workers)."""
+    service = psutil.Process()
+    seconds = {}
+    for proc in [service, *service.children(recursive=True)]:
+        try:
+            times = proc.cpu_times()
+        except psutil.Error:
+            continue    # exited meanwhile
+        seconds[proc.pid] = times.user + times.system
+    return seconds
+
+
+class OverloadController:
+    """
+    Trades camera analysis quality for load. When a camera lags, drops
+    frames, or the service (with its worker processes) uses more than
+    cpu_budget of the cores, one camera
+    steps down a level in LEVELS (lowest-priority detectors first, optional
+    ones finally paused); with headroom for recover_ticks checks, one steps
+    back up. Decisions are counted in metrics and listed by status().
+    """
+
+    def __init__(self, stream_manager, cpu_budget: float = 0.9, max_lag: float = 2.0,
+                 max_drop_rate: float = 0.3, interval: float = 2.0, recover_ticks: int = 5,
+                 headroom: float = 0.15):
+        self.stream_manager = stream_manager
+        self.cpu_budget = cpu_budget
+        self.headroom = headroom
+        self.max_lag = max_lag
+        self.max_drop_rate = max_drop_rate
+        self.interval = interval
+        self.recover_ticks = recover_ticks
+
+        self.cores = available_cores()
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.lock = threading.Lock()
+        self.decisions = collections.deque(maxlen=50)
+        self.overloaded = False
+        self.reasons = []
+        self.healthy_ticks = 0
+        self.cpu_utilization = 0.0
+        self._last_cpu = None           # ({pid: CPU seconds}, wall time) at the last tick
+        self._last_counts = {}          # camera_id -> (frames dropped, frames processed)
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="overload-controller", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(5.0)
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            try:
+                self.tick()
+            except Exception as e:
+                print(f"Overload controller error: {e}")
+
+    def tick(self):
+        """One check: measure, then step at most one camera down (or up)."""
+        cameras = [cam for cam in list(self.stream_manager.cameras.values()) if cam.scheduler is not None]
+        reasons, spare = self._measure(cameras)
+        with self.lock:
+            self.overloaded = bool(reasons)
+            self.reasons = reasons
+            OVERLOADED.labels().set(int(self.overloaded))
+            if reasons:
+                self.healthy_ticks = 0
+                self._step_down(cameras, "; ".join(reasons))
+            elif not spare:
+                self.healthy_ticks = 0
+            else:
+                self.healthy_ticks += 1
+                if self.healthy_ticks >= self.recover_ticks:
+                    self.healthy_ticks = 0
+                    self._step_up(cameras)
+
+    def _measure(self, cameras):
+        """(why the service is overloaded right now, empty if it isn't; whether it has headroom)."""
+        reasons = []
+        spare = True
+        cpu, now = cpu_seconds_by_process(), time.monotonic()
+        if self._last_cpu is not None and now > self._last_cpu[1]:
+            # Workers started since the last tick count in full; ones that exited drop out
+            used = sum(max(0.0, seconds - self._last_cpu[0].get(pid, 0.0)) for pid, seconds in cpu.items())
+            self.cpu_utilization = used / ((now - self._last_cpu[1]) * self.cores)
+            CPU_UTILIZATION.labels().set(round(self.cpu_utilization, 3))
+            if self.cpu_utilization > self.cpu_budget:
+                reasons.append(f"cpu {100 * self.cpu_utilization:.0f}% > {100 * self.cpu_budget:.0f}%")
+            spare = self.cpu_utilization < self.cpu_budget - self.headroom
+        self._last_cpu = (cpu, now)
+
+        counts = {}
+        for cam in cameras:
+            if cam.paused:
+                continue
+            dropped, processed = counts[cam.camera_id] = (cam.frames_dropped, cam.scheduler.frames_processed)
+            last_dropped, last_processed = self._last_counts.get(cam.camera_id, (dropped, processed))
+            dropped, processed = dropped - last_dropped, processed - last_processed
+            # The lag of the last finished frame; stale if none finished since (e.g. a still scene)
+            if processed and cam.scheduler.lag > self.max_lag:
+                reasons.append(f"{cam.camera_id} lag {cam.scheduler.lag:.1f}s")
+            if processed and cam.scheduler.lag > self.max_lag / 2:
+                spare = False
+            drop_rate = dropped / (dropped + processed) if dropped else 0.0
+            if drop_rate > self.max_drop_rate:
+                reasons.append(f"{cam.camera_id} dropping {100 * drop_rate:.0f}% of frames")
+            if drop_rate > self.max_drop_rate / 2:
+                spare = False
+        self._last_counts = counts
+        return reasons, spare
+
+    @staticmethod
+    def _lowest_level(cam) -> int:
+        return PAUSED if cam.detector.optional else len(LEVELS) - 1
+
+    def _step_down(self, cameras, reason: str):
+        candidates = [cam for cam in cameras if cam.quality_level < self._lowest_level(cam)]
+        if not candidates:
+            return
+        # Least important detector first, then the least degraded of those, then the most behind
+        cam = min(candidates, key=lambda c: (-c.detector.priority, c.quality_level, -c.scheduler.lag))
+        self._apply(cam, cam.quality_level + 1, "step_down", reason)
+
+    def _step_up(self, cameras):
+        candidates = [cam for cam in cameras if cam.quality_level > 0]
+        if not candidates:
+            return
+        # Most important detector first, then the most degraded of those
+        cam = min(candidates, key=lambda c: (c.detector.priority, -c.quality_level))
+        self._apply(cam, cam.quality_level - 1, "step_up", "headroom")
+
+    def _apply(self, cam, level: int, action: str, reason: str):
+        if level >= PAUSED:
+            imgsz, fps_scale = LEVELS[-1]
+            cam.set_quality(level, imgsz, fps_scale, paused=True)
+        else:
+            imgsz, fps_scale = LEVELS[level]
+            cam.set_quality(level, imgsz, fps_scale)
+        detector = type(cam.detector).__name__
+        OVERLOAD_DECISIONS.labels(cam.camera_id, detector, action).inc()
+        decision = {"time": time.time(), "camera_id": cam.camera_id, "detector": detector,
+                    "action": action, "level": level, "imgsz": imgsz, "fps_scale": fps_scale,
+                    "paused": level >= PAUSED, "reason": reason}
+        self.decisions.append(decision)
+        print(f"Overload control: {action} {cam.camera_id} ({detector}) to level {level}: {reason}")
+
+    def status(self) -> dict:
+        with self.lock:
+            return {
+                "running": self.thread is not None and self.thread.is_alive(),
+                "overloaded": self.overloaded,
+                "reasons": list(self.reasons),
+                "cpu_utilization": round(self.cpu_utilization, 3),
+                "cpu_budget": self.cpu_budget,
+                "max_lag_seconds": self.max_lag,
+                "decisions": list(self.decisions),
+            }
@@ -0,0 +1,223 @@
+import queue
+import threading
+import time
+
+import cv2
+
+# Marks the end of the stream as it travels through the queues
+_END = object()
+
+
+def open_capture(source):
+    """Open a webcam ("0"), file path or stream URL."""
+    return cv2.VideoCapture(0 if source == "0" else source)
+
+
+def capture_reader(cap, max_frames: int = None):
+    """
+    Build a read function for FramePipeline that decodes every frame of an
+    open VideoCapture, stopping after max_frames if given.
+    """
+    remaining = max_frames
+
+    def read():
+        nonlocal remaining
+        if not cap.isOpened() or remaining == 0:
+            return None
+        success, frame = cap.read()
+        if remaining is not None:
+            remaining -= 1
+        return frame if success else None
+    return read
+
+
+def seek_frame(cap, frame_index: int):
+    """
+    Position cap so the next read() returns frame frame_index (0-based).
+    Falls back to grabbing forward from the start when the backend's seek
+    lands elsewhere (some codecs only seek to keyframes).
+    """
+    if frame_index <= 0:
+        return
+    cap.set(cv2.CAP_PROP_POS_FRAMES, frame_index)
+    if int(cap.get(cv2.CAP_PROP_POS_FRAMES)) == frame_index:
+        return
+    cap.set(cv2.CAP_PROP_POS_FRAMES, 0)
+    for _ in range(frame_index):
+        if not cap.grab():
+            break
+
+
+class FramePipeline:
+    """
+    Three-stage frame pipeline: decode -> infer -> sink (annotate/encode/alert).
+
+    Each stage runs on its own thread and the stages are linked by bounded
+    queues, so a slow stage applies backpressure to the ones before it
+    instead of letting frames pile up in memory. OpenCV decode/encode release
+    the GIL, which lets them overlap with model inference.
+
+    read_fn()                 -> next frame, or None at end of stream
+    infer_fn(frames)          -> list of results, one per frame (called with up to batch_size frames)
+    sink_fn(frame, result)    -> called for every frame, in decode order
+
+    batch_timeout: once a batch has its first frame, how long inference waits
+    for the decoder to fill the rest. Without it batches only fill when
+    decode is already ahead of inference; a short wait lets a decoder running
+    near inference speed still hand over full batches.
+
+    latest_only: for live sources. Instead of blocking the decoder, a newly
+    decoded frame replaces one still waiting for inference, so inference
+    always gets the freshest frame. Replaced frames are counted in `dropped`
+    (and reported to on_drop(), if given).
+    """
+
+    def __init__(self, read_fn, infer_fn, sink_fn, batch_size: int = 1,
+                 queue_size: int = 8, name: str = "pipeline", latest_only: bool = False,
+                 on_drop=None, batch_timeout: float = 0.05):
+        self.read_fn = read_fn
+        self.infer_fn = infer_fn
+        self.sink_fn = sink_fn
+        self.batch_size = max(1, batch_size)
+        self.name = name
+        self.latest_only = latest_only
+        self.on_drop = on_drop
+        self.batch_timeout = batch_timeout
+
+        self.decoded = queue.Queue(maxsize=self.batch_size if latest_only else queue_size)
+        self.inferred = queue.Queue(maxsize=queue_size)
+        self.stop_event = threading.Event()
+        self.error = None
+        self.threads = []
+        self.dropped = 0
+
+    def start(self):
+        stages = [("decode", self._decode), ("infer", self._infer), ("sink", self._sink)]
+        self.threads = [
+            threading.Thread(target=self._guard, args=(fn,), name=f"{self.name}-{stage}", daemon=True)
+            for stage, fn in stages
+        ]
+        for t in self.threads:
+            t.start()
+        return self
+
+    def join(self, timeout: float = None):
+        for t in self.threads:
+            t.join(timeout)
+        if self.error is not None:
+            raise self.error
+
+    def run(self):
+        """Run the pipeline to completion on the calling thread."""
+        self.start()
+        try:
+            # Poll so Ctrl+C still reaches the caller while the stages run
+            while any(t.is_alive() for t in self.threads):
+                for t in self.threads:
+                    t.join(0.2)
+        except KeyboardInterrupt:
+            self.stop()
+            raise
+        self.join()
+
+    def stop(self):
+        """Ask every stage to finish; frames still queued are discarded."""
+        self.stop_event.set()
+
+    @property
+    def running(self) -> bool:
+        return any(t.is_alive() for t in self.threads)
+
+    def queue_depths(self) -> dict:
+        return {"decoded": self.decoded.qsize(), "inferred": self.inferred.qsize()}
+
+    # --- stages ---
+
+    def _guard(self, stage_fn):
+        try:
+            stage_fn()
+        except Exception as e:
+            if self.error is None:
+                self.error = e
+            self.stop_event.set()
+
+    def _put(self, q, item) -> bool:
+        """Blocking put that gives up when the pipeline is stopped (backpressure)."""
+        while not self.stop_event.is_set():
+            try:
+                q.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _put_latest(self, q, item):
+        """Non-blocking put that evicts the oldest queued frame when full."""
+        while True:
+            try:
+                q.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    q.get_nowait()
+                    self.dropped += 1
+                    if self.on_drop is not None:
+                        self.on_drop()
+                except queue.Empty:
+                    pass
+
+    def _get(self, q):
+        while not self.stop_event.is_set():
+            try:
+                return q.get(timeout=0.1)
+            except queue.Empty:
+                continue
+        return _END
+
+    def _decode(self):
+        try:
+            while not self.stop_event.is_set():
+                frame = self.read_fn()
+                if frame is None:
+                    break
+                if self.latest_only:
+                    self._put_latest(self.decoded, frame)
+                elif not self._put(self.decoded, frame):
+                    break
+        finally:
+            self._put(self.decoded, _END)
+
+    def _infer(self):
+        try:
+            done = False
+            while not done:
+                first = self._get(self.decoded)
+                if first is _END:
+                    break
+                batch = [first]
+                # Top the batch up, waiting at most batch_timeout for the decoder
+                deadline = time.monotonic() + self.batch_timeout
+                while len(batch) < self.batch_size and not self.stop_event.is_set():
+                    try:
+                        item = self.decoded.get(timeout=max(0.0, deadline - time.monotonic()))
+                    except queue.Empty:
+                        break
+                    if item is _END:
+                        done = True
+                        break
+                    batch.append(item)
+
+                results = self.infer_fn(batch)
+                for frame, result in zip(batch, results):
+                    if not self._put(self.inferred, (frame, result)):
+                        return
+        finally:
+            self._put(self.inferred, _END)
+
+    def _sink(self):
+        while True:
+            item = self._get(self.inferred)
+            if item is _END:
+                break
+            frame, result = item
+            self.sink_fn(frame, result)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+
+class ResultCache:
+    """
+    Content-addressed cache of finished video analyses.
+
+    A result is keyed by the uploaded video's SHA-256 plus the analyzer
+    config (weight file hashes, classes, thresholds), so the same clip
+    analysed with the same models is served from the cache, while a model
+    or threshold change misses. Each entry is a small JSON file in
+    <output_dir>/.cache holding the report and the name of its annotated
+    video in output_dir (none for report-only analyses). The entry file's
+    mtime is its last use, so the LRU order survives restarts. When the
+    cached videos and reports together exceed max_bytes, the least recently
+    used entries are deleted along with their videos (and any extra files,
+    e.g. per-frame NPZ detail).
+    """
+
+    def __init__(self, output_dir, max_bytes: int = 2 * 1024 ** 3):
+        self.output_dir = Path(output_dir)
+        self.index_dir = self.output_dir / ".cache"
+        self.index_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.entries = {}   # key -> {"video", "files", "size", "last_used"}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._scan()
+
+    @staticmethod
+    def make_key(video_sha256: str, config: dict) -> str:
+        blob = json.dumps({"video": video_sha256, "config": config}, sort_keys=True)
+        return hashlib.sha256(blob.encode()).hexdigest()
+
+    def get(self, key: str):
+        """Return {"result", "output_filename"} for a cached analysis, or None."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and not all((self.output_dir / name).exists() for name in entry["files"]):
+                self._remove(key)   # files deleted behind our back
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            try:
+                data = json.loads(self._entry_path(key).read_text())
+            except (OSError, ValueError):
+                self._remove(key)
+                self.misses += 1
+                return None
+            entry["last_used"] = time.time()
+            os.utime(self._entry_path(key))
+            self.hits += 1
+            return {"result": data["result"], "output_filename": entry["video"]}
+
+    def put(self, key: str, result: dict, output_path, extra_paths: list = ()):
+        """
+        Record a finished analysis whose annotated video is output_path (None if it has none).
+        extra_paths: other files of the result, evicted with it. All files live in output_dir.
+        """
+        paths = [Path(p) for p in (output_path, *extra_paths) if p is not None]
+        if not all(path.exists() for path in paths):
+            return
+        files = [path.name for path in paths]
+        video = Path(output_path).name if output_path is not None else None
+        entry_path = self._entry_path(key)
+        tmp = entry_path.with_suffix(".tmp")
+        tmp.write_text(json.dumps({"video": video, "files": files, "result": result}))
+        tmp.replace(entry_path)
+        with self.lock:
+            old = self.entries.get(key)
+            if old is not None:
+                for name in set(old["files"]) - set(files):
+                    (self.output_dir / name).unlink(missing_ok=True)
+            self.entries[key] = {"video": video, "files": files, "last_used": time.time(),
+                                 "size": sum(path.stat().st_size for path in paths) + entry_path.stat().st_size}
+            self._evict(keep=key)
+
+    def status(self) -> dict:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": sum(entry["size"] for entry in self.entries.values()),
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+    def _entry_path(self, key: str) -> Path:
+        return self.index_dir / f"{key}.json"
+
+    def _scan(self):
+        for entry_path in self.index_dir.glob("*.json"):
+            try:
+                data = json.loads(entry_path.read_text())
+                video, files = data["video"], data["files"]
+                size = sum((self.output_dir / name).stat().st_size for name in files)
+                size += entry_path.stat().st_size
+            except (OSError, ValueError, KeyError):
+                entry_path.unlink(missing_ok=True)
+                continue
+            self.entries[entry_path.stem] = {"video": video, "files": files, "size": size,
+                                             "last_used": entry_path.stat().st_mtime}
+        with self.lock:
+            self._evict()
+
+    def _evict(self, keep: str = None):
+        total = sum(entry["size"] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["last_used"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self.entries[key]["size"]
+            self._remove(key)
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self.entries.pop(key, None)
+        self._entry_path(key).unlink(missing_ok=True)
+        if entry is not None:
+            for name in entry["files"]:
+                (self.output_dir / name).unlink(missing_ok=True)
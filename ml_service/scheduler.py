@@ -0,0 +1,185 @@
+import collections
+import threading
+import time
+
+import cv2
+
+
+def is_live_source(source) -> bool:
+    """Webcams ("0", "1", ...) and stream URLs deliver frames in real time; files don't."""
+    source = str(source)
+    return source.isdigit() or "://" in source
+
+
+class FrameScheduler:
+    """
+    Picks which frames of a capture get analysed, in place of a fixed sleep.
+
+    Frames between analysis slots are skipped with cap.grab(), which demuxes
+    without decoding, and only the frame handed to the model is decoded with
+    cap.retrieve(). Live sources are grabbed continuously so the decoder
+    buffer never backs up and the analysed frame is always the freshest one.
+    Files are played back in real time against their media timestamps.
+
+    The sampling rate is target_fps normally and active_fps for active_hold
+    seconds after frame_done(active=True), so busy scenes are sampled faster.
+    Both are multiplied by fps_scale, which the overload controller lowers
+    when the service can't keep up (see overload.py).
+    """
+
+    def __init__(self, cap, target_fps: float, active_fps: float = None,
+                 active_hold: float = 3.0, live: bool = True, max_drain: int = 30):
+        self.cap = cap
+        self.target_fps = target_fps
+        self.active_fps = active_fps or target_fps
+        self.active_hold = active_hold
+        self.live = live
+        self.max_drain = max_drain
+        self.fps_scale = 1.0
+
+        source_fps = cap.get(cv2.CAP_PROP_FPS) or 0
+        self.source_fps = source_fps if 0 < source_fps < 1000 else 30.0
+        # A grab that returns faster than this was already sitting in the buffer
+        self.backlog_threshold = 0.25 / self.source_fps
+
+        self.lock = threading.Lock()
+        self.started_at = None
+        self.next_slot = 0.0
+        self.last_activity = float("-inf")
+        self.stamps = collections.OrderedDict()   # id(frame) -> time frame became available
+        self.done_times = collections.deque()
+        self.frames_grabbed = 0
+        self.frames_processed = 0
+        self.lag = 0.0
+
+    # --- pipeline hooks ---
+
+    def read(self):
+        """Block until the next analysis slot and return the freshest frame (None at end)."""
+        now = time.monotonic()
+        if self.started_at is None:
+            self.started_at = now
+            self.next_slot = now
+
+        if self.live:
+            available_at = self._advance_live()
+        else:
+            available_at = self._advance_file()
+        if available_at is None:
+            return None
+
+        success, frame = self.cap.retrieve()
+        if not success:
+            return None
+
+        self._mark_sampled(frame, available_at)
+        return frame
+
+    def read_every(self):
+        """
+        Decode every frame at the source's native rate, e.g. while someone is
+        watching the stream. Returns (frame, due) where due means this frame
+        is also the one to analyse; frame is None at end of stream.
+        """
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+            self.next_slot = self.started_at
+
+        success, frame = self.cap.read()
+        if not success:
+            return None, False
+        self.frames_grabbed += 1
+
+        available_at = time.monotonic()
+        if not self.live:
+            # Play files back in real time
+            due_at = self.started_at + self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+            if due_at > available_at:
+                time.sleep(due_at - available_at)
+            available_at = max(due_at, available_at)
+
+        due = available_at >= self.next_slot
+        if due:
+            self._mark_sampled(frame, available_at)
+        return frame, due
+
+    def _mark_sampled(self, frame, available_at: float):
+        self.next_slot = max(self.next_slot + 1.0 / self.current_fps(), time.monotonic())
+        with self.lock:
+            self.stamps[id(frame)] = available_at
+            while len(self.stamps) > 64:
+                self.stamps.popitem(last=False)
+
+    def frame_done(self, frame, active: bool = False):
+        """Record that analysis of frame finished; active raises the sampling rate."""
+        now = time.monotonic()
+        with self.lock:
+            available_at = self.stamps.pop(id(frame), None)
+            if available_at is not None:
+                self.lag = now - available_at
+            if active:
+                self.last_activity = now
+            self.frames_processed += 1
+            self.done_times.append(now)
+            while self.done_times and now - self.done_times[0] > 5.0:
+                self.done_times.popleft()
+
+    def current_fps(self) -> float:
+        if time.monotonic() - self.last_activity < self.active_hold:
+            return self.active_fps * self.fps_scale
+        return self.target_fps * self.fps_scale
+
+    def metrics(self) -> dict:
+        with self.lock:
+            window = self.done_times[-1] - self.done_times[0] if len(self.done_times) > 1 else 0.0
+            processed_fps = (len(self.done_times) - 1) / window if window > 0 else 0.0
+            return {
+                "lag_seconds": round(self.lag, 3),
+                "processed_fps": round(processed_fps, 2),
+                "sampling_fps": self.current_fps(),
+                "frames_grabbed": self.frames_grabbed,
+                "frames_processed": self.frames_processed,
+                "frames_skipped": max(0, self.frames_grabbed - self.frames_processed),
+            }
+
+    # --- frame selection ---
+
+    def _grab(self) -> bool:
+        if not self.cap.grab():
+            return False
+        self.frames_grabbed += 1
+        return True
+
+    def _advance_live(self):
+        """Grab (without decoding) until the slot, then drain any buffered backlog."""
+        grabbed_at = None
+        while grabbed_at is None or time.monotonic() < self.next_slot:
+            if not self._grab():
+                return None
+            grabbed_at = time.monotonic()
+
+        for _ in range(self.max_drain):
+            start = time.monotonic()
+            if not self._grab():
+                break
+            grabbed_at = time.monotonic()
+            if grabbed_at - start > self.backlog_threshold:
+                break  # had to wait for this one, so it's fresh
+        return grabbed_at
+
+    def _advance_file(self):
+        """Wait for the slot, then skip ahead to the frame matching elapsed wall time."""
+        delay = self.next_slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+        elapsed = time.monotonic() - self.started_at
+        frame_duration = 1.0 / self.source_fps
+        if not self._grab():
+            return None
+        media_time = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        while media_time + frame_duration <= elapsed:
+            if not self._grab():
+                return None
+            media_time = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+        return self.started_at + media_time
@@ -0,0 +1,211 @@
+import multiprocessing
+import os
+import shutil
+import subprocess
+import tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import cv2
+
+from events import FrameHits, aggregate_events
+from metrics import metrics
+from video_output import find_ffmpeg, open_writer, render_event_windows
+
+# Segments shorter than this aren't worth a process of their own
+MIN_SEGMENT_FRAMES = 150
+
+
+def plan_segments(total_frames: int, workers: int, min_frames: int = None) -> list:
+    """
+    Split [0, total_frames) into at most `workers` contiguous (start, end)
+    ranges of at least min_frames (default MIN_SEGMENT_FRAMES) each. The last
+    range ends at None, so it reads to the real end of the file even if the
+    container's frame count is off.
+    """
+    min_frames = min_frames or MIN_SEGMENT_FRAMES
+    count = max(1, min(workers, total_frames // max(1, min_frames)))
+    bounds = [total_frames * i // count for i in range(count)] + [None]
+    return list(zip(bounds[:-1], bounds[1:]))
+
+
+# --- worker process side ---
+
+_segment_analyzer = None
+
+
+def _init_segment_worker(threads: int):
+    metrics.reset()
+    # Split the cores between segment workers instead of every one using all of them
+    cv2.setNumThreads(threads)
+    try:
+        import torch
+        torch.set_num_threads(threads)
+    except ImportError:
+        pass
+
+
+def _analyze_segment(video_path: str, part_path: str, start: int, end: int, batch_size: int = None,
+                     output_mode: str = "annotated", codec: str = "mp4v", cancel_path: str = None) -> dict:
+    global _segment_analyzer
+    if _segment_analyzer is None:
+        from video_analyzer import VideoAnalyzer
+        _segment_analyzer = VideoAnalyzer()
+
+    def check_cancelled(frames_processed, total_frames):
+        if cancel_path is not None and os.path.exists(cancel_path):
+            from jobs import JobCancelled
+            raise JobCancelled(cancel_path)
+
+    # Raw per-frame hits come back so events spanning a segment boundary can be merged.
+    # For "events" the parent renders the whole file once the events are known.
+    if output_mode == "events":
+        result = _segment_analyzer.analyze_video(video_path, part_path, batch_size=batch_size,
+                                                 start_frame=start, end_frame=end, return_hits=True,
+                                                 output_mode="report", return_overlays=True,
+                                                 progress_callback=check_cancelled)
+    else:
+        result = _segment_analyzer.analyze_video(video_path, part_path, batch_size=batch_size,
+                                                 start_frame=start, end_frame=end, return_hits=True,
+                                                 output_mode=output_mode, codec=codec,
+                                                 progress_callback=check_cancelled)
+    # The segment's stage timings and frame counts, for the parent to add to its own
+    result['metrics'] = metrics.snapshot(reset=True)
+    return result
+
+
+# --- stitching ---
+
+def stitch_videos(part_paths: list, output_path: str, fps: float, size: tuple, codec: str = "mp4v") -> str:
+    """
+    Join segment videos, in order, into output_path. Uses ffmpeg's concat
+    demuxer (no re-encode) when ffmpeg is installed, otherwise re-encodes
+    through OpenCV. Returns the method used.
+    """
+    ffmpeg = find_ffmpeg()
+    if ffmpeg:
+        list_path = Path(part_paths[0]).with_name("parts.txt")
+        list_path.write_text("".join(f"file '{Path(p).resolve()}'\n" for p in part_paths))
+        result = subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0",
+                                 "-i", str(list_path), "-c", "copy", str(output_path)],
+                                capture_output=True)
+        if result.returncode == 0:
+            return "ffmpeg"
+        print(f"ffmpeg concat failed, re-encoding instead: {result.stderr.decode(errors='ignore')}")
+
+    out = open_writer(output_path, fps, size, codec)
+    try:
+        for part in part_paths:
+            cap = cv2.VideoCapture(str(part))
+            while True:
+                success, frame = cap.read()
+                if not success:
+                    break
+                out.write(frame)
+            cap.release()
+    finally:
+        out.release()
+    return "opencv"
+
+
+def analyze_video_parallel(video_path: str, output_path: str, workers: int = None,
+                           batch_size: int = None, progress_callback=None, analyzer=None,
+                           frame_detail_path: str = None, output_mode: str = "annotated",
+                           codec: str = "mp4v", cancel_path: str = None) -> dict:
+    """
+    Analyze a file as time segments in parallel worker processes.
+
+    Each worker seeks to its segment (CAP_PROP_POS_FRAMES), analyzes it into
+    a part file, and reports detections with frame numbers and timestamps
+    relative to the whole file. Parts are stitched in order into
+    output_path, so the report and video match a serial analyze_video run.
+    Falls back to a serial run (on `analyzer`) when the file is too short
+    to split.
+
+    progress_callback(frames_processed, total_frames) is called as each
+    segment finishes. frame_detail_path, output_mode, codec: see
+    VideoAnalyzer.analyze_video; in "events" mode the segments only report,
+    and the event windows are rendered over the whole file afterwards.
+    cancel_path: every segment stops (raising jobs.JobCancelled) at its next
+    frame once this file exists.
+    """
+    workers = workers or os.cpu_count() or 1
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise ValueError("Could not open video file")
+    fps = int(cap.get(cv2.CAP_PROP_FPS))
+    size = (int(cap.get(cv2.CAP_PROP_FRAME_WIDTH)), int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT)))
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+
+    segments = plan_segments(total_frames, workers)
+    if len(segments) == 1:
+        if analyzer is None:
+            from video_analyzer import VideoAnalyzer
+            analyzer = VideoAnalyzer()
+        result = analyzer.analyze_video(video_path, output_path, batch_size=batch_size,
+                                        progress_callback=progress_callback,
+                                        frame_detail_path=frame_detail_path,
+                                        output_mode=output_mode, codec=codec)
+        result['segments'] = 1
+        return result
+
+    parts_dir = Path(tempfile.mkdtemp(prefix="segments_", dir=Path(output_path).parent))
+    part_paths = [str(parts_dir / f"part{i:03d}.mp4") for i in range(len(segments))]
+    threads = max(1, (os.cpu_count() or 1) // len(segments))
+    context = multiprocessing.get_context(
+        "fork" if "fork" in multiprocessing.get_all_start_methods() else "spawn")
+
+    try:
+        results = [None] * len(segments)
+        frames_done = 0
+        with ProcessPoolExecutor(max_workers=len(segments), mp_context=context,
+                                 initializer=_init_segment_worker, initargs=(threads,)) as pool:
+            futures = {
+                pool.submit(_analyze_segment, video_path, part, start, end, batch_size,
+                            output_mode, codec, cancel_path): i
+                for i, (part, (start, end)) in enumerate(zip(part_paths, segments))
+            }
+            try:
+                for future in as_completed(futures):
+                    results[futures[future]] = future.result()
+                    metrics.merge(results[futures[future]].pop('metrics', {}))
+                    frames_done += results[futures[future]]['frames_analyzed']
+                    if progress_callback is not None:
+                        progress_callback(frames_done, total_frames)
+            except BaseException:
+                # Drop segments that haven't started; running ones stop at the cancel flag
+                pool.shutdown(wait=False, cancel_futures=True)
+                raise
+
+        if output_mode == "annotated":
+            stitch_videos(part_paths, output_path, fps, size, codec)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
+
+    hits = FrameHits()
+    for r in results:
+        hits.extend(r['hits'])
+    frames_analyzed = sum(r['frames_analyzed'] for r in results)
+    detections = aggregate_events(hits, fps)
+    if output_mode == "events":
+        overlays = {}
+        for r in results:
+            overlays.update(r['overlays'])
+        from video_analyzer import VideoAnalyzer
+        render = render_event_windows(video_path, output_path, detections, overlays, VideoAnalyzer.draw_overlays,
+                                      size, frames_analyzed, codec)
+    report = {
+        'total_frames': total_frames,
+        'frames_analyzed': frames_analyzed,
+        'detections': detections,
+        'frame_hits': len(hits),
+        'output_video': None if output_mode == "report" else output_path,
+        'segments': len(segments),
+    }
+    if output_mode == "events":
+        report['render'] = render
+    if frame_detail_path:
+        hits.save(frame_detail_path, fps)
+        report['frame_detail'] = frame_detail_path
+    return report
@@ -0,0 +1,418 @@
+import threading
+import time
+
+import cv2
+
+from broadcaster import FrameBroadcaster
+from frame_gate import FrameGate
+from keyframe_tracker import KeyframeTracker
+from metrics import (DETECTOR_PAUSED, FRAMES_STREAMED, INFERENCE_IMGSZ, OVERLOAD_DECISIONS, QUALITY_LEVEL,
+                     QUEUE_DEPTH, SAMPLING_FPS_SCALE, StageMetrics)
+from pipeline import open_capture
+from scheduler import FrameScheduler, is_live_source
+
+
+class CameraStream:
+    """
+    One camera: a capture thread that samples frames with a FrameScheduler
+    and parks the newest one in a single-frame slot for the inference pool.
+    A frame still waiting in the slot when a newer one arrives is dropped.
+
+    Viewers subscribe to `broadcaster`; each frame is JPEG-encoded once, and
+    only while someone is watching. While watched, every frame is decoded at
+    the source's native rate and carries the overlay of the most recent
+    inference, so the stream stays smooth however slowly the detector samples.
+
+    Sampled frames pass through `gate` (see frame_gate.FrameGate) first: a
+    frame without motion is not offered at all, and the model only sees the
+    camera's regions of interest.
+
+    With detect-then-track on (detector.tracker, see keyframe_tracker.py),
+    only keyframes reach the model; the pool carries boxes through the rest.
+
+    set_quality() is the overload controller's handle on the camera (see
+    overload.py): model input size, sampling rate, and pausing analysis.
+
+    Stage latencies and frame counters go to `metrics` (see metrics.StageMetrics).
+    """
+
+    jpeg_quality = 80
+
+    def __init__(self, camera_id: str, source: str, detector_type: str, detector, pool, gate=None):
+        self.camera_id = camera_id
+        self.source = source
+        self.detector_type = detector_type
+        self.detector = detector
+        self.pool = pool
+        self.gate = gate or FrameGate()
+
+        self.cap = None
+        self.scheduler = None
+        self.stop_event = threading.Event()
+        self.thread = None
+        self.started_at = None
+        self.error = None
+
+        self.lock = threading.Lock()
+        self.pending = None         # newest frame not yet taken for inference
+        self.pending_since = 0.0    # when the slot last went from empty to full
+        self.in_flight = False      # a frame of this camera is being inferred
+        self.frames_dropped = 0
+        self.latest_detections = []
+
+        # Set by the overload controller through set_quality()
+        self.quality_level = 0
+        self.paused = False
+
+        self.broadcaster = FrameBroadcaster()
+        self.metrics = StageMetrics(camera_id, type(detector).__name__)
+
+    def start(self):
+        self.cap = open_capture(self.source)
+        if not self.cap.isOpened():
+            self.cap.release()
+            raise ValueError(f"Could not open video source: {self.source}")
+        self.scheduler = FrameScheduler(self.cap, self.detector.target_fps, self.detector.active_fps,
+                                        live=is_live_source(self.source))
+        self.started_at = time.time()
+        self.thread = threading.Thread(target=self._capture_loop, name=f"capture-{self.camera_id}", daemon=True)
+        self.thread.start()
+
+    def stop(self, timeout: float = 5.0):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout)
+        self.broadcaster.close()
+        self.metrics.remove()
+        FRAMES_STREAMED.remove(self.camera_id)
+        for metric in (QUALITY_LEVEL, INFERENCE_IMGSZ, SAMPLING_FPS_SCALE, DETECTOR_PAUSED, OVERLOAD_DECISIONS):
+            metric.remove_matching(camera=self.camera_id)
+
+    @property
+    def is_running(self) -> bool:
+        return self.thread is not None and self.thread.is_alive()
+
+    def _capture_loop(self):
+        try:
+            while not self.stop_event.is_set():
+                watched = self.broadcaster.has_subscribers
+                began = time.perf_counter()
+                if watched:
+                    frame, due = self.scheduler.read_every()
+                else:
+                    frame, due = self.scheduler.read(), True
+                if frame is None:
+                    break
+                self.metrics.decode.observe(time.perf_counter() - began)
+                self.metrics.frames_read.inc()
+
+                offered = due and not self.paused and self._check_gate(frame)
+                if offered:
+                    self._offer(frame)
+                if watched:
+                    # The offered frame belongs to the inference pool now, so draw on a copy
+                    self._publish(frame.copy() if offered else frame)
+        except Exception as e:
+            self.error = str(e)
+            print(f"Camera {self.camera_id} capture error: {e}")
+        finally:
+            self.cap.release()
+            self.broadcaster.close()
+
+    def set_quality(self, level: int, imgsz=None, fps_scale: float = 1.0, paused: bool = False):
+        """Apply an overload step: model input size (None = model default), sampling rate factor, pause."""
+        self.quality_level = level
+        self.detector.imgsz = imgsz
+        if self.scheduler is not None:
+            self.scheduler.fps_scale = fps_scale
+        self.paused = paused
+        if paused:
+            # Don't leave stale boxes on the stream
+            self.latest_detections = []
+        detector = type(self.detector).__name__
+        QUALITY_LEVEL.labels(self.camera_id, detector).set(level)
+        INFERENCE_IMGSZ.labels(self.camera_id, detector).set(imgsz or 0)
+        SAMPLING_FPS_SCALE.labels(self.camera_id, detector).set(fps_scale)
+        DETECTOR_PAUSED.labels(self.camera_id, detector).set(int(paused))
+
+    def _check_gate(self, frame) -> bool:
+        began = time.perf_counter()
+        passed = self.gate.check(frame)
+        self.metrics.gate.observe(time.perf_counter() - began)
+        if not passed:
+            self.metrics.frames_gated.inc()
+        return passed
+
+    def _offer(self, frame):
+        with self.lock:
+            if self.pending is not None:
+                self.frames_dropped += 1
+                self.metrics.frames_dropped.inc()
+            else:
+                self.pending_since = time.monotonic()
+            self.pending = frame
+        self.pool.notify()
+
+    def _publish(self, frame):
+        if not self.broadcaster.has_subscribers:
+            return
+        began = time.perf_counter()
+        self.detector.draw_overlay(frame, self.latest_detections)
+        drawn = time.perf_counter()
+        ret, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, self.jpeg_quality])
+        self.metrics.draw.observe(drawn - began)
+        self.metrics.encode.observe(time.perf_counter() - drawn)
+        if ret:
+            self.broadcaster.publish(buffer.tobytes())
+
+    # --- called by the inference pool ---
+
+    def take_frame(self):
+        """Hand the pending frame to the pool, unless one is already in flight."""
+        with self.lock:
+            if self.in_flight or self.pending is None:
+                return None
+            frame, self.pending = self.pending, None
+            self.in_flight = True
+            return frame
+
+    def has_work(self) -> bool:
+        return self.pending is not None and not self.in_flight
+
+    def finish(self, frame, result):
+        try:
+            if result is not None:
+                # One inference result drives both alerting and the overlay
+                began = time.perf_counter()
+                outcome = self.detector.finish_frame(frame, result, draw=False)
+                self.metrics.annotate.observe(time.perf_counter() - began)
+                self.latest_detections = outcome["detections"]
+                self.scheduler.frame_done(frame, active=outcome["active"])
+        finally:
+            with self.lock:
+                self.in_flight = False
+            self.pool.notify()
+
+    def status(self) -> dict:
+        metrics = self.scheduler.metrics() if self.scheduler else {}
+        metrics["frames_dropped"] = self.frames_dropped
+        metrics["gate"] = self.gate.stats()
+        if self.detector.tracker is not None:
+            metrics["tracker"] = self.detector.tracker.stats()
+        return {
+            "camera_id": self.camera_id,
+            "source": self.source,
+            "type": self.detector_type,
+            "running": self.is_running,
+            "started_at": self.started_at,
+            "error": self.error,
+            "viewers": self.broadcaster.subscriber_count,
+            "detections": len(self.latest_detections),
+            "quality": {
+                "level": self.quality_level,
+                "imgsz": self.detector.imgsz,
+                "fps_scale": self.scheduler.fps_scale if self.scheduler else 1.0,
+                "paused": self.paused,
+            },
+            "metrics": metrics,
+        }
+
+
+class InferencePool:
+    """
+    A bounded set of inference workers shared by every camera.
+
+    A worker takes the pending frames of all cameras whose detectors can share
+    a model call (same batch_key) and runs them as one batch, so adding
+    cameras adds batch entries rather than separate model invocations.
+    The camera that has waited longest goes first, so none is starved when
+    there is more work than workers.
+    Frames a camera's tracker can carry boxes to skip the model call.
+    """
+
+    def __init__(self, cameras: dict, workers: int = 2, max_batch: int = 8):
+        self.cameras = cameras
+        self.max_batch = max_batch
+        self.cond = threading.Condition()
+        self.stop_event = threading.Event()
+        self.batches = 0
+        self.frames = 0
+        self.tracked = 0
+        self.threads = [
+            threading.Thread(target=self._worker, name=f"inference-{i}", daemon=True)
+            for i in range(workers)
+        ]
+        for t in self.threads:
+            t.start()
+
+    def notify(self):
+        with self.cond:
+            self.cond.notify()
+
+    def shutdown(self):
+        self.stop_event.set()
+        with self.cond:
+            self.cond.notify_all()
+        for t in self.threads:
+            t.join(5.0)
+
+    def _next_batch(self):
+        """Pick a batch key with ready frames and claim up to max_batch of them."""
+        ready = sorted((cam for cam in list(self.cameras.values()) if cam.has_work()),
+                       key=lambda cam: cam.pending_since)
+        if not ready:
+            return None
+        key = ready[0].detector.batch_key()
+        batch = []
+        for cam in ready:
+            if len(batch) >= self.max_batch:
+                break
+            if cam.detector.batch_key() != key:
+                continue
+            frame = cam.take_frame()
+            if frame is not None:
+                batch.append((cam, frame))
+        return batch or None
+
+    def _worker(self):
+        while not self.stop_event.is_set():
+            with self.cond:
+                batch = self._next_batch()
+                while batch is None and not self.stop_event.is_set():
+                    self.cond.wait(0.5)
+                    batch = self._next_batch()
+            if batch is None:
+                break
+
+            cams = [cam for cam, _ in batch]
+            frames = [frame for _, frame in batch]
+            results = [None] * len(batch)
+            for i, (cam, frame) in enumerate(batch):
+                if cam.detector.tracker is None:
+                    continue
+                began = time.perf_counter()
+                try:
+                    results[i] = cam.detector.tracker.track(frame)
+                except Exception as e:
+                    print(f"Tracking error ({cam.camera_id}): {e}")
+                cam.metrics.track.observe(time.perf_counter() - began)
+                if results[i] is not None:
+                    cam.metrics.frames_tracked.inc()
+                    self.tracked += 1
+
+            todo = [i for i, result in enumerate(results) if result is None]
+            if todo:
+                self._detect([cams[i] for i in todo], [frames[i] for i in todo], results, todo)
+
+            for cam, frame, result in zip(cams, frames, results):
+                try:
+                    cam.finish(frame, result)
+                except Exception as e:
+                    print(f"Camera {cam.camera_id} result handling error: {e}")
+
+    def _detect(self, cams, frames, results, slots):
+        """Run the model on frames as one batch, storing each result at its slot in results."""
+        began = time.perf_counter()
+        try:
+            # Each camera's model input is its region of interest
+            crops = [cam.gate.crop(frame) for cam, frame in zip(cams, frames)]
+            # Cameras in a batch share a batch_key, so any of their detectors can run it
+            detected = cams[0].detector.infer([image for image, _ in crops])
+            for slot, cam, frame, result, (_, offset) in zip(slots, cams, frames, detected, crops):
+                result = FrameGate.restore(result, offset, frame.shape)
+                if cam.detector.tracker is not None:
+                    result = cam.detector.tracker.update(frame, result)
+                results[slot] = result
+        except Exception as e:
+            print(f"Inference error ({cams[0].detector_type}): {e}")
+        self.batches += 1
+        self.frames += len(frames)
+        # Every frame of the batch waited for the whole model call
+        seconds = time.perf_counter() - began
+        for cam, slot in zip(cams, slots):
+            cam.metrics.infer.observe(seconds)
+            if results[slot] is not None:
+                cam.metrics.frames_inferred.inc()
+
+
+class StreamManager:
+    """Runs many camera streams at once, keyed by camera_id."""
+
+    def __init__(self, detector_factories: dict, workers: int = 2, max_batch: int = 8):
+        self.detector_factories = detector_factories
+        self.cameras = {}
+        self.lock = threading.Lock()
+        self.pool = InferencePool(self.cameras, workers=workers, max_batch=max_batch)
+
+    def start(self, camera_id: str, source: str, detector_type: str, roi=None,
+              motion_gate: bool = True, keyframe_interval: int = 1) -> dict:
+        """
+        roi: polygons of points as fractions of the frame size (see frame_gate.parse_roi).
+        motion_gate: skip inference on frames without motion.
+        keyframe_interval: run the model on every n-th analysed frame and track
+        boxes in between (1 = model on every frame).
+        """
+        if keyframe_interval < 1:
+            raise ValueError("keyframe_interval must be at least 1")
+        if detector_type not in self.detector_factories:
+            raise ValueError(f"Unknown detector type: {detector_type}")
+        with self.lock:
+            existing = self.cameras.pop(camera_id, None)
+        if existing is not None:
+            existing.stop()
+
+        detector = self.detector_factories[detector_type]()
+        detector.camera_id = camera_id
+        if keyframe_interval > 1:
+            detector.tracker = KeyframeTracker(interval=keyframe_interval)
+        gate = FrameGate(roi=roi, motion=motion_gate)
+        camera = CameraStream(camera_id, source, detector_type, detector, self.pool, gate)
+        camera.start()
+        with self.lock:
+            self.cameras[camera_id] = camera
+        return camera.status()
+
+    def stop(self, camera_id: str) -> bool:
+        with self.lock:
+            camera = self.cameras.pop(camera_id, None)
+        if camera is None:
+            return False
+        camera.stop()
+        return True
+
+    def get(self, camera_id: str):
+        return self.cameras.get(camera_id)
+
+    def set_roi(self, camera_id: str, roi) -> bool:
+        """Change a running camera's regions of interest (None for the whole frame)."""
+        camera = self.get(camera_id)
+        if camera is None:
+            return False
+        camera.gate.set_roi(roi)
+        return True
+
+    def collect_metrics(self):
+        """Queue depths for /metrics: each camera's frame slot, and cameras waiting for the pool."""
+        cameras = list(self.cameras.values())
+        for queue in ("pending", "in_flight", "ready_cameras"):
+            QUEUE_DEPTH.remove_matching(queue=queue)
+        for cam in cameras:
+            detector = type(cam.detector).__name__
+            QUEUE_DEPTH.labels(cam.camera_id, detector, "pending").set(int(cam.pending is not None))
+            QUEUE_DEPTH.labels(cam.camera_id, detector, "in_flight").set(int(cam.in_flight))
+        QUEUE_DEPTH.labels("", "", "ready_cameras").set(sum(1 for cam in cameras if cam.has_work()))
+
+    def status(self, camera_id: str = None):
+        if camera_id is not None:
+            camera = self.get(camera_id)
+            return camera.status() if camera else None
+        return {
+            "cameras": [cam.status() for cam in list(self.cameras.values())],
+            "inference": {"batches": self.pool.batches, "frames": self.pool.frames,
+                          "tracked": self.pool.tracked},
+        }
+
+    def shutdown(self):
+        for camera_id in list(self.cameras):
+            self.stop(camera_id)
+        self.pool.shutdown()
@@ -0,0 +1,7 @@
+import sys
+from pathlib import Path
+
+# Tests import the service's modules the way main.py does, from ml_service/
+ML_SERVICE_DIR = Path(__file__).resolve().parent.parent
+if str(ML_SERVICE_DIR) not in sys.path:
+    sys.path.insert(0, str(ML_SERVICE_DIR))
@@ -0,0 +1,130 @@
+import json
+import socket
+import time
+
+import pytest
+
+from alerts import AlertDispatcher, AlertSpool
+from benchmarks.stub_backend import start_stub_backend
+
+
+def alert(camera_id, confidence=0.9):
+    return {"type": "Violence", "camera_id": camera_id, "confidence": confidence}
+
+
+@pytest.fixture
+def backend():
+    servers = []
+
+    def start(**kwargs):
+        server, url, state = start_stub_backend(**kwargs)
+        servers.append(server)
+        return url, state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+def wait_for(condition, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def dispatcher(url, tmp_path, **kwargs):
+    return AlertDispatcher(url, flush_interval=0.1, backoff_base=0.05, backoff_max=0.2,
+                           spool_path=str(tmp_path / "alerts.jsonl"), **kwargs)
+
+
+def test_alerts_are_delivered_in_batches(backend, tmp_path):
+    url, state = backend()
+    d = dispatcher(url, tmp_path)
+    for i in range(5):
+        d.send(alert(f"cam-{i}"))
+    wait_for(lambda: len(state.incidents) == 5)
+    d.close()
+    assert [incident["camera_id"] for incident in state.incidents] == [f"cam-{i}" for i in range(5)]
+    assert all(incident["dedup_key"] and incident["occurrences"] == 1 for incident in state.incidents)
+    assert state.requests < 5
+    assert d.status()["sent"] == 5 and d.spool.count == 0
+
+
+def test_repeats_are_folded(backend, tmp_path):
+    url, state = backend()
+    d = dispatcher(url, tmp_path)
+    for confidence in (0.6, 0.8, 0.7):
+        d.send(alert("cam", confidence))
+    d.close()
+    wait_for(lambda: len(state.incidents) == 2)
+    first, update = state.incidents
+    assert first["dedup_key"] == update["dedup_key"]
+    assert update["occurrences"] == 3 and update["confidence"] == 0.8
+
+
+def test_failed_posts_are_retried(backend, tmp_path):
+    url, state = backend(fail_requests=2)
+    d = dispatcher(url, tmp_path)
+    d.send(alert("cam"))
+    wait_for(lambda: len(state.incidents) == 1)
+    d.close()
+    assert state.requests == 3
+    assert d.status()["failed"] == 2 and d.status()["sent"] == 1
+    assert d.spool.count == 0
+
+
+def test_spooled_alerts_are_replayed_first(backend, tmp_path):
+    # Left on disk by a run that couldn't reach the backend
+    AlertSpool(tmp_path / "alerts.jsonl").append([alert("old-1"), alert("old-2")])
+    url, state = backend()
+    d = dispatcher(url, tmp_path)
+    assert d.spool.count == 2
+    d.send(alert("new"))
+    wait_for(lambda: len(state.incidents) == 3)
+    d.close()
+    assert [incident["camera_id"] for incident in state.incidents] == ["old-1", "old-2", "new"]
+    assert d.spool.count == 0
+
+
+def test_undeliverable_alerts_are_spooled_on_close(tmp_path):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]   # nothing listens here once closed
+    d = dispatcher(f"http://127.0.0.1:{port}/api/incidents", tmp_path, timeout=(0.5, 0.5))
+    d.send(alert("cam"))
+    d.close()
+    spool = AlertSpool(tmp_path / "alerts.jsonl")
+    assert spool.count == 1
+    assert spool.peek(1)[0]["camera_id"] == "cam"
+
+
+def test_spool_drains_in_order_and_survives_restart(tmp_path):
+    path = tmp_path / "alerts.jsonl"
+    spool = AlertSpool(path)
+    spool.append([alert(f"cam-{i}") for i in range(50)])
+    batch = spool.peek(20)
+    assert [a["camera_id"] for a in batch] == [f"cam-{i}" for i in range(20)]
+    spool.remove(len(batch))
+
+    # Delivered alerts aren't read again after a restart
+    spool = AlertSpool(path)
+    assert spool.count == 30
+    assert spool.peek(1)[0]["camera_id"] == "cam-20"
+    while spool.count:
+        spool.remove(len(spool.peek(20)))
+    assert not path.exists()
+    assert AlertSpool(path).count == 0
+
+
+def test_spool_discards_oldest_and_compacts(tmp_path, monkeypatch):
+    monkeypatch.setattr(AlertSpool, "COMPACT_BYTES", 1000)
+    path = tmp_path / "alerts.jsonl"
+    spool = AlertSpool(path, max_alerts=10)
+    spool.append([alert(f"cam-{i}") for i in range(100)])
+    assert spool.count == 10 and spool.discarded == 90
+    assert [a["camera_id"] for a in spool.peek(10)] == [f"cam-{i}" for i in range(90, 100)]
+    # The skipped part was dropped from the file
+    assert path.stat().st_size < 20 * len(json.dumps(alert("cam-99")))
+    assert AlertSpool(path).count == 10
@@ -0,0 +1,24 @@
+import numpy as np
+import pytest
+
+from detectors.audio import AudioDetector
+
+
+def detector():
+    d = AudioDetector()
+    d.class_names = ["Speech", "Gunshot, gunfire", "Music"]
+    d.target_mask = np.array([False, True, False])
+    alerts = []
+    d.send_alert = lambda label, confidence: alerts.append(label)
+    return d, alerts
+
+
+def test_alerts_only_when_a_target_class_is_the_top_sound():
+    d, alerts = detector()
+    d.handle_window(0.0, np.array([[0.6, 0.4, 0.0]]))   # speech over a gunshot
+    d.handle_window(1.0, np.array([[0.1, 0.2, 0.0]]))   # gunshot, below the threshold
+    assert alerts == []
+    d.handle_window(2.0, np.array([[0.1, 0.5, 0.0], [0.1, 0.7, 0.0]]))
+    assert alerts == ["Gunshot, gunfire"]
+    assert [(e["label"], e["time"]) for e in d.events] == [("Gunshot, gunfire", 2.0)]
+    assert d.events[0]["confidence"] == pytest.approx(0.6)
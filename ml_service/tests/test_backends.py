@@ -0,0 +1,54 @@
+import importlib.util
+
+import numpy as np
+import pytest
+import torch
+from ultralytics import YOLO
+
+from model_registry import ModelRegistry
+
+# (backend, package it needs, largest box coordinate difference in pixels from torch)
+BACKENDS = [("onnx", "onnxruntime", 0.01), ("onnx-int8", "onnxruntime", 1.0), ("openvino", "openvino", 0.01)]
+
+
+@pytest.fixture(scope="module")
+def weights(tmp_path_factory):
+    """Untrained YOLOv8n weights, so the test runs offline."""
+    torch.manual_seed(0)
+    path = tmp_path_factory.mktemp("weights") / "parity.pt"
+    YOLO("yolov8n.yaml").save(str(path))
+    return str(path)
+
+
+@pytest.fixture(scope="module")
+def frame():
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 60, (480, 640, 3), dtype=np.uint8)
+    frame[100:300, 200:320] = rng.integers(100, 255, (200, 120, 3), dtype=np.uint8)
+    return frame
+
+
+def raw_output(registry, weights, frame, x=None):
+    """The network's output before NMS (boxes and class scores), and the input it was given."""
+    handle = registry.get_model(weights)
+    handle(frame, verbose=False)    # sets up the handle's predictor
+    if x is None:
+        x = handle.predictor.preprocess([frame])
+    y = handle.predictor.model(x)
+    y = y[0] if isinstance(y, (list, tuple)) else y
+    return np.asarray(y.detach().cpu() if hasattr(y, "detach") else y), x
+
+
+@pytest.mark.parametrize("backend,package,box_tolerance", BACKENDS)
+def test_backend_matches_torch(backend, package, box_tolerance, weights, frame, tmp_path_factory):
+    if importlib.util.find_spec(package) is None:
+        pytest.skip(f"{package} not installed")
+    export_dir = tmp_path_factory.mktemp("exports")
+    expected, x = raw_output(ModelRegistry(backend="torch", export_dir=export_dir), weights, frame)
+
+    registry = ModelRegistry(backend=backend, export_dir=export_dir)
+    output, _ = raw_output(registry, weights, frame, x)
+    assert registry.backend_of(weights) == backend     # not a fallback to torch
+    assert output.shape == expected.shape
+    np.testing.assert_allclose(output[:, :4], expected[:, :4], atol=box_tolerance, rtol=0)
+    np.testing.assert_allclose(output[:, 4:], expected[:, 4:], atol=1e-3, rtol=0)
@@ -0,0 +1,83 @@
+import pytest
+
+from events import EventAggregator, FrameHits, aggregate_events
+
+
+def test_hits_within_max_gap_merge_into_one_event():
+    aggregator = EventAggregator(fps=10, max_gap=2)
+    for frame in (0, 1, 4, 8):
+        aggregator.add(frame, "Weapon", 0.8, "knife")
+    aggregator.add(2, "Crowd", 0.6, "crowd")
+    events = aggregator.finish()
+
+    assert [(e["type"], e["start_frame"], e["end_frame"], e["frames"]) for e in events] == [
+        ("Weapon", 0, 4, 3), ("Crowd", 2, 2, 1), ("Weapon", 8, 8, 1)]
+    assert events[0]["start_time"] == "0.00s" and events[0]["end_time"] == "0.40s"
+
+
+def test_default_max_gap_is_half_a_second():
+    assert EventAggregator(fps=30).max_gap == 15
+    assert EventAggregator(fps=0).max_gap == 1
+
+
+def test_keyframe_is_peak_confidence_frame():
+    aggregator = EventAggregator(fps=10, max_gap=2)
+    aggregator.add(1, "Weapon", 0.5, "weak")
+    aggregator.add(3, "Weapon", 0.6, "second")
+    aggregator.add(3, "Weapon", 0.9, "strong")
+    aggregator.add(3, "Weapon", 0.7, "ignored")
+    aggregator.add(4, "Weapon", 0.4, "tail")
+    [event] = aggregator.finish()
+
+    assert event["frame"] == event["keyframe"] == 3
+    assert event["timestamp"] == "0.30s"
+    assert event["confidence"] == event["peak_confidence"] == 0.9
+    assert event["description"] == "strong (0.10s - 0.40s)"
+    # Frame 3 counts once, with its strongest hit
+    assert event["frames"] == 3
+    assert event["mean_confidence"] == pytest.approx((0.5 + 0.9 + 0.4) / 3, abs=1e-4)
+
+
+def test_close_idle_closes_only_events_past_the_gap():
+    aggregator = EventAggregator(fps=10, max_gap=2)
+    aggregator.add(0, "Weapon", 0.8, "knife")
+    aggregator.add(2, "Crowd", 0.6, "crowd")
+
+    aggregator.close_idle(3)
+    assert aggregator.events == [] and set(aggregator.open) == {"Weapon", "Crowd"}
+    aggregator.close_idle(4)
+    assert [e["type"] for e in aggregator.events] == ["Weapon"] and set(aggregator.open) == {"Crowd"}
+
+    # A later hit of a closed type starts a new event
+    aggregator.add(5, "Weapon", 0.7, "knife")
+    assert [(e["type"], e["start_frame"]) for e in aggregator.finish()] == [
+        ("Weapon", 0), ("Crowd", 2), ("Weapon", 5)]
+
+
+def test_aggregate_events_matches_incremental():
+    hits = FrameHits()
+    aggregator = EventAggregator(fps=25)
+    for frame in range(0, 200, 7):
+        hits.add(frame, "Weapon", 0.5 + (frame % 5) / 10, f"hit {frame}")
+        aggregator.add(frame, "Weapon", 0.5 + (frame % 5) / 10, f"hit {frame}")
+        aggregator.close_idle(frame)
+    assert aggregate_events(hits, fps=25) == aggregator.finish()
+
+
+def test_frame_hits_npz_round_trip(tmp_path):
+    hits = FrameHits()
+    hits.add(3, "Weapon", 0.75, "knife")
+    hits.add(3, "Crowd", 0.5, "12 people")
+    more = FrameHits()
+    more.add(1200, "Weapon", 0.25, "bat")
+    hits.extend(more)
+
+    path = tmp_path / "hits.npz"
+    hits.save(path, fps=29.97)
+    loaded, fps = FrameHits.load(path)
+    assert list(loaded.rows()) == list(hits.rows())
+    assert fps == pytest.approx(29.97)
+
+    FrameHits().save(path, fps=30)
+    empty, _ = FrameHits.load(path)
+    assert len(empty) == 0
@@ -0,0 +1,81 @@
+import numpy as np
+import torch
+from ultralytics.engine.results import Results
+
+from frame_gate import FrameGate
+from keyframe_tracker import KeyframeTracker
+
+
+def person(x1, y1, x2, y2):
+    return [x1, y1, x2, y2, 0.9, 0]
+
+
+def textured_frame(offset=0):
+    rng = np.random.default_rng(0)
+    frame = rng.integers(0, 60, (480, 640, 3), dtype=np.uint8)
+    frame[100:220, 40 + offset:100 + offset] = rng.integers(100, 255, (120, 60, 3), dtype=np.uint8)
+    return frame
+
+
+def test_restore_roi_at_origin_gets_full_frame_shape():
+    gate = FrameGate(roi=[[[0, 0], [0.5, 0], [0.5, 1], [0, 1]]], motion=False)
+    frame = textured_frame()
+    crop, offset = gate.crop(frame)
+    assert offset == (0, 0) and crop.shape[:2] != frame.shape[:2]
+
+    result = Results(orig_img=crop, path="", names={0: "person"},
+                     boxes=torch.tensor([person(40, 100, 100, 220)]))
+    restored = FrameGate.restore(result, offset, frame.shape)
+    assert tuple(restored.orig_shape) == (480, 640)
+    assert restored.boxes.xyxy.tolist() == [[40, 100, 100, 220]]
+
+
+def test_restore_shifts_boxes_by_offset():
+    result = Results(orig_img=np.zeros((100, 100, 3), np.uint8), path="", names={0: "person"},
+                     boxes=torch.tensor([person(10, 10, 20, 20)]))
+    restored = FrameGate.restore(result, (50, 30), (480, 640, 3))
+    assert tuple(restored.orig_shape) == (480, 640)
+    assert restored.boxes.xyxy.tolist() == [[60, 40, 70, 50]]
+
+
+def test_tracker_tracks_behind_roi_at_origin():
+    gate = FrameGate(roi=[[[0, 0], [0.5, 0], [0.5, 1], [0, 1]]], motion=False)
+    tracker = KeyframeTracker(interval=5)
+
+    def detect(frames):
+        return [Results(orig_img=crop, path="", names={0: "person"},
+                        boxes=torch.tensor([person(40, 100, 100, 220)]))
+                for crop in frames]
+
+    tracked = 0
+    for i in range(10):
+        frame = textured_frame(offset=i)
+        result = tracker.track(frame)
+        if result is None:
+            tracker.update(frame, gate.infer(detect, [frame])[0])
+        else:
+            tracked += 1
+    assert tracked == 8
+
+
+def tracked(frame, rows):
+    """A tracking result: rows of (x1, y1, x2, y2, track id)."""
+    return Results(orig_img=frame, path="", names={0: "person"},
+                   boxes=torch.tensor([[*row, 0.9, 0] for row in rows], dtype=torch.float32))
+
+
+def test_carried_ids_stay_unique():
+    tracker = KeyframeTracker(interval=5)
+    frame = textured_frame()
+    tracker.update(frame, tracked(frame, [(40, 100, 100, 220, 1)]))
+    # The tracker gave id 1 to a newcomer; the box where track 1 was got a fresh id
+    result = tracker.update(frame, tracked(frame, [(40, 100, 100, 220, 7), (300, 100, 360, 220, 1)]))
+    ids = result.boxes.id.tolist()
+    assert len(set(ids)) == 2
+    assert ids == [7, 1]
+
+    # Without the clash the id is carried over
+    tracker.reset()
+    tracker.update(frame, tracked(frame, [(40, 100, 100, 220, 1)]))
+    result = tracker.update(frame, tracked(frame, [(40, 100, 100, 220, 9), (300, 100, 360, 220, 3)]))
+    assert result.boxes.id.tolist() == [1, 3]
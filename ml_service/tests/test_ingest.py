@@ -0,0 +1,44 @@
+import os
+import time
+
+from ingest import IDLE_TIMEOUT, UploadIngest
+
+
+def upload(upload_dir, data=b"\x00\x00\x00\x08mdat" * 64):
+    ingest = UploadIngest(upload_dir, "clip.mp4")
+    ingest.write(data)
+    return ingest
+
+
+def test_stored_upload_deleted_when_last_reader_finishes(tmp_path):
+    first, second = upload(tmp_path), upload(tmp_path)
+    path = first.finish()
+    assert second.finish() == path and second.duplicate
+
+    first.cleanup()
+    assert path.exists()   # the second job still reads it
+    second.cleanup()
+    assert not path.exists()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_stored_upload_deleted_when_job_ended_before_upload(tmp_path):
+    ingest = upload(tmp_path)
+    ingest.cleanup()   # e.g. the job failed before the upload finished
+    path = ingest.finish()
+    assert not path.exists()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_clean_stale_removes_only_abandoned_incoming_files(tmp_path):
+    stored = upload(tmp_path).finish()
+    abandoned = upload(tmp_path)
+    abandoned.file.close()
+    old = time.time() - IDLE_TIMEOUT - 10
+    os.utime(abandoned.incoming_path, (old, old))
+    live = upload(tmp_path)     # another process is still receiving it
+
+    UploadIngest.clean_stale(tmp_path)
+    assert not abandoned.incoming_path.exists()
+    assert live.incoming_path.exists()
+    assert stored.exists()
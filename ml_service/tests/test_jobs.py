@@ -0,0 +1,71 @@
+import time
+from concurrent.futures import CancelledError
+
+import pytest
+
+import jobs
+from jobs import JobCancelled, JobManager
+
+
+class SlowAnalyzer:
+    """Stands in for VideoAnalyzer in the forked workers: frames at a fixed pace."""
+
+    def analyze_video(self, source, output_path, progress_callback=None, **kwargs):
+        total = 40
+        for i in range(1, total + 1):
+            time.sleep(0.05)
+            progress_callback(i, total)
+        return {"total_frames": total, "detections": []}
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    # Workers are forked, so they inherit the stand-in and the faster progress reports
+    monkeypatch.setattr(jobs, "_worker_analyzer", SlowAnalyzer())
+    monkeypatch.setattr(jobs, "PROGRESS_INTERVAL", 0.05)
+    manager = JobManager(max_workers=1).start()
+    yield manager
+    manager.shutdown()
+
+
+def wait_for(condition, timeout=20.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.02)
+
+
+def test_progress_is_reported_while_running(manager, tmp_path):
+    job_id = manager.submit("in.mp4", str(tmp_path / "out.mp4"))
+    wait_for(lambda: 0 < manager.status(job_id)["frames_processed"] < 40)
+    status = manager.status(job_id)
+    assert status["status"] == "running"
+    assert status["total_frames"] == 40 and 0 < status["progress"] < 1
+
+    assert manager.get(job_id).done.result(timeout=20)["total_frames"] == 40
+    status = manager.status(job_id)
+    assert status["status"] == "done"
+    assert status["frames_processed"] == 40 and status["progress"] == 1.0
+
+
+def test_cancel_running_and_queued_jobs(manager, tmp_path):
+    running = manager.submit("a.mp4", str(tmp_path / "a.mp4"))
+    queued = manager.submit("b.mp4", str(tmp_path / "b.mp4"))
+    wait_for(lambda: manager.status(running)["frames_processed"] > 0)
+    assert manager.status(queued)["status"] == "queued"
+
+    assert manager.cancel(queued)
+    assert manager.cancel(running)
+    for job_id in (queued, running):
+        assert manager.status(job_id)["status"] == "cancelled"
+        with pytest.raises(JobCancelled):
+            manager.get(job_id).done.result(timeout=1)
+        # The worker gives up at its next progress check rather than finishing the video
+        # (a job already handed to the pool can't be dropped before it starts)
+        with pytest.raises((JobCancelled, CancelledError)):
+            manager.get(job_id).future.result(timeout=10)
+    assert manager.status(running)["frames_processed"] < 40
+    assert manager.status(queued)["status"] == "cancelled"
+
+    assert not manager.cancel(running)   # already over
+    assert not manager.cancel("missing")
@@ -0,0 +1,78 @@
+import pytest
+
+from metrics import MetricsRegistry
+
+
+def registry():
+    reg = MetricsRegistry()
+    hits = reg.counter("demo_hits_total", "Hits", ("camera",))
+    level = reg.gauge("demo_level", "Level")
+    latency = reg.histogram("demo_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    return reg, hits, level, latency
+
+
+def test_text_format():
+    reg, hits, level, latency = registry()
+    hits.labels('cam "1"\\\n').inc(2)
+    level.labels().set(3)
+    for value in (0.05, 0.1, 0.5, 4.0):
+        latency.labels("infer").observe(value)
+
+    assert reg.render().splitlines() == [
+        "# HELP demo_hits_total Hits",
+        "# TYPE demo_hits_total counter",
+        'demo_hits_total{camera="cam \\"1\\"\\\\\\n"} 2.0',
+        "# HELP demo_level Level",
+        "# TYPE demo_level gauge",
+        "demo_level 3.0",
+        "# HELP demo_seconds Latency",
+        "# TYPE demo_seconds histogram",
+        'demo_seconds_bucket{stage="infer",le="0.1"} 2',
+        'demo_seconds_bucket{stage="infer",le="1.0"} 3',
+        'demo_seconds_bucket{stage="infer",le="+Inf"} 4',
+        'demo_seconds_sum{stage="infer"} 4.65',
+        'demo_seconds_count{stage="infer"} 4',
+    ]
+
+
+def test_parses_as_prometheus_text():
+    parser = pytest.importorskip("prometheus_client.parser")
+    reg, hits, level, latency = registry()
+    hits.labels("a").inc()
+    hits.labels('b"\n').inc(5)
+    latency.labels("decode").observe(0.2)
+    families = {f.name: f for f in parser.text_string_to_metric_families(reg.render())}
+
+    assert {s.labels["camera"]: s.value for s in families["demo_hits"].samples} == {"a": 1.0, 'b"\n': 5.0}
+    buckets = {s.labels["le"]: s.value for s in families["demo_seconds"].samples if s.name.endswith("_bucket")}
+    assert buckets == {"0.1": 0.0, "1.0": 1.0, "+Inf": 1.0}
+
+
+def test_snapshot_merge_and_disabled():
+    worker, hits, _, latency = registry()
+    hits.labels("a").inc(2)
+    latency.labels("infer").observe(0.5)
+    snapshot = worker.snapshot(reset=True)
+    assert worker.snapshot() == {}     # reset
+
+    parent, parent_hits, level, parent_latency = registry()
+    level.labels().set(1)
+    parent.merge(snapshot)
+    parent.merge(snapshot)
+    assert parent_hits.labels("a").value == 4
+    assert parent_latency.labels("infer").counts == [0, 2, 0]
+    assert "demo_level" not in parent.snapshot()    # gauges aren't summed across processes
+
+    off = MetricsRegistry(enabled=False)
+    off.counter("demo_total", "Off").labels().inc()
+    assert off.snapshot() == {}
+
+
+def test_remove_matching_and_label_count():
+    reg, hits, _, latency = registry()
+    latency.labels("infer").observe(0.1)
+    latency.labels("decode").observe(0.1)
+    latency.remove_matching(stage="infer")
+    assert "infer" not in reg.render() and "decode" in reg.render()
+    with pytest.raises(ValueError):
+        hits.labels("a", "b")
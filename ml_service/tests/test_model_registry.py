@@ -0,0 +1,59 @@
+import threading
+import time
+
+import pytest
+
+import model_registry
+from benchmarks.stub_model import StubModel
+from model_registry import ModelRegistry
+
+
+def test_slow_load_does_not_block_other_weights(tmp_path, monkeypatch):
+    release = threading.Event()
+    loads = []
+
+    def slow_yolo(path, **kwargs):
+        loads.append(path)
+        release.wait(5)
+        model = StubModel()
+        model.model = None
+        return model
+
+    monkeypatch.setattr(model_registry, "YOLO", slow_yolo)
+    weights = tmp_path / "slow.pt"
+    weights.write_bytes(b"")
+    registry = ModelRegistry(backend="torch")
+    registry.register("ready.pt", StubModel(), backend="stub")
+
+    handles = []
+    loaders = [threading.Thread(target=lambda: handles.append(registry.get_model(str(weights))))
+               for _ in range(2)]
+    for t in loaders:
+        t.start()
+    for _ in range(500):
+        if loads:
+            break
+        time.sleep(0.01)
+
+    # While slow.pt loads, loaded weights are still served and the registry is still queryable
+    other = threading.Thread(target=lambda: (registry.get_model("ready.pt"), registry.loaded()))
+    other.start()
+    other.join(2)
+    assert not other.is_alive()
+    assert len(loads) == 1 and not handles
+
+    release.set()
+    for t in loaders:
+        t.join(5)
+    # Both callers got handles on the one loaded model
+    assert len(loads) == 1 and len(handles) == 2
+    assert registry.backend_of(str(weights)) == "torch" and not registry._loading
+
+
+def test_failed_load_is_remembered(tmp_path):
+    registry = ModelRegistry(backend="torch", model_dir=str(tmp_path))
+    for _ in range(2):
+        with pytest.raises(FileNotFoundError):
+            registry.get_model("custom.pt")
+    assert registry.try_get_model("custom.pt") is None
+    assert not registry._loading
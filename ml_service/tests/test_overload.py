@@ -0,0 +1,32 @@
+import multiprocessing
+import time
+from types import SimpleNamespace
+
+from overload import OverloadController
+
+
+def burn(stop):
+    while not stop.is_set():
+        pass
+
+
+def test_cpu_utilization_counts_worker_processes():
+    controller = OverloadController(SimpleNamespace(cameras={}), cpu_budget=0.5)
+    controller.cores = 1
+    controller.tick()
+
+    # A busy child, like a JobManager worker; this process itself stays idle
+    context = multiprocessing.get_context("fork")
+    stop = context.Event()
+    worker = context.Process(target=burn, args=(stop,))
+    worker.start()
+    try:
+        time.sleep(0.8)
+        controller.tick()
+    finally:
+        stop.set()
+        worker.join(5)
+
+    assert controller.cpu_utilization > 0.5
+    assert controller.status()["overloaded"]
+    assert controller.reasons[0].startswith("cpu ")
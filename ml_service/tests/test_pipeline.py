@@ -0,0 +1,137 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from pipeline import FramePipeline
+
+
+def counter(limit=None):
+    """read_fn yielding 0, 1, 2, ... (then None after limit frames)."""
+    frames = itertools.count()
+    reads = []
+
+    def read():
+        frame = next(frames)
+        if limit is not None and frame >= limit:
+            return None
+        reads.append(frame)
+        return frame
+    return read, reads
+
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_frames_reach_sink_in_order_with_their_results():
+    read, _ = counter(50)
+    batches = []
+    sunk = []
+
+    def infer(frames):
+        batches.append(len(frames))
+        return [frame * 10 for frame in frames]
+
+    FramePipeline(read, infer, lambda frame, result: sunk.append((frame, result)),
+                  batch_size=4, queue_size=3).run()
+    assert sunk == [(i, i * 10) for i in range(50)]
+    assert sum(batches) == 50 and max(batches) <= 4
+
+
+def test_slow_sink_bounds_frames_in_flight():
+    read, reads = counter(100)
+    release = threading.Event()
+    sunk = []
+
+    def sink(frame, result):
+        release.wait()
+        sunk.append(frame)
+
+    pipeline = FramePipeline(read, lambda frames: frames, sink, queue_size=2).start()
+    wait_for(lambda: pipeline.queue_depths() == {"decoded": 2, "inferred": 2})
+    time.sleep(0.2)
+    # Both queues, plus one frame held by each stage
+    assert len(reads) <= 2 + 2 + 3
+    release.set()
+    pipeline.join(5)
+    assert not pipeline.running
+    assert sunk == list(range(100))
+
+
+def test_latest_only_replaces_frames_waiting_for_inference():
+    read, reads = counter(20)
+    release = threading.Event()
+    drops = []
+    sunk = []
+
+    def infer(frames):
+        release.wait()
+        return frames
+
+    pipeline = FramePipeline(read, infer, lambda frame, result: sunk.append(frame),
+                             latest_only=True, on_drop=lambda: drops.append(1)).start()
+    wait_for(lambda: len(reads) == 20)
+    release.set()
+    pipeline.join(5)
+    assert not pipeline.running
+    # Decode never blocked on the busy model: the freshest frame is the last one analysed
+    assert sunk[-1] == 19 and sunk == sorted(sunk)
+    assert pipeline.dropped == len(drops) >= 17
+    assert len(sunk) + pipeline.dropped == 20
+
+
+@pytest.mark.parametrize("stage", ["read", "infer", "sink"])
+def test_stage_error_stops_pipeline_and_reaches_join(stage):
+    read, reads = counter()
+
+    def fail_on_fifth(fn):
+        def wrapped(*args):
+            if len(reads) >= 5 and stage == fn.__name__:
+                raise ValueError(stage)
+            return fn(*args)
+        wrapped.__name__ = fn.__name__
+        return wrapped
+
+    def infer(frames):
+        return frames
+
+    def sink(frame, result):
+        pass
+
+    # Never-ending source: the pipeline only finishes because the error stops it
+    pipeline = FramePipeline(fail_on_fifth(read), fail_on_fifth(infer), fail_on_fifth(sink),
+                             queue_size=2).start()
+    with pytest.raises(ValueError, match=stage):
+        pipeline.join(5)
+    assert not pipeline.running
+
+
+def test_run_raises_stage_error():
+    def infer(frames):
+        raise RuntimeError("model failed")
+
+    read, _ = counter(10)
+    with pytest.raises(RuntimeError, match="model failed"):
+        FramePipeline(read, infer, lambda frame, result: None).run()
+
+
+def test_batches_fill_when_decode_keeps_pace():
+    next_frame, _ = counter(20)
+
+    def read():
+        time.sleep(0.005)
+        return next_frame()
+
+    batches = []
+
+    def infer(frames):
+        batches.append(len(frames))
+        return frames
+
+    FramePipeline(read, infer, lambda frame, result: None, batch_size=4, batch_timeout=0.5).run()
+    assert batches == [4] * 5
@@ -0,0 +1,76 @@
+import os
+
+from result_cache import ResultCache
+from video_analyzer import VideoAnalyzer
+
+SHA = "ab" * 32
+
+
+def add(cache, key, size=1000, extra=False):
+    video = cache.output_dir / f"{key}.mp4"
+    video.write_bytes(b"\0" * size)
+    extra_paths = []
+    if extra:
+        extra_paths = [cache.output_dir / f"{key}.npz"]
+        extra_paths[0].write_bytes(b"\0" * 10)
+    cache.put(key, {"detections": [key]}, video, extra_paths)
+    return video
+
+
+def test_key_is_stable_and_tracks_config():
+    config = VideoAnalyzer().cache_config()
+    key = ResultCache.make_key(SHA, config)
+    assert key == ResultCache.make_key(SHA, VideoAnalyzer().cache_config())
+    assert key == ResultCache.make_key(SHA, dict(reversed(list(config.items()))))
+
+    changed = VideoAnalyzer()
+    changed.crowd_threshold += 1
+    assert ResultCache.make_key(SHA, changed.cache_config()) != key
+    assert ResultCache.make_key("cd" * 32, config) != key
+    assert ResultCache.make_key(SHA, {**config, "frame_detail": True}) != key
+
+
+def test_hit_returns_result_and_video(tmp_path):
+    cache = ResultCache(tmp_path)
+    assert cache.get("a") is None
+    add(cache, "a")
+    assert cache.get("a") == {"result": {"detections": ["a"]}, "output_filename": "a.mp4"}
+
+    (tmp_path / "a.mp4").unlink()
+    assert cache.get("a") is None
+    assert cache.status()["entries"] == 0 and cache.status()["hits"] == 1
+
+
+def test_max_bytes_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(tmp_path, max_bytes=3000)
+    for key in "abc":
+        add(cache, key, extra=key == "a")
+    assert cache.status()["evictions"] == 1
+    # "a" was the oldest: its entry, video and extra file are gone
+    assert not (tmp_path / "a.mp4").exists() and not (tmp_path / "a.npz").exists()
+    assert cache.get("a") is None
+
+    cache.get("b")
+    add(cache, "d")
+    assert cache.get("c") is None and cache.get("b") is not None
+    assert cache.status()["bytes"] <= cache.max_bytes
+
+    # An entry bigger than the whole cache is still kept until the next put
+    add(cache, "huge", size=5000)
+    assert cache.get("huge") is not None and cache.status()["entries"] == 1
+
+
+def test_lru_order_survives_restart(tmp_path):
+    cache = ResultCache(tmp_path)
+    for key in "abc":
+        add(cache, key)
+    # Entry mtimes are the last use: "b" is the oldest, then "c", then "a"
+    for age, key in ((300, "b"), (200, "c"), (100, "a")):
+        entry = cache.index_dir / f"{key}.json"
+        used = entry.stat().st_mtime - age
+        os.utime(entry, (used, used))
+
+    reopened = ResultCache(tmp_path, max_bytes=2500)
+    assert sorted(reopened.entries) == ["a", "c"]
+    assert not (tmp_path / "b.mp4").exists()
+    assert reopened.get("a")["output_filename"] == "a.mp4"
@@ -0,0 +1,63 @@
+import threading
+import time
+from pathlib import Path
+
+import cv2
+import pytest
+
+import segments
+from benchmarks.common import make_synthetic_clip
+from benchmarks.stub_model import use_stub_models
+from jobs import JobCancelled
+from model_registry import model_registry
+from segments import analyze_video_parallel
+from video_analyzer import VideoAnalyzer
+
+
+@pytest.fixture
+def stub_models():
+    # Segment workers are forked, so they serve the weights from the same stand-in
+    def use(latency=0.0):
+        use_stub_models(latency)
+    yield use
+    for cache in (model_registry._models, model_registry._backends):
+        cache.pop("yolov8n.pt", None)
+
+
+def count_frames(path):
+    cap = cv2.VideoCapture(str(path))
+    frames = 0
+    while cap.grab():
+        frames += 1
+    cap.release()
+    return frames
+
+
+def test_parallel_matches_serial(stub_models, tmp_path, monkeypatch):
+    stub_models()
+    monkeypatch.setattr(segments, "MIN_SEGMENT_FRAMES", 30)
+    clip = make_synthetic_clip(tmp_path / "clip.mp4", num_frames=90)
+    analyzer = VideoAnalyzer()
+
+    serial = analyzer.analyze_video(clip, str(tmp_path / "serial.mp4"))
+    parallel = analyze_video_parallel(clip, str(tmp_path / "parallel.mp4"), workers=2, analyzer=analyzer)
+    assert parallel["segments"] == 2
+    assert serial["detections"]
+    assert parallel["detections"] == serial["detections"]
+    assert parallel["frames_analyzed"] == serial["frames_analyzed"] == 90
+    assert count_frames(tmp_path / "parallel.mp4") == count_frames(tmp_path / "serial.mp4") == 90
+
+
+def test_cancel_stops_running_segments(stub_models, tmp_path, monkeypatch):
+    stub_models(latency=0.02)     # about 3 s per 150-frame segment
+    monkeypatch.setattr(segments, "MIN_SEGMENT_FRAMES", 30)
+    clip = make_synthetic_clip(tmp_path / "clip.mp4", num_frames=300)
+    cancel_path = tmp_path / "cancel"
+    threading.Timer(0.5, cancel_path.touch).start()
+
+    began = time.monotonic()
+    with pytest.raises(JobCancelled):
+        analyze_video_parallel(clip, str(tmp_path / "out.mp4"), workers=2, analyzer=VideoAnalyzer(),
+                               cancel_path=str(cancel_path))
+    assert time.monotonic() - began < 2.5
+    assert not any(Path(tmp_path).glob("segments_*"))
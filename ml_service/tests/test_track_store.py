@@ -0,0 +1,36 @@
+from detectors.track_store import TrackStore
+
+
+def test_tracks_expire_after_ttl():
+    store = TrackStore(ttl=10.0)
+    store.touch(1, now=0.0)
+    store.touch(2, now=5.0)
+    store.touch(1, now=8.0)     # seen again: now the newest
+
+    assert store.evict_expired(now=15.5) == 1
+    assert 2 not in store and 1 in store
+    assert store.evict_expired(now=18.0) == 0
+    assert store.evict_expired(now=18.5) == 1
+    assert len(store) == 0 and store.evicted == 2
+
+
+def test_reused_id_after_ttl_is_a_new_track():
+    store = TrackStore(ttl=10.0)
+    first = store.touch(7, now=0.0)
+    first.alerted = True
+    assert store.touch(7, now=9.0) is first     # within the ttl: same person
+    again = store.touch(7, now=30.0)
+    assert again is not first
+    assert again.start_time == 30.0 and not again.alerted
+    assert store.reused == 1
+
+
+def test_cap_drops_least_recently_seen():
+    store = TrackStore(ttl=100.0, max_tracks=3)
+    for track_id in range(3):
+        store.touch(track_id, now=float(track_id))
+    store.touch(0, now=3.0)     # 1 is now the least recently seen
+    store.touch(3, now=4.0)
+    assert len(store) == 3
+    assert 1 not in store and all(t in store for t in (0, 2, 3))
+    assert store.evicted == 1
@@ -0,0 +1,96 @@
+import subprocess
+
+import cv2
+import numpy as np
+import pytest
+
+from video_output import find_ffmpeg, render_event_windows, source_fourcc
+
+pytestmark = pytest.mark.skipif(find_ffmpeg() is None, reason="ffmpeg not installed")
+
+
+def write_clip(path, frames=60, size=(320, 240), fps=30):
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"mp4v"), fps, size)
+    for i in range(frames):
+        frame = np.zeros((size[1], size[0], 3), np.uint8)
+        cv2.rectangle(frame, (i * 3, 50), (i * 3 + 40, 150), (0, 200, 0), -1)
+        out.write(frame)
+    out.release()
+    return str(path)
+
+
+def codec_name(path):
+    probe = subprocess.run([find_ffmpeg(), "-hide_banner", "-i", str(path)], capture_output=True, text=True)
+    return "h264" if "Video: h264" in probe.stderr else "mpeg4" if "Video: mpeg4" in probe.stderr else probe.stderr
+
+
+def render(tmp_path, codec):
+    clip = write_clip(tmp_path / "in.mp4")
+    output = tmp_path / f"out-{codec}.mp4"
+    events = [{"start_frame": 20, "end_frame": 25}]
+    overlays = {i: [((0, 0, 10, 10), (0, 0, 255))] for i in range(20, 26)}
+
+    def draw(frame, ops):
+        for box, color in ops:
+            cv2.rectangle(frame, box[:2], box[2:], color, 2)
+
+    mode = render_event_windows(clip, str(output), events, overlays, draw, (320, 240), 60, codec)
+    return mode, output
+
+
+def test_event_windows_keep_matching_source_codec(tmp_path):
+    mode, output = render(tmp_path, "mp4v")
+    assert mode == "windows"
+    assert codec_name(output) == "mpeg4"
+
+
+def test_event_windows_reencode_for_other_codec(tmp_path):
+    mode, output = render(tmp_path, "h264")
+    assert mode == "full"
+    assert codec_name(output) == "h264"
+    cap = cv2.VideoCapture(str(output))
+    assert source_fourcc(cap) in ("avc1", "h264")
+    cap.release()
+
+
+
+def read_all(path):
+    cap = cv2.VideoCapture(str(path))
+    frames = []
+    while True:
+        success, frame = cap.read()
+        if not success:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def test_event_windows_line_up_at_ntsc_frame_rate(tmp_path):
+    # 29.97 fps: frame indices can't be rebuilt from an int fps
+    clip = tmp_path / "ntsc.mp4"
+    subprocess.run([find_ffmpeg(), "-y", "-loglevel", "error", "-f", "lavfi",
+                    "-i", "testsrc=size=320x240:rate=30000/1001", "-frames:v", "600",
+                    "-c:v", "mpeg4", "-q:v", "5", "-g", "12", str(clip)], check=True)
+    output = tmp_path / "out.mp4"
+    events = [{"start_frame": 100, "end_frame": 130}, {"start_frame": 500, "end_frame": 520}]
+    overlays = {i: [(0, 0)] for i in (*range(100, 131), *range(500, 521))}
+
+    def draw(frame, ops):
+        cv2.rectangle(frame, (10, 10), (60, 60), (0, 0, 255), -1)
+
+    mode = render_event_windows(str(clip), str(output), events, overlays, draw, (320, 240), 600, "mp4v")
+    assert mode == "windows"
+    decode = subprocess.run([find_ffmpeg(), "-v", "error", "-i", str(output), "-f", "null", "-"],
+                            capture_output=True, text=True)
+    assert "[mpeg4" not in decode.stderr
+
+    source, rendered = read_all(clip), read_all(output)
+    assert len(rendered) == 600
+    # Stream-copied frames are the source's own, in place; event frames carry the overlay
+    for i in (0, 50, 95, 140, 300, 480, 599):
+        assert np.array_equal(rendered[i], source[i]), i
+    for i in (99, 129, 499, 519):
+        b, g, r = rendered[i][30, 30].tolist()
+        assert r > 200 and b < 50 and g < 50
+        assert source[i][30, 30].tolist() != rendered[i][30, 30].tolist()
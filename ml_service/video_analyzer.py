@@ -1,133 +1,305 @@
 import cv2
 import numpy as np
-from ultralytics import YOLO
 from pathlib import Path
 import json
+import time
+
+from events import EventAggregator, FrameHits
+from metrics import StageMetrics
+from model_registry import model_registry
+from pipeline import FramePipeline, capture_reader, seek_frame
+from video_output import open_writer, render_event_windows
+
+# "annotated": draw and encode every frame; "report": no video at all;
+# "events": re-encode only the stretches with detections
+OUTPUT_MODES = ("annotated", "report", "events")
 
 class VideoAnalyzer:
-    def __init__(self):
+    def __init__(self, batch_size: int = 1):
         """Initialize ML models for video analysis"""
-        self.yolo_model = YOLO("yolov8n.pt")
-        
-        # Try to load specialized violence model
-        try:
-            self.violence_model = YOLO("violence.pt")
-            self.has_violence_model = True
-        except:
-            self.violence_model = None
-            self.has_violence_model = False
-            
+        # Models come from the shared registry and are loaded on first use
+        self._yolo_model = None
+        self._violence_model = None
+        self._violence_checked = False
+        self.coco_weights = "yolov8n.pt"
+        self.violence_weights = "violence.pt"
+
+        self.person_class = 0
         self.weapon_classes = [43, 34]  # knife, bat
-        
-    def analyze_video(self, video_path: str, output_path: str) -> dict:
+        # People and weapons both come from the COCO model, so one pass covers both
+        self.detect_classes = [self.person_class] + self.weapon_classes
+        self.crowd_threshold = 10       # more people than this is a crowd
+        self.violence_conf = 0.6        # min confidence for violence/fight boxes
+        # Number of decoded frames stacked into one model call
+        self.batch_size = batch_size
+
+    @property
+    def yolo_model(self):
+        if self._yolo_model is None:
+            self._yolo_model = model_registry.get_model(self.coco_weights)
+        return self._yolo_model
+
+    @property
+    def violence_model(self):
+        # Try to load specialized violence model
+        if not self._violence_checked:
+            self._violence_model = model_registry.try_get_model(self.violence_weights)
+            self._violence_checked = True
+        return self._violence_model
+
+    @property
+    def has_violence_model(self) -> bool:
+        return self.violence_model is not None
+
+    def cache_config(self) -> dict:
+        """Everything besides the video that decides the report, for keying cached results."""
+        return {
+            "weights": {name: model_registry.weights_digest(name)
+                        for name in (self.coco_weights, self.violence_weights)},
+            # Runtimes differ slightly in their outputs
+            "backends": {name: model_registry.backend_of(name)
+                         for name in (self.coco_weights, self.violence_weights)},
+            "detect_classes": self.detect_classes,
+            "crowd_threshold": self.crowd_threshold,
+            "violence_conf": self.violence_conf,
+            "report": "events",
+        }
+
+    def analyze_video(self, video_path: str, output_path: str, batch_size: int = None,
+                      progress_callback=None, start_frame: int = 0, end_frame: int = None,
+                      frame_detail_path: str = None, return_hits: bool = False,
+                      output_mode: str = "annotated", codec: str = "mp4v",
+                      return_overlays: bool = False) -> dict:
         """
         Analyze video for incidents and return annotated video + report
-        
+
+        batch_size: frames per model call (defaults to self.batch_size).
+                    Detections are identical for any batch size.
+        progress_callback: called as progress_callback(frames_processed, frames_to_analyze)
+                    after each frame is written.
+        start_frame, end_frame: analyze only frames [start_frame, end_frame) of
+                    the file (see segments.py). Frame numbers and timestamps
+                    in the report stay relative to the whole file.
+        frame_detail_path: also save every per-frame hit as a compressed NPZ
+                    (see events.FrameHits) and return its path as frame_detail.
+        return_hits: include the raw FrameHits under "hits" (for merging segments).
+        output_mode: "annotated" writes every frame with boxes drawn;
+                    "report" only builds the report (no video, no drawing,
+                    output_video is None); "events" writes the annotated
+                    video re-encoding only the stretches around detections
+                    and stream-copying the rest (see video_output.render_event_windows).
+        codec: "mp4v" or "h264" (browser-playable) for annotated output, see video_output.open_writer.
+        return_overlays: include {frame_number: overlay ops} under "overlays"
+                    (for rendering segments analysed in report mode).
+
         Returns:
-            dict with keys: total_frames, detections, output_video
+            dict with keys: total_frames, frames_analyzed, detections, frame_hits, output_video.
+            detections are events: consecutive per-frame hits of one type merged,
+            see events.EventAggregator. In "events" mode, render is "windows",
+            or "full" if the whole video had to be re-encoded.
         """
+        if output_mode not in OUTPUT_MODES:
+            raise ValueError(f"output_mode must be one of {OUTPUT_MODES}")
+        batch_size = max(1, batch_size or self.batch_size)
         cap = cv2.VideoCapture(video_path)
-        
+
         if not cap.isOpened():
             raise ValueError("Could not open video file")
-        
+
         # Get video properties
         fps = int(cap.get(cv2.CAP_PROP_FPS))
         width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        
-        # Setup video writer
-        fourcc = cv2.VideoWriter_fourcc(*'mp4v')
-        out = cv2.VideoWriter(output_path, fourcc, fps, (width, height))
-        
-        detections = []
-        frame_number = 0
-        
-        while cap.isOpened():
-            success, frame = cap.read()
-            if not success:
-                break
-                
+        seek_frame(cap, start_frame)
+        max_frames = None if end_frame is None else max(0, end_frame - start_frame)
+        frames_to_analyze = max_frames if max_frames is not None else max(0, total_frames - start_frame)
+
+        # Only the annotated mode writes while analysing; events renders afterwards
+        out = open_writer(output_path, fps, (width, height), codec) if output_mode == "annotated" else None
+        overlays = {} if (output_mode == "events" or return_overlays) else None
+
+        aggregator = EventAggregator(fps)
+        hits = FrameHits() if (frame_detail_path or return_hits) else None
+        hit_count = 0
+        frame_number = start_frame
+        # Uploads share one set of series (jobs send theirs to the API process, see jobs.py)
+        metrics = StageMetrics("upload", type(self).__name__)
+        read_frame = capture_reader(cap, max_frames)
+
+        def read():
+            began = time.perf_counter()
+            frame = read_frame()
+            if frame is not None:
+                metrics.decode.observe(time.perf_counter() - began)
+                metrics.frames_read.inc()
+            return frame
+
+        def infer(frames):
+            began = time.perf_counter()
+            results = list(zip(*self.infer_batch(frames)))
+            metrics.infer.observe(time.perf_counter() - began)
+            metrics.frames_inferred.inc(len(frames))
+            return results
+
+        def annotate_and_write(frame, result):
+            nonlocal frame_number, hit_count
+            began = time.perf_counter()
             frame_number += 1
-            annotated_frame = frame.copy()
-            
-            # Run YOLO detection for people (crowd detection)
-            results = self.yolo_model(frame, classes=[0], verbose=False)
-            person_count = len(results[0].boxes)
-            
-            # Draw bounding boxes for people
-            for box in results[0].boxes:
+            results, violence_results = result
+            frame_detections, frame_overlays = self.detect_frame(
+                frame_number, fps, results, violence_results)
+            for det in frame_detections:
+                aggregator.add(frame_number, det['type'], det['confidence'], det['description'])
+                if hits is not None:
+                    hits.add(frame_number, det['type'], det['confidence'], det['description'])
+            hit_count += len(frame_detections)
+            aggregator.close_idle(frame_number)
+            annotated = time.perf_counter()
+            metrics.annotate.observe(annotated - began)
+
+            if out is not None:
+                # The decoded frame isn't used after this, so draw on it directly
+                self.draw_overlays(frame, frame_overlays)
+                drawn = time.perf_counter()
+                out.write(frame)
+                metrics.draw.observe(drawn - annotated)
+                metrics.encode.observe(time.perf_counter() - drawn)
+            if overlays is not None and frame_overlays:
+                overlays[frame_number] = frame_overlays
+            if progress_callback is not None:
+                progress_callback(frame_number - start_frame, frames_to_analyze)
+
+        # Decode, inference and annotate+encode run on separate threads
+        pipeline = FramePipeline(read, infer, annotate_and_write,
+                                 batch_size=batch_size, queue_size=2 * batch_size,
+                                 name="analyzer")
+        try:
+            pipeline.run()
+        finally:
+            cap.release()
+            if out is not None:
+                out.release()
+
+        detections = aggregator.finish()
+        render = None
+        if output_mode == "events":
+            render = render_event_windows(video_path, output_path, detections, overlays,
+                                          self.draw_overlays, (width, height), frame_number, codec)
+
+        report = {
+            # Streams (e.g. an upload still arriving) don't know their length up front
+            'total_frames': total_frames if total_frames > 0 else frame_number,
+            'frames_analyzed': frame_number - start_frame,
+            'detections': detections,
+            'frame_hits': hit_count,
+            'output_video': None if output_mode == "report" else output_path
+        }
+        if render is not None:
+            report['render'] = render
+        if frame_detail_path:
+            hits.save(frame_detail_path, fps)
+            report['frame_detail'] = frame_detail_path
+        if return_hits:
+            report['hits'] = hits
+        if return_overlays:
+            report['overlays'] = overlays
+        return report
+
+    def infer_batch(self, frames: list):
+        """
+        Run the models once over a list of frames.
+        Returns (coco_results, violence_results), one entry per frame;
+        violence entries are None when no violence model is loaded.
+        """
+        results = self.yolo_model(frames, classes=self.detect_classes, verbose=False)
+        if self.has_violence_model:
+            violence_results = self.violence_model(frames, verbose=False)
+        else:
+            violence_results = [None] * len(frames)
+        return results, violence_results
+
+    def detect_frame(self, frame_number: int, fps: int, results, violence_results):
+        """
+        Route one frame's model results to the crowd, weapon and violence logic.
+        Returns (detections for this frame, overlays): the boxes and labels to
+        draw, as ops for draw_overlays, so frames can be annotated later or not at all.
+        """
+        detections = []
+        overlays = []
+
+        # Split the single YOLO pass into people and weapons
+        boxes = results.boxes
+        person_boxes = boxes[boxes.cls == self.person_class]
+        weapon_boxes = boxes[boxes.cls != self.person_class]
+        person_count = len(person_boxes)
+
+        # Bounding boxes for people
+        for box in person_boxes:
+            x1, y1, x2, y2 = map(int, box.xyxy[0])
+            overlays.append(("rect", (x1, y1), (x2, y2), (0, 255, 0), 2))
+            overlays.append(("text", 'Person', (x1, y1-10), 0.5, (0, 255, 0), 2))
+
+        # Check for crowds
+        if person_count > self.crowd_threshold:
+            detections.append({
+                'type': 'Crowd Density',
+                'frame': frame_number,
+                'timestamp': f"{frame_number/fps:.2f}s",
+                'description': f'High crowd density detected: {person_count} people',
+                'confidence': 0.9
+            })
+            overlays.append(("text", f'CROWD: {person_count} people', (10, 30), 1, (0, 0, 255), 2))
+
+        # Check for weapons
+        if len(weapon_boxes) > 0:
+            for box in weapon_boxes:
                 x1, y1, x2, y2 = map(int, box.xyxy[0])
-                cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(annotated_frame, 'Person', (x1, y1-10), 
-                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 2)
-            
-            # Check for crowds
-            if person_count > 10:
+                cls_id = int(box.cls[0])
+                conf = float(box.conf[0])
+
+                overlays.append(("rect", (x1, y1), (x2, y2), (0, 0, 255), 3))
+                overlays.append(("text", f'WEAPON ({conf:.2f})', (x1, y1-10), 0.6, (0, 0, 255), 2))
+
                 detections.append({
-                    'type': 'Crowd Density',
+                    'type': 'Weapon Detected',
                     'frame': frame_number,
                     'timestamp': f"{frame_number/fps:.2f}s",
-                    'description': f'High crowd density detected: {person_count} people',
-                    'confidence': 0.9
+                    'description': f'Weapon detected with {conf:.2f} confidence',
+                    'confidence': conf
                 })
-                cv2.putText(annotated_frame, f'CROWD: {person_count} people', 
-                           (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            
-            # Check for weapons
-            weapon_results = self.yolo_model(frame, classes=self.weapon_classes, verbose=False)
-            if len(weapon_results[0].boxes) > 0:
-                for box in weapon_results[0].boxes:
+                overlays.append(("text", 'WEAPON ALERT', (10, 60), 1, (0, 0, 255), 2))
+
+        # Check for violence (if model available)
+        if violence_results is not None:
+            for box in violence_results.boxes:
+                cls_id = int(box.cls[0])
+                conf = float(box.conf[0])
+                label = self.violence_model.names[cls_id]
+
+                if label.lower() in ['violence', 'fight'] and conf > self.violence_conf:
                     x1, y1, x2, y2 = map(int, box.xyxy[0])
-                    cls_id = int(box.cls[0])
-                    conf = float(box.conf[0])
-                    
-                    cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (0, 0, 255), 3)
-                    cv2.putText(annotated_frame, f'WEAPON ({conf:.2f})', (x1, y1-10), 
-                               cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 0, 255), 2)
-                    
+                    overlays.append(("rect", (x1, y1), (x2, y2), (255, 0, 0), 3))
+                    overlays.append(("text", f'VIOLENCE ({conf:.2f})', (x1, y1-10), 0.6, (255, 0, 0), 2))
+
                     detections.append({
-                        'type': 'Weapon Detected',
+                        'type': 'Violence',
                         'frame': frame_number,
                         'timestamp': f"{frame_number/fps:.2f}s",
-                        'description': f'Weapon detected with {conf:.2f} confidence',
+                        'description': f'Violent altercation detected: {label}',
                         'confidence': conf
                     })
-                    cv2.putText(annotated_frame, 'WEAPON ALERT', 
-                               (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            
-            # Check for violence (if model available)
-            if self.has_violence_model:
-                violence_results = self.violence_model(frame, verbose=False)
-                for r in violence_results:
-                    for box in r.boxes:
-                        cls_id = int(box.cls[0])
-                        conf = float(box.conf[0])
-                        label = self.violence_model.names[cls_id]
-                        
-                        if label.lower() in ['violence', 'fight'] and conf > 0.6:
-                            x1, y1, x2, y2 = map(int, box.xyxy[0])
-                            cv2.rectangle(annotated_frame, (x1, y1), (x2, y2), (255, 0, 0), 3)
-                            cv2.putText(annotated_frame, f'VIOLENCE ({conf:.2f})', (x1, y1-10), 
-                                       cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 0, 0), 2)
-                            
-                            detections.append({
-                                'type': 'Violence',
-                                'frame': frame_number,
-                                'timestamp': f"{frame_number/fps:.2f}s",
-                                'description': f'Violent altercation detected: {label}',
-                                'confidence': conf
-                            })
-            
-            # Write annotated frame
-            out.write(annotated_frame)
-        
-        cap.release()
-        out.release()
-        
-        return {
-            'total_frames': total_frames,
-            'detections': detections,
-            'output_video': output_path
-        }
+
+        return detections, overlays
+
+    @staticmethod
+    def draw_overlays(frame, overlays: list):
+        """Draw detect_frame's overlay ops onto frame, in place."""
+        for op in overlays:
+            if op[0] == "rect":
+                _, p1, p2, color, thickness = op
+                cv2.rectangle(frame, p1, p2, color, thickness)
+            else:
+                _, text, origin, scale, color, thickness = op
+                cv2.putText(frame, text, origin, cv2.FONT_HERSHEY_SIMPLEX, scale, color, thickness)
+        return frame
@@ -0,0 +1,233 @@
+import os
+import re
+import shutil
+import subprocess
+import tempfile
+from pathlib import Path
+
+import cv2
+
+from pipeline import seek_frame
+
+# Browser-friendly H.264: yuv420p, even dimensions, index at the front
+H264_ARGS = ["-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt", "yuv420p",
+             "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", "-movflags", "+faststart"]
+
+# ffmpeg encoder (and quality settings) for re-encoding a stretch of a source, by source fourcc
+SOURCE_ENCODERS = {
+    "mp4v": ["-c:v", "mpeg4", "-q:v", "2"],
+    "fmp4": ["-c:v", "mpeg4", "-q:v", "2"],
+    "xvid": ["-c:v", "mpeg4", "-q:v", "2"],
+    "divx": ["-c:v", "mpeg4", "-q:v", "2"],
+    "avc1": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18"],
+    "h264": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18"],
+    "x264": ["-c:v", "libx264", "-preset", "veryfast", "-crf", "18"],
+    "hev1": ["-c:v", "libx265", "-preset", "veryfast", "-crf", "20"],
+    "hvc1": ["-c:v", "libx265", "-preset", "veryfast", "-crf", "20"],
+    "hevc": ["-c:v", "libx265", "-preset", "veryfast", "-crf", "20"],
+}
+
+
+# Source fourccs whose event windows can be re-encoded and joined to stream-copied
+# stretches for each requested output codec; other sources are re-encoded in full
+CODEC_FOURCCS = {
+    "mp4v": {"mp4v", "fmp4", "xvid", "divx"},
+    "h264": {"avc1", "h264", "x264"},
+}
+
+
+def find_ffmpeg():
+    """The ffmpeg binary to use (FFMPEG_BINARY overrides PATH), or None."""
+    return os.environ.get("FFMPEG_BINARY") or shutil.which("ffmpeg")
+
+
+def source_fourcc(cap) -> str:
+    code = int(cap.get(cv2.CAP_PROP_FOURCC))
+    return "".join(chr((code >> 8 * i) & 0xFF) for i in range(4)).strip("\0 ").lower()
+
+
+class FfmpegWriter:
+    """Minimal cv2.VideoWriter stand-in that pipes raw BGR frames into an ffmpeg encoder."""
+
+    def __init__(self, path, fps: float, size: tuple, encoder_args: list, ffmpeg: str = None):
+        width, height = size
+        self.proc = subprocess.Popen(
+            [ffmpeg or find_ffmpeg(), "-y", "-loglevel", "error",
+             "-f", "rawvideo", "-pix_fmt", "bgr24", "-s", f"{width}x{height}", "-r", str(fps),
+             "-i", "-", "-an", *encoder_args, str(path)],
+            stdin=subprocess.PIPE, stderr=subprocess.PIPE)
+
+    def isOpened(self) -> bool:
+        return self.proc.poll() is None
+
+    def write(self, frame):
+        self.proc.stdin.write(frame.tobytes())
+
+    def release(self):
+        if self.proc.stdin.closed:
+            return
+        self.proc.stdin.close()
+        self.proc.wait()
+        if self.proc.returncode != 0:
+            raise RuntimeError(f"ffmpeg failed: {self.proc.stderr.read().decode(errors='ignore')}")
+
+
+def open_writer(path, fps: float, size: tuple, codec: str = "mp4v"):
+    """
+    Open a writer for the annotated video.
+    codec "mp4v": OpenCV's MPEG-4 Part 2 encoder (fast, but most browsers won't play it).
+    codec "h264": browser-playable H.264, through OpenCV's avc1 encoder when its
+    build has one, else piped to ffmpeg/libx264, else falls back to mp4v.
+    """
+    if codec == "h264":
+        writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'avc1'), fps, size)
+        if writer.isOpened():
+            return writer
+        writer.release()
+        if find_ffmpeg():
+            return FfmpegWriter(path, fps, size, H264_ARGS)
+        print("No H.264 encoder available (install ffmpeg); writing mp4v instead")
+    return cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*'mp4v'), fps, size)
+
+
+def keyframes(video_path: str, ffmpeg: str = None) -> list:
+    """
+    (frame index, pts seconds) of every keyframe, from the video stream's
+    packet list (framecrc, no decoding). Indices count frames in display
+    order from 0, so they hold for any frame rate, NTSC 29.97 included.
+    """
+    result = subprocess.run(
+        [ffmpeg or find_ffmpeg(), "-hide_banner", "-i", str(video_path), "-map", "0:v:0", "-c", "copy",
+         "-f", "framecrc", "-"],
+        capture_output=True, text=True)
+    time_base = re.search(r"^#tb 0: (\d+)/(\d+)", result.stdout, re.MULTILINE)
+    packets = []    # (pts, keyframe)
+    for line in result.stdout.splitlines():
+        fields = [field.strip() for field in line.split(",")]
+        if line.startswith("#") or len(fields) < 6:
+            continue
+        flags = int(fields[6][2:], 16) if len(fields) > 6 and fields[6].startswith("F=") else 1
+        packets.append((int(fields[2]), bool(flags & 1)))
+    if result.returncode != 0 or time_base is None or not packets:
+        raise RuntimeError(f"Could not list keyframes: {result.stderr[-500:]}")
+    seconds = int(time_base.group(1)) / int(time_base.group(2))
+    pts = sorted(p for p, _ in packets)
+    index = {p: i for i, p in enumerate(pts)}
+    # Times are from the first frame, as -ss counts them
+    return sorted((index[p], (p - pts[0]) * seconds) for p, key in packets if key)
+
+
+def plan_windows(events: list, key_frames: list, total_frames: int) -> list:
+    """
+    Frame ranges [start, end) to re-encode: each event (1-based start_frame..
+    end_frame) widened to the keyframes around it so everything outside the
+    ranges can be stream-copied, with overlapping ranges merged.
+    """
+    indices = [index for index, _ in key_frames]
+    windows = []
+    for event in sorted(events, key=lambda e: e["start_frame"]):
+        first, last = event["start_frame"] - 1, event["end_frame"] - 1
+        start = max([i for i in indices if i <= first], default=0)
+        end = min([i for i in indices if i > last], default=total_frames)
+        if windows and start <= windows[-1][1]:
+            windows[-1] = (windows[-1][0], max(windows[-1][1], end))
+        else:
+            windows.append((start, end))
+    return windows
+
+
+def render_frames(video_path: str, writer, overlays: dict, draw, start: int = 0, end: int = None):
+    """Decode frames [start, end) of video_path, draw their overlays (1-based keys) and write them."""
+    cap = cv2.VideoCapture(str(video_path))
+    seek_frame(cap, start)
+    index = start
+    try:
+        while end is None or index < end:
+            success, frame = cap.read()
+            if not success:
+                break
+            index += 1
+            ops = overlays.get(index)
+            if ops:
+                draw(frame, ops)
+            writer.write(frame)
+    finally:
+        cap.release()
+    return index - start
+
+
+def render_full(video_path: str, output_path: str, overlays: dict, draw, fps: float, size: tuple,
+                codec: str = "mp4v"):
+    """Re-encode the whole video with overlays (the fallback when windows can't be stream-copied)."""
+    writer = open_writer(output_path, fps, size, codec)
+    try:
+        render_frames(video_path, writer, overlays, draw)
+    finally:
+        writer.release()
+    return "full"
+
+
+def render_event_windows(video_path: str, output_path: str, events: list, overlays: dict, draw,
+                         size: tuple, total_frames: int, codec: str = "mp4v") -> str:
+    """
+    Write the annotated video re-encoding only the GOPs that contain events.
+
+    Stretches without events are copied from the source packet for packet
+    (ffmpeg -c copy), and the keyframe-aligned windows around events are
+    decoded, annotated and re-encoded with the source's codec, then
+    everything is joined with ffmpeg's concat demuxer. Since the copied
+    stretches keep the source codec, this only happens when the source is
+    already in the requested codec (see CODEC_FOURCCS). Otherwise, or when
+    ffmpeg is missing or a step fails, the whole video is re-encoded with
+    overlays in the requested codec (render_full). Returns "windows" or "full".
+    """
+    ffmpeg = find_ffmpeg()
+    cap = cv2.VideoCapture(str(video_path))
+    fourcc = source_fourcc(cap)
+    # The exact rate (not rounded to an int), so re-encoded windows keep the source's timing
+    fps = cap.get(cv2.CAP_PROP_FPS)
+    cap.release()
+    encoder = SOURCE_ENCODERS.get(fourcc)
+    if ffmpeg is None or encoder is None or fourcc not in CODEC_FOURCCS.get(codec, ()):
+        return render_full(video_path, output_path, overlays, draw, fps, size, codec)
+
+    parts_dir = Path(tempfile.mkdtemp(prefix="render_", dir=Path(output_path).parent))
+    try:
+        key_frames = keyframes(video_path, ffmpeg)
+        key_times = dict(key_frames)
+        windows = plan_windows(events, key_frames, total_frames)
+
+        parts = []
+        position = 0
+        for start, end in windows + [(total_frames, total_frames)]:
+            if start > position:
+                parts.append(("copy", position, start))
+            if end > start:
+                parts.append(("encode", start, end))
+            position = end
+
+        part_paths = []
+        for i, (kind, start, end) in enumerate(parts):
+            part = parts_dir / f"part{i:03d}.mp4"
+            if kind == "copy":
+                subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-ss", f"{key_times[start]:.6f}",
+                                "-i", str(video_path), "-frames:v", str(end - start), "-an", "-c", "copy",
+                                "-avoid_negative_ts", "make_zero", str(part)], check=True, capture_output=True)
+            else:
+                writer = FfmpegWriter(part, fps, size, encoder, ffmpeg)
+                try:
+                    render_frames(video_path, writer, overlays, draw, start, end)
+                finally:
+                    writer.release()
+            part_paths.append(part)
+
+        list_path = parts_dir / "parts.txt"
+        list_path.write_text("".join(f"file '{p.resolve()}'\n" for p in part_paths))
+        subprocess.run([ffmpeg, "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", str(list_path),
+                        "-c", "copy", "-movflags", "+faststart", str(output_path)], check=True, capture_output=True)
+        return "windows"
+    except (subprocess.CalledProcessError, RuntimeError, OSError) as e:
+        print(f"Event-window rendering failed, re-encoding the whole video: {e}")
+        return render_full(video_path, output_path, overlays, draw, fps, size, codec)
+    finally:
+        shutil.rmtree(parts_dir, ignore_errors=True)
@@ -0,0 +1,64 @@
+import threading
+import time
+
+
+class ModelWarmup:
+    """
+    Loads models in a background thread once the service is up, and tracks
+    how far it got for the readiness check.
+
+    steps: {name: (fn, required)}. fn() loads (and ideally runs once) one
+    model. The service is ready when every required step has succeeded;
+    optional steps (a custom model, YAMNet) that fail are reported but don't
+    hold readiness back, since their detectors fall back or stay disabled.
+    """
+
+    def __init__(self, steps: dict):
+        self.steps = steps
+        self.models = {name: {"state": "pending", "required": required, "seconds": None, "error": None}
+                       for name, (_, required) in steps.items()}
+        self.lock = threading.Lock()
+        self.thread = None
+        self.started_at = None
+        self.finished_at = None
+
+    def start(self):
+        """Warm up in the background; returns at once."""
+        if self.thread is None:
+            self.thread = threading.Thread(target=self.run, name="model-warmup", daemon=True)
+            self.thread.start()
+        return self
+
+    def run(self):
+        """Warm up every step in order on the calling thread."""
+        self.started_at = time.time()
+        for name, (fn, _) in self.steps.items():
+            with self.lock:
+                self.models[name]["state"] = "loading"
+            start = time.perf_counter()
+            try:
+                fn()
+                state, error = "ready", None
+            except Exception as e:
+                state, error = "failed", str(e) or type(e).__name__
+                print(f"Warm-up of {name} failed: {error}")
+            with self.lock:
+                self.models[name].update(state=state, error=error,
+                                         seconds=round(time.perf_counter() - start, 3))
+        self.finished_at = time.time()
+
+    @property
+    def ready(self) -> bool:
+        with self.lock:
+            return all(model["state"] == "ready" for model in self.models.values() if model["required"])
+
+    def status(self) -> dict:
+        with self.lock:
+            models = {name: dict(model) for name, model in self.models.items()}
+        return {
+            "ready": self.ready,
+            "warming_up": self.thread is not None and self.thread.is_alive(),
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "models": models,
+        }
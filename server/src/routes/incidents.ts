@@ -162,6 +162,82 @@ router.post('/report', upload.single('video'), async (req, res) => {
     }
 });
 
+// dedup_key -> incident id, so folded alert updates from the ML service land on the original row
+const dedupIncidents = new Map<string, number>();
+const MAX_DEDUP_KEYS = 10000;
+
+// POST bulk incidents (batched alerts from the ML service)
+router.post('/bulk', async (req, res) => {
+    try {
+        const items: any[] = Array.isArray(req.body?.incidents) ? req.body.incidents : [];
+        if (items.length === 0) {
+            return res.status(400).json({ error: 'Expected a non-empty incidents array' });
+        }
+
+        const data = items.map((item) => {
+            const analysis = (item.type && item.severity)
+                ? { type: item.type, severity: item.severity, confidence: item.confidence || 1.0 }
+                : analyzeIncident(item.description || '');
+            const occurrences = parseInt(item.occurrences) || 1;
+            return {
+                description: occurrences > 1
+                    ? `${item.description || ''} (${occurrences} detections)`
+                    : item.description || '',
+                latitude: parseFloat(item.latitude) || 40.7128,
+                longitude: parseFloat(item.longitude) || -74.006,
+                camera_id: item.camera_id || 'MANUAL',
+                type: analysis.type,
+                severity: analysis.severity,
+                confidence: analysis.confidence,
+                status: 'verified',
+            };
+        });
+
+        // Any DB error fails the whole batch so the ML service retries it
+        const batchKeys = new Map<string, number>();
+        const { created, updated } = await prisma.$transaction(async (tx) => {
+            const created: any[] = [];
+            const updated: any[] = [];
+            for (let i = 0; i < items.length; i++) {
+                const key: string | undefined = items[i].dedup_key;
+                const knownId = key ? (batchKeys.get(key) ?? dedupIncidents.get(key)) : undefined;
+                if (knownId !== undefined) {
+                    const existing = await tx.incident.findUnique({ where: { id: knownId } });
+                    if (existing) {
+                        updated.push(await tx.incident.update({
+                            where: { id: knownId },
+                            data: {
+                                description: data[i].description,
+                                confidence: Math.max(existing.confidence, data[i].confidence),
+                            }
+                        }));
+                        continue;
+                    }
+                }
+                const incident = await tx.incident.create({ data: data[i] });
+                created.push(incident);
+                if (key) batchKeys.set(key, incident.id);
+            }
+            return { created, updated };
+        });
+
+        batchKeys.forEach((id, key) => dedupIncidents.set(key, id));
+        // Forget the oldest keys (Map keeps insertion order)
+        for (const key of dedupIncidents.keys()) {
+            if (dedupIncidents.size <= MAX_DEDUP_KEYS) break;
+            dedupIncidents.delete(key);
+        }
+
+        created.forEach((incident) => io.emit('new_incident', incident));
+        updated.forEach((incident) => io.emit('incident_updated', incident));
+
+        res.json({ created: created.length, updated: updated.length });
+    } catch (error) {
+        console.error('Error creating incidents in bulk:', error);
+        res.status(500).json({ error: 'Failed to create incidents' });
+    }
+});
+
 // POST report incident
 router.post('/', async (req, res) => {
     try {